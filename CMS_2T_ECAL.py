@@ -3,6 +3,12 @@ import heppy.papas.detectors.material as material
 from heppy.papas.detectors.geometry import VolumeCylinder
 import math
 import heppy.statistics.rrandom as random
+import numpy as np
+import heppy.papas.detectors.FCCHiggsDetectors.calorimeter as calorimeter
+from heppy.papas.detectors.FCCHiggsDetectors.acceptance import accept
+import heppy.papas.detectors.FCCHiggsDetectors.jec as jec
+from heppy.papas.detectors.FCCHiggsDetectors.delphes import Formula
+from heppy.papas.detectors.FCCHiggsDetectors.tracking import GlucksternResolution
 
 class ECAL(DetectorElement):
 
@@ -36,6 +42,10 @@ class ECAL(DetectorElement):
     def energy_response(self, energy, eta=0):
         return 1
     
+    def smear(self, energies, etas, rng):
+        '''Smears an array of cluster energies at once, see calorimeter.smear'''
+        return calorimeter.smear(energies, self.eres['barrel'], None, rng)
+
     def cluster_size(self, ptc):
         '''just guessing numbers (from Mogens, as in ILD).'''
         pdgid = abs(ptc.pdgid())
@@ -44,15 +54,27 @@ class ECAL(DetectorElement):
         else:
             return 0.045
 
-    def acceptance(self, cluster):
+    def efficiency(self, cluster):
         energy = cluster.energy
         eta = abs(cluster.position.Eta())
         if eta < self.eta_junction:
-            return energy>self.emin['barrel']
+            return float(energy>self.emin['barrel'])
         elif eta < 2.76:  #TODO check this value
-            return energy>self.emin['endcap']
+            return float(energy>self.emin['endcap'])
         else:
-            return False
+            return 0.
+
+    def efficiencies(self, energies, etas):
+        '''Returns the efficiencies for arrays of cluster energies and etas,
+        see efficiency.'''
+        etas = np.abs(etas)
+        return np.select([etas < self.eta_junction, etas < 2.76],
+                         [energies > self.emin['barrel'],
+                          energies > self.emin['endcap']],
+                         False).astype(float)
+
+    def acceptance(self, cluster):
+        return accept(cluster, self.efficiency(cluster))
 
     def space_resolution(self, ptc):
         pass
@@ -64,52 +86,83 @@ class HCAL(DetectorElement):
         volume = VolumeCylinder('hcal', 2.9, 3.6, 1.9, 2.6 )
         mat = material.Material('HCAL', None, 0.17)
         self.eta_crack = 1.3
-        self.eres = {'barrel':[0.8062, 2.753, 0.1501], 'endcap':[6.803e-06, 6.676, 0.1716]}
-        self.eresp = {'barrel':[1.036, 4.452, -2.458], 'endcap':[1.071, 9.471, -2.823]}
+        # an earlier fit gave eres {'barrel':[0.8062, 2.753, 0.1501], 'endcap':[6.803e-06, 6.676, 0.1716]}
+        # and eresp {'barrel':[1.036, 4.452, -2.458], 'endcap':[1.071, 9.471, -2.823]},
+        # which were not used. see calo_fit.py to fit them again.
+        self.eres = {'barrel':[1.1, 0., 0.09], 'endcap':[1.1, 0., 0.09]}
+        # None for a response of 1
+        self.eresp = None
         super(HCAL, self).__init__('ecal', volume, mat)
 
     def energy_resolution(self, energy, eta=0.):
         part = 'barrel'
         if abs(eta)>self.eta_crack:
             part = 'endcap'
-        # stoch = self.eres[part][0] / math.sqrt(energy)
-        # noise = self.eres[part][1] / energy
-        # constant = self.eres[part][2]
-        stoch = 1.1 / math.sqrt(energy)
-        noise = 0
-        constant = 0.09
+        stoch = self.eres[part][0] / math.sqrt(energy)
+        noise = self.eres[part][1] / energy
+        constant = self.eres[part][2]
         return math.sqrt( stoch**2 + noise**2 + constant**2)
 
     def energy_response(self, energy, eta=0):
-        return 1.
+        if self.eresp is None:
+            return 1.
         part = 'barrel'
         if abs(eta)>self.eta_crack:
             part = 'endcap'
         return self.eresp[part][0]/(1+math.exp((energy-self.eresp[part][1])/self.eresp[part][2])) #using fermi-dirac function : [0]/(1 + exp( (energy-[1]) /[2] ))
 
+    def smear(self, energies, etas, rng):
+        '''Smears an array of cluster energies at once, see calorimeter.smear'''
+        endcap = np.abs(etas)>self.eta_crack
+        eresp = self.eresp
+        if eresp is not None:
+            eresp = calorimeter.region_parameters(eresp, endcap)
+        return calorimeter.smear(energies,
+                                 calorimeter.region_parameters(self.eres, endcap),
+                                 eresp, rng)
+
     def cluster_size(self, ptc):
         return 0.2
 
-    def acceptance(self, cluster):
+    def efficiency(self, cluster):
         energy = cluster.energy
         eta = abs(cluster.position.Eta())
         if eta < self.eta_crack :
             if energy>1.:
-                return random.uniform(0,1)<(1/(1+math.exp((energy-1.93816)/(-1.75330))))
+                return 1/(1+math.exp((energy-1.93816)/(-1.75330)))
             else:
-                return False
+                return 0.
         elif eta < 3. : 
             if energy>1.1:
                 if energy<10.:
-                    return random.uniform(0,1)<(1.05634-1.66943e-01*energy+1.05997e-02*(energy**2))
+                    return 1.05634-1.66943e-01*energy+1.05997e-02*(energy**2)
                 else:
-                    return random.uniform(0,1)<(8.09522e-01/(1+math.exp((energy-9.90855)/-5.30366)))
+                    return 8.09522e-01/(1+math.exp((energy-9.90855)/-5.30366))
             else:
-                return False
+                return 0.
         elif eta < 5.:
-            return energy>7.
+            return float(energy>7.)
         else:
-            return False
+            return 0.
+
+    def efficiencies(self, energies, etas):
+        '''Returns the efficiencies for arrays of cluster energies and etas,
+        see efficiency.'''
+        etas = np.abs(etas)
+        with np.errstate(over='ignore'):
+            barrel = np.where(energies > 1.,
+                              1 / (1 + np.exp((energies - 1.93816) / (-1.75330))), 0.)
+            endcap = np.where(
+                energies > 1.1,
+                np.where(energies < 10.,
+                         1.05634 - 1.66943e-01 * energies + 1.05997e-02 * (energies**2),
+                         8.09522e-01 / (1 + np.exp((energies - 9.90855) / -5.30366))),
+                0.)
+        return np.select([etas < self.eta_crack, etas < 3., etas < 5.],
+                         [barrel, endcap, energies > 7.], 0.)
+
+    def acceptance(self, cluster):
+        return accept(cluster, self.efficiency(cluster))
     
     def space_resolution(self, ptc):
         pass
@@ -120,26 +173,41 @@ class Tracker(DetectorElement):
     #TODO acceptance and resolution 
     #depend on the particle type
     
-    def __init__(self):
+    def __init__(self, field):
         volume = VolumeCylinder('tracker', 1.29, 1.99)
         mat = material.void
+        # resolution tables for the magnitude of the field
+        self.model = GlucksternResolution(field, volume)
         super(Tracker, self).__init__('tracker', volume,  mat)
 
-    def acceptance(self, track):
-        # return False
+    def efficiency(self, track):
         pt = track.p3() .Pt()
         eta = abs(track.p3() .Eta())
         if eta < 1.35 and pt>0.5:
-            return random.uniform(0,1)<0.95
+            return 0.95
         elif eta < 2.5 and pt>0.5:
-            return random.uniform(0,1)<0.9 
+            return 0.9 
         else:
-            return False
+            return 0.
+
+    def efficiencies(self, pts, etas):
+        '''Returns the efficiencies for arrays of track pts and etas,
+        see efficiency.'''
+        etas = np.abs(etas)
+        return np.select([(etas < 1.35) & (pts > 0.5), (etas < 2.5) & (pts > 0.5)],
+                         [0.95, 0.9], 0.)
+
+    def acceptance(self, track):
+        return accept(track, self.efficiency(track))
 
     def resolution(self, track):
-        # TODO: depends on the field
-        pt = track.p3() .Pt()
-        return 1.1e-2
+        '''Returns the relative pt resolution, see tracking.py.'''
+        p3 = track.p3()
+        return self.model.resolution(p3.Pt(), p3.Eta())
+
+    def resolutions(self, pts, etas):
+        '''Returns the relative pt resolutions for arrays of pt and eta.'''
+        return self.model(pts, etas)
 
     
 
@@ -164,77 +232,80 @@ class BeamPipe(DetectorElement):
 
         
 class CMS(Detector):
-        
+
+    # Delphes parametrizations, compiled once, see delphes.py
+    # https://github.com/delphes/delphes/blob/master/cards/delphes_card_CMS.tcl
+    # 96d6bcf
+    electron_efficiency_formula = Formula('''
+        (pt <= 10.0) * (0.00) +
+        (abs(eta) <= 1.5) * (pt > 10.0) * (0.95) +
+        (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 10.0) * (0.85) +
+        (abs(eta) > 2.5) * (0.00)''')
+    muon_efficiency_formula = Formula('''
+        (pt <= 10.0) * (0.00) +
+        (abs(eta) <= 2.4) * (pt > 10.0) * (0.95) +
+        (abs(eta) > 2.4) * (0.00)''')
+    muon_resolution_formula = Formula('''
+        (abs(eta) <= 0.5) * (pt > 0.1) * sqrt(0.01^2 + pt^2*1.0e-4^2) +
+        (abs(eta) > 0.5 && abs(eta) <= 1.5) * (pt > 0.1) * sqrt(0.015^2 + pt^2*1.5e-4^2) +
+        (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 0.1) * sqrt(0.025^2 + pt^2*3.5e-4^2)''')
+    # resolution of the muons outside the domain of the card formula, where
+    # it is 0: the pt-independent terms of the original parametrization
+    muon_resolution_default_formula = Formula('''
+        (abs(eta) < 0.5) * sqrt(0.01^2 + 1.0e-4^2) +
+        (abs(eta) >= 0.5 && abs(eta) < 1.5) * sqrt(0.015^2 + 1.5e-4^2) +
+        (abs(eta) >= 1.5) * sqrt(0.025^2 + 3.5e-4^2)''')
+
+    def electron_efficiency(self, ptc):
+        """Delphes parametrization, see electron_efficiency_formula"""
+        return self.electron_efficiency_formula.scalar(pt=ptc.pt(), eta=ptc.eta())
+
     def electron_acceptance(self, ptc):
-        """Delphes parametrization
-        https://github.com/delphes/delphes/blob/master/cards/delphes_card_CMS.tcl
-        96d6bcf 
-        """
-        rnd = random.uniform(0, 1)
-        if ptc.pt() < 10.:
-            return False
-        else:
-            eta = abs(ptc.eta())
-            if eta < 1.5:
-                return rnd < 0.95
-            elif eta < 2.5:
-                return rnd < 0.85
-            else:
-                return False
+        return accept(ptc, self.electron_efficiency(ptc))
 
     def electron_resolution(self, ptc):
         # return 0.1 / math.sqrt(ptc.e())
         return 0.03
             
+    def muon_efficiency(self, ptc):
+        """Delphes parametrization, see muon_efficiency_formula"""
+        return self.muon_efficiency_formula.scalar(pt=ptc.pt(), eta=ptc.eta())
+
     def muon_acceptance(self, ptc):
-        """Delphes parametrization
-        https://github.com/delphes/delphes/blob/master/cards/delphes_card_CMS.tcl
-        96d6bcf 
-        """        
-        rnd = random.uniform(0, 1)
-        eta = abs(ptc.eta())        
-        if ptc.pt() < 10.:
-            return False
-        elif eta < 2.4:
-            return rnd < 0.95
-        else:
-            return False
+        return accept(ptc, self.muon_efficiency(ptc))
             
     def muon_resolution(self, ptc):
-        """Delphes parametrization
-        
-          # resolution formula for muons
-          set ResolutionFormula {
-                         (abs(eta) <= 0.5) * (pt > 0.1) * sqrt(0.01^2 + pt^2*1.0e-4^2) +
-                         (abs(eta) > 0.5 && abs(eta) <= 1.5) * (pt > 0.1) * sqrt(0.015^2 + pt^2*1.5e-4^2) +
-                         (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 0.1) * sqrt(0.025^2 + pt^2*3.5e-4^2)}
-        """
-        rnd = random.uniform(0, 1)
-        eta = abs(ptc.eta())
-        cstt = None
-        vart = None
-        if eta < 0.5:
-            cstt, vart = 0.01, 1e-4
-        elif eta < 1.5:
-            cstt, vart = 0.015, 1.5e-4
-        else:
-            cstt, vart = 0.025, 3.5e-4
-        res = math.sqrt(cstt**2 + vart**2)
-        return res
+        """Delphes parametrization, see muon_resolution_formula, and
+        muon_resolution_default_formula out of its domain"""
+        pt, eta = ptc.pt(), ptc.eta()
+        if pt > 0.1 and abs(eta) <= 2.5:
+            return self.muon_resolution_formula.scalar(pt=pt, eta=eta)
+        return self.muon_resolution_default_formula.scalar(eta=eta)
+
+    def muon_resolutions(self, pts, etas):
+        '''Returns the muon resolutions for arrays of pt and eta.'''
+        inside = (pts > 0.1) & (np.abs(etas) <= 2.5)
+        return np.where(inside, self.muon_resolution_formula(pt=pts, eta=etas),
+                        self.muon_resolution_default_formula(eta=etas))
     
     def jet_energy_correction(self, jet):
         '''The factor roughly corresponds to the raw PF jet response in CMS,
         which is around 90%. The factor was checked in the reconstruction
         of Z->jj in papas.
+        If a correction table was derived for this detector, see jec.py,
+        the correction is taken from the table.
         '''
+        if self.jec:
+            return self.jec(jet)
         return 1.1
     
     def __init__(self):
         super(CMS, self).__init__()
-        self.elements['tracker'] = Tracker()
+        self.jec = jec.for_detector(__name__.split('.')[-1])
+        self.elements['field'] = Field(2.)
+        self.elements['tracker'] = Tracker(self.elements['field'].magnitude)
         self.elements['ecal'] = ECAL()
         self.elements['hcal'] = HCAL()
-        self.elements['field'] = Field(2.)
         self.elements['beampipe'] = BeamPipe()
 
 cms = CMS()
@@ -3,6 +3,12 @@ import heppy.papas.detectors.material as material
 from heppy.papas.detectors.geometry import VolumeCylinder
 import math
 import heppy.statistics.rrandom as random
+import numpy as np
+import heppy.papas.detectors.FCCHiggsDetectors.calorimeter as calorimeter
+from heppy.papas.detectors.FCCHiggsDetectors.acceptance import accept
+import heppy.papas.detectors.FCCHiggsDetectors.jec as jec
+from heppy.papas.detectors.FCCHiggsDetectors.delphes import Formula
+from heppy.papas.detectors.FCCHiggsDetectors.tracking import GlucksternResolution
 
 class ECAL(DetectorElement):
 
@@ -30,6 +36,16 @@ class ECAL(DetectorElement):
             part = 'endcap'
         return self.eresp[part][0]/(1+math.exp((energy-self.eresp[part][1])/self.eresp[part][2])) #using fermi-dirac function : [0]/(1 + exp( (energy-[1]) /[2] ))
 
+    def smear(self, energies, etas, rng):
+        '''Smears an array of cluster energies at once, see calorimeter.smear'''
+        abseta = np.abs(etas)
+        res_endcap = (abseta>1.479) & (abseta<3.0)
+        resp_endcap = abseta>self.eta_crack
+        return calorimeter.smear(energies,
+                                 calorimeter.region_parameters(self.eres, res_endcap),
+                                 calorimeter.region_parameters(self.eresp, resp_endcap),
+                                 rng)
+
     def cluster_size(self, ptc):
         pdgid = abs(ptc.pdgid())
         if pdgid==22 or pdgid==11:
@@ -37,15 +53,29 @@ class ECAL(DetectorElement):
         else:
             return 0.07
 
-    def acceptance(self, cluster):
+    def efficiency(self, cluster):
         energy = cluster.energy
         eta = abs(cluster.position.Eta())
         if eta < self.eta_crack:
-            return energy>self.emin['barrel']
+            return float(energy>self.emin['barrel'])
         elif eta < 2.93:
-            return energy>self.emin['endcap'] and cluster.pt>0.2
+            return float(energy>self.emin['endcap'] and cluster.pt>0.2)
         else:
-            return False
+            return 0.
+
+    def efficiencies(self, energies, etas):
+        '''Returns the efficiencies for arrays of cluster energies and etas,
+        see efficiency.'''
+        etas = np.abs(etas)
+        with np.errstate(over='ignore'):
+            pts = energies / np.cosh(etas)
+        return np.select([etas < self.eta_crack, etas < 2.93],
+                         [energies > self.emin['barrel'],
+                          (energies > self.emin['endcap']) & (pts > 0.2)],
+                         False).astype(float)
+
+    def acceptance(self, cluster):
+        return accept(cluster, self.efficiency(cluster))
 
     def space_resolution(self, ptc):
         pass
@@ -68,6 +98,10 @@ class HCAL(DetectorElement):
     def energy_response(self, energy, eta=0):
         return 1.0
     
+    def smear(self, energies, etas, rng):
+        '''Smears an array of cluster energies at once, see calorimeter.smear'''
+        return calorimeter.smear(energies, self.eres, None, rng)
+
     def cluster_size(self, ptc):
         '''returns cluster size in the HCAL
         
@@ -76,13 +110,22 @@ class HCAL(DetectorElement):
         '''
         return 0.25
 
-    def acceptance(self, cluster):
+    def efficiency(self, cluster):
         energy = cluster.energy
         eta = abs(cluster.position.Eta())
         if eta < 2.76:  #TODO: check this value
-            return energy>1.
+            return float(energy>1.)
         else:
-            return False
+            return 0.
+
+    def efficiencies(self, energies, etas):
+        '''Returns the efficiencies for arrays of cluster energies and etas,
+        see efficiency.'''
+        etas = np.abs(etas)
+        return ((etas < 2.76) & (energies > 1.)).astype(float)
+
+    def acceptance(self, cluster):
+        return accept(cluster, self.efficiency(cluster))
     
     def space_resolution(self, ptc):
         pass
@@ -93,26 +136,41 @@ class Tracker(DetectorElement):
     #TODO acceptance and resolution 
     #depend on the particle type
     
-    def __init__(self):
+    def __init__(self, field):
         volume = VolumeCylinder('tracker', 1.29, 1.99)
         mat = material.void
+        # resolution tables for the magnitude of the field
+        self.model = GlucksternResolution(field, volume)
         super(Tracker, self).__init__('tracker', volume,  mat)
 
-    def acceptance(self, track):
-        # return False
+    def efficiency(self, track):
         pt = track.p3() .Pt()
         eta = abs(track.p3() .Eta())
         if eta < 1.35 and pt>0.5:
-            return random.uniform(0,1)<0.95
+            return 0.95
         elif eta < 2.5 and pt>0.5:
-            return random.uniform(0,1)<0.9 
+            return 0.9 
         else:
-            return False
+            return 0.
+
+    def efficiencies(self, pts, etas):
+        '''Returns the efficiencies for arrays of track pts and etas,
+        see efficiency.'''
+        etas = np.abs(etas)
+        return np.select([(etas < 1.35) & (pts > 0.5), (etas < 2.5) & (pts > 0.5)],
+                         [0.95, 0.9], 0.)
+
+    def acceptance(self, track):
+        return accept(track, self.efficiency(track))
 
     def resolution(self, track):
-        # TODO: depends on the field
-        pt = track.p3() .Pt()
-        return 1.1e-2
+        '''Returns the relative pt resolution, see tracking.py.'''
+        p3 = track.p3()
+        return self.model.resolution(p3.Pt(), p3.Eta())
+
+    def resolutions(self, pts, etas):
+        '''Returns the relative pt resolutions for arrays of pt and eta.'''
+        return self.model(pts, etas)
 
     
 
@@ -137,77 +195,80 @@ class BeamPipe(DetectorElement):
 
         
 class CMS(Detector):
-        
+
+    # Delphes parametrizations, compiled once, see delphes.py
+    # https://github.com/delphes/delphes/blob/master/cards/delphes_card_CMS.tcl
+    # 96d6bcf
+    electron_efficiency_formula = Formula('''
+        (pt <= 10.0) * (0.00) +
+        (abs(eta) <= 1.5) * (pt > 10.0) * (0.95) +
+        (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 10.0) * (0.85) +
+        (abs(eta) > 2.5) * (0.00)''')
+    muon_efficiency_formula = Formula('''
+        (pt <= 10.0) * (0.00) +
+        (abs(eta) <= 2.4) * (pt > 10.0) * (0.95) +
+        (abs(eta) > 2.4) * (0.00)''')
+    muon_resolution_formula = Formula('''
+        (abs(eta) <= 0.5) * (pt > 0.1) * sqrt(0.01^2 + pt^2*1.0e-4^2) +
+        (abs(eta) > 0.5 && abs(eta) <= 1.5) * (pt > 0.1) * sqrt(0.015^2 + pt^2*1.5e-4^2) +
+        (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 0.1) * sqrt(0.025^2 + pt^2*3.5e-4^2)''')
+    # resolution of the muons outside the domain of the card formula, where
+    # it is 0: the pt-independent terms of the original parametrization
+    muon_resolution_default_formula = Formula('''
+        (abs(eta) < 0.5) * sqrt(0.01^2 + 1.0e-4^2) +
+        (abs(eta) >= 0.5 && abs(eta) < 1.5) * sqrt(0.015^2 + 1.5e-4^2) +
+        (abs(eta) >= 1.5) * sqrt(0.025^2 + 3.5e-4^2)''')
+
+    def electron_efficiency(self, ptc):
+        """Delphes parametrization, see electron_efficiency_formula"""
+        return self.electron_efficiency_formula.scalar(pt=ptc.pt(), eta=ptc.eta())
+
     def electron_acceptance(self, ptc):
-        """Delphes parametrization
-        https://github.com/delphes/delphes/blob/master/cards/delphes_card_CMS.tcl
-        96d6bcf 
-        """
-        rnd = random.uniform(0, 1)
-        if ptc.pt() < 10.:
-            return False
-        else:
-            eta = abs(ptc.eta())
-            if eta < 1.5:
-                return rnd < 0.95
-            elif eta < 2.5:
-                return rnd < 0.85
-            else:
-                return False
+        return accept(ptc, self.electron_efficiency(ptc))
 
     def electron_resolution(self, ptc):
         # return 0.1 / math.sqrt(ptc.e())
         return 0.03
             
+    def muon_efficiency(self, ptc):
+        """Delphes parametrization, see muon_efficiency_formula"""
+        return self.muon_efficiency_formula.scalar(pt=ptc.pt(), eta=ptc.eta())
+
     def muon_acceptance(self, ptc):
-        """Delphes parametrization
-        https://github.com/delphes/delphes/blob/master/cards/delphes_card_CMS.tcl
-        96d6bcf 
-        """        
-        rnd = random.uniform(0, 1)
-        eta = abs(ptc.eta())        
-        if ptc.pt() < 10.:
-            return False
-        elif eta < 2.4:
-            return rnd < 0.95
-        else:
-            return False
+        return accept(ptc, self.muon_efficiency(ptc))
             
     def muon_resolution(self, ptc):
-        """Delphes parametrization
-        
-          # resolution formula for muons
-          set ResolutionFormula {
-                         (abs(eta) <= 0.5) * (pt > 0.1) * sqrt(0.01^2 + pt^2*1.0e-4^2) +
-                         (abs(eta) > 0.5 && abs(eta) <= 1.5) * (pt > 0.1) * sqrt(0.015^2 + pt^2*1.5e-4^2) +
-                         (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 0.1) * sqrt(0.025^2 + pt^2*3.5e-4^2)}
-        """
-        rnd = random.uniform(0, 1)
-        eta = abs(ptc.eta())
-        cstt = None
-        vart = None
-        if eta < 0.5:
-            cstt, vart = 0.01, 1e-4
-        elif eta < 1.5:
-            cstt, vart = 0.015, 1.5e-4
-        else:
-            cstt, vart = 0.025, 3.5e-4
-        res = math.sqrt(cstt**2 + vart**2)
-        return res
+        """Delphes parametrization, see muon_resolution_formula, and
+        muon_resolution_default_formula out of its domain"""
+        pt, eta = ptc.pt(), ptc.eta()
+        if pt > 0.1 and abs(eta) <= 2.5:
+            return self.muon_resolution_formula.scalar(pt=pt, eta=eta)
+        return self.muon_resolution_default_formula.scalar(eta=eta)
+
+    def muon_resolutions(self, pts, etas):
+        '''Returns the muon resolutions for arrays of pt and eta.'''
+        inside = (pts > 0.1) & (np.abs(etas) <= 2.5)
+        return np.where(inside, self.muon_resolution_formula(pt=pts, eta=etas),
+                        self.muon_resolution_default_formula(eta=etas))
     
     def jet_energy_correction(self, jet):
         '''The factor roughly corresponds to the raw PF jet response in CMS,
         which is around 90%. The factor was checked in the reconstruction
         of Z->jj in papas.
+        If a correction table was derived for this detector, see jec.py,
+        the correction is taken from the table.
         '''
+        if self.jec:
+            return self.jec(jet)
         return 1.1
     
     def __init__(self):
         super(CMS, self).__init__()
-        self.elements['tracker'] = Tracker()
+        self.jec = jec.for_detector(__name__.split('.')[-1])
+        self.elements['field'] = Field(2.)
+        self.elements['tracker'] = Tracker(self.elements['field'].magnitude)
         self.elements['ecal'] = ECAL()
         self.elements['hcal'] = HCAL()
-        self.elements['field'] = Field(2.)
         self.elements['beampipe'] = BeamPipe()
 
 cms = CMS()
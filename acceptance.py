@@ -0,0 +1,83 @@
+'''Random or weight-based acceptance.
+
+The detector elements compute the probability that an object is seen
+in their efficiency methods, and their acceptance methods call accept.
+
+In 'random' mode, the default, objects are accepted at random according
+to their efficiency, as usual.
+
+In 'weight' mode, every object with a non-zero efficiency is accepted,
+and its efficiency is stored as its acceptance_weight attribute: the
+weights are per-object probabilities to be seen. A single simulation can
+be reweighted to another efficiency map afterwards, see reweight, instead
+of being rerun:
+
+    from heppy.papas.detectors.FCCHiggsDetectors import acceptance
+    acceptance.set_mode('weight')
+
+The product of the weights of all the objects is not an event weight:
+it is the probability that all of them are seen, while the simulation
+stands for all the combinations of seen and lost objects. The weight of
+an event for a selection is the probability of the combinations it
+selects. For a selection requiring some objects to be seen and others to
+be lost, see event_weight, the other objects do not enter the weight.
+With the heppy option acceptance=weight, analysis_cfg.py runs in weight
+mode and computes such an event weight, see analyzers/AcceptanceWeight.py.
+'''
+
+import heppy.statistics.rrandom as random
+
+MODES = ['random', 'weight']
+
+mode = 'random'
+
+
+def set_mode(new_mode):
+    '''Sets the acceptance mode, 'random' or 'weight'.'''
+    global mode
+    if new_mode not in MODES:
+        raise ValueError('unknown acceptance mode: {}'.format(new_mode))
+    mode = new_mode
+
+
+def accept(obj, efficiency):
+    '''Returns True if obj is accepted, given its efficiency.
+
+    No random number is drawn for an efficiency of 0 or 1.
+    '''
+    if efficiency <= 0.:
+        return False
+    if mode == 'weight':
+        obj.acceptance_weight = efficiency
+        return True
+    if efficiency >= 1.:
+        return True
+    return random.uniform(0, 1) < efficiency
+
+
+def weight(obj):
+    '''Returns the acceptance weight of obj, 1 if it has none.'''
+    return getattr(obj, 'acceptance_weight', 1.)
+
+
+def event_weight(seen, lost=()):
+    '''Returns the probability that the objects seen are all seen and the
+    objects lost are all lost: the product of the acceptance weights w of
+    the objects seen and of the 1 - w of the objects lost.
+
+    This is the weight of the event for a selection which requires the
+    objects seen and vetoes the objects lost, the other objects being
+    seen or not. It is 1 for objects without acceptance weight.
+    '''
+    result = 1.
+    for obj in seen:
+        result *= weight(obj)
+    for obj in lost:
+        result *= 1. - weight(obj)
+    return result
+
+
+def reweight(obj, efficiency):
+    '''Returns the weight factor to go from the efficiency used in the
+    simulation of obj to another efficiency.'''
+    return efficiency / weight(obj)
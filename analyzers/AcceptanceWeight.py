@@ -0,0 +1,54 @@
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.acceptance import event_weight
+
+
+class AcceptanceWeight(Analyzer):
+    '''Computes the event weight of a selection in the weight-based
+    acceptance mode.
+
+    See acceptance.py. The event weight is the probability that the
+    objects required by the selection are seen and that the objects it
+    vetoes are lost: the product of the acceptance weights of the objects
+    seen, and of one minus the acceptance weights of the objects lost.
+    The other objects of the event do not enter the weight, and the
+    objects which do not have an acceptance weight count for 1.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors import acceptance
+        acceptance.set_mode('weight')
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.AcceptanceWeight import AcceptanceWeight
+        acceptance_weight = cfg.Analyzer(
+            AcceptanceWeight,
+            papas_collections = [],
+            input_objects = ['selected_leptons'],
+            lost_objects = [],
+            output = 'acceptance_weight'
+        )
+
+    @param papas_collections: type_and_subtypes of the papas event
+      collections required to be seen, e.g. smeared tracks and clusters.
+    @param input_objects: names of other collections of the event
+      required to be seen, e.g. the output of a selection.
+    @param lost_objects: names of collections of the event required to be
+      lost, e.g. vetoed leptons.
+    @param output: name of the event weight in the event.
+    '''
+
+    def _objects(self, event, names):
+        objects = []
+        for name in names:
+            collection = getattr(event, name)
+            if isinstance(collection, dict):
+                collection = collection.values()
+            objects.extend(collection)
+        return objects
+
+    def process(self, event):
+        seen = []
+        for type_and_subtype in getattr(self.cfg_ana, 'papas_collections', []):
+            seen.extend(event.papasevent.get_collection(type_and_subtype).values())
+        seen.extend(self._objects(event, getattr(self.cfg_ana, 'input_objects', [])))
+        lost = self._objects(event, getattr(self.cfg_ana, 'lost_objects', []))
+        setattr(event, self.cfg_ana.output, event_weight(seen, lost))
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Welford
+from heppy.papas.detectors.FCCHiggsDetectors.calo_fit import \
+    ENERGY_EDGES, RESPONSE_FILE
+
+
+class CaloResponse(Analyzer):
+    '''Accumulates the calorimeter response on single particle samples,
+    for the fit of the calorimeter parametrizations, see calo_fit.py.
+
+    For each event, the ratio of the summed energy of the clusters to the
+    energy of the leading generated particle is accumulated in bins of
+    generated energy and of calorimeter region (barrel, endcap). Events
+    without any cluster are skipped. The running moments are saved in the
+    analyzer directory at the end of the loop.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.CaloResponse import CaloResponse
+        calo_response = cfg.Analyzer(
+            CaloResponse,
+            detector = detector,
+            calorimeter = 'ecal',
+            gen_particles = 'gen_particles_stable',
+            clusters = 'es'
+        )
+
+    @param detector: the simulated detector
+    @param calorimeter: 'ecal' or 'hcal'
+    @param gen_particles: name of the collection of generated particles
+    @param clusters: type_and_subtype of the papas clusters, e.g.
+      'es' (smeared ECAL clusters) or 'hs'.
+    @param buffer_size: number of events buffered before filling
+    '''
+
+    def beginLoop(self, setup):
+        super(CaloResponse, self).beginLoop(setup)
+        calo = self.cfg_ana.detector.elements[self.cfg_ana.calorimeter]
+        self.eta_crack = getattr(calo, 'eta_crack', None)
+        self.edges = np.asarray(ENERGY_EDGES)
+        self.accumulator = Welford((len(self.edges) - 1, 2))
+        self.buffer = []
+        self.buffer_size = getattr(self.cfg_ana, 'buffer_size', 1000)
+
+    def process(self, event):
+        ptcs = getattr(event, self.cfg_ana.gen_particles)
+        clusters = event.papasevent.get_collection(self.cfg_ana.clusters)
+        if not ptcs or not clusters:
+            return
+        gen = max(ptcs, key=lambda ptc: ptc.e())
+        energy = sum(cluster.energy for cluster in clusters.values())
+        self.buffer.append((gen.e(), abs(gen.eta()), energy / gen.e()))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        '''Fills the accumulator with the buffered events.'''
+        if not self.buffer:
+            return
+        energies, etas, ratios = np.array(self.buffer).T
+        self.buffer = []
+        ibin = np.searchsorted(self.edges, energies, side='right') - 1
+        inside = (ibin >= 0) & (ibin < len(self.edges) - 1)
+        if self.eta_crack is None:
+            region = np.zeros(len(etas), dtype=int)
+        else:
+            region = (etas > self.eta_crack).astype(int)
+        self.accumulator.fill(ratios[inside], (ibin[inside], region[inside]))
+
+    def endLoop(self, setup):
+        super(CaloResponse, self).endLoop(setup)
+        self.flush()
+        np.savez(os.path.join(self.dirName, RESPONSE_FILE),
+                 energy_edges=self.edges, **self.accumulator.arrays())
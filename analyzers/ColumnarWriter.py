@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.columnar import \
+    ColumnBuffer, ColumnarFile
+from heppy.papas.detectors.FCCHiggsDetectors.fingerprint import fingerprint
+from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+
+# dtype of the particle columns, in the order of _particles
+PARTICLE_DTYPE = np.dtype([('pdgid', np.int64), ('q', np.int64), ('pt', np.float64),
+                           ('eta', np.float64), ('phi', np.float64),
+                           ('e', np.float64), ('m', np.float64)])
+PARTICLE_ATTRIBUTES = list(PARTICLE_DTYPE.names)
+
+
+def _particles(ptcs):
+    '''Returns the structured array of the attributes of the particles.'''
+    return np.array([(ptc.pdgid(), ptc.q(), ptc.pt(), ptc.eta(), ptc.phi(),
+                      ptc.e(), ptc.m()) for ptc in ptcs], dtype=PARTICLE_DTYPE)
+
+
+class ColumnarWriter(Analyzer):
+    '''Writes particle collections and papas summaries to a columnar file,
+    see columnar.py.
+
+    The events are buffered in columns, and written in chunks of
+    chunk_size events. For each particle collection, the columns are
+    <collection>.n, the number of particles per event, and
+    <collection>.<attribute> for each attribute in PARTICLE_ATTRIBUTES.
+    For each papas collection of tracks or clusters, the columns are
+    <type_and_subtype>.n and <type_and_subtype>.energy, the number of
+    objects and their summed energy per event.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.ColumnarWriter import ColumnarWriter
+        columnar_writer = cfg.Analyzer(
+            ColumnarWriter,
+            detector = detector,
+            collections = ['rec_particles', 'sim_particles'],
+            papas_collections = ['ts', 'em', 'hm'],
+            chunk_size = 10000
+        )
+
+    @param detector: the detector, the fingerprint of which is recorded
+    @param collections: names of the particle collections in the event
+    @param papas_collections: type_and_subtypes of papas tracks and clusters
+    @param chunk_size: number of events per chunk
+    @param output: optional output directory, by default the columns
+      directory in the analyzer directory.
+    '''
+
+    def beginLoop(self, setup):
+        super(ColumnarWriter, self).beginLoop(setup)
+        directory = getattr(self.cfg_ana, 'output', None) or \
+            os.path.join(self.dirName, 'columns')
+        self.chunk_size = getattr(self.cfg_ana, 'chunk_size', 10000)
+        counts = dict(('.'.join([name, attribute]), name + '.n')
+                      for name in getattr(self.cfg_ana, 'collections', [])
+                      for attribute in PARTICLE_ATTRIBUTES)
+        self.output = ColumnarFile(directory, fingerprint(self.cfg_ana.detector),
+                                   counts, self.chunk_size)
+        dtypes = {'event.index': np.int64}
+        for name in getattr(self.cfg_ana, 'collections', []):
+            dtypes[name + '.n'] = np.int64
+            for attribute in PARTICLE_ATTRIBUTES:
+                dtypes['.'.join([name, attribute])] = PARTICLE_DTYPE[attribute]
+        for type_and_subtype in getattr(self.cfg_ana, 'papas_collections', []):
+            dtypes[type_and_subtype + '.n'] = np.int64
+            dtypes[type_and_subtype + '.energy'] = np.float64
+        self.buffer = ColumnBuffer(dtypes)
+        self.slog = StructuredLogger(self.logger)
+
+    def process(self, event):
+        values = {'event.index': event.iEv}
+        for name in getattr(self.cfg_ana, 'collections', []):
+            particles = _particles(getattr(event, name))
+            values[name + '.n'] = len(particles)
+            for attribute in PARTICLE_ATTRIBUTES:
+                values['.'.join([name, attribute])] = particles[attribute]
+        for type_and_subtype in getattr(self.cfg_ana, 'papas_collections', []):
+            objects = event.papasevent.get_collection(type_and_subtype).values()
+            values[type_and_subtype + '.n'] = len(objects)
+            values[type_and_subtype + '.energy'] = \
+                sum((getattr(obj, 'energy', 0.) for obj in objects), 0.)
+        self.buffer.add_event(values)
+        if self.buffer.nevents >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        '''Writes the buffered events as a new chunk.'''
+        if self.buffer.nevents:
+            self.output.append(self.buffer.arrays(), self.buffer.nevents)
+            self.slog.info('chunk', directory=self.output.directory,
+                           nevents=self.buffer.nevents)
+            self.buffer.clear()
+
+    def endLoop(self, setup):
+        super(ColumnarWriter, self).endLoop(setup)
+        self.flush()
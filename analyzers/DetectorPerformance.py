@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.performance import \
+    PerformanceSummary, SUMMARY_FILE, categories, match
+
+
+def _kinematics(ptcs):
+    '''Returns the array of (pt, |eta|, energy, eta, phi, charge, pdgid)
+    rows of the particles.'''
+    if not ptcs:
+        return np.empty((0, 7))
+    return np.array([(ptc.pt(), abs(ptc.eta()), ptc.e(), ptc.eta(), ptc.phi(),
+                      ptc.q(), ptc.pdgid()) for ptc in ptcs])
+
+
+class DetectorPerformance(Analyzer):
+    '''Fills the binned performance summary of the detector, see
+    performance.py: efficiency, energy response and pt resolution vs
+    |eta|, for each particle category.
+
+    Only the summary is saved, in the analyzer directory at the end of the
+    loop, with the name of the detector module. The events are buffered,
+    and the accumulators filled every buffer_size events.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.DetectorPerformance import DetectorPerformance
+        detector_performance = cfg.Analyzer(
+            DetectorPerformance,
+            detector = detector,
+            gen_particles = 'gen_particles_stable',
+            rec_particles = 'rec_particles',
+            max_dr = 0.1
+        )
+
+    @param detector: the simulated detector
+    @param gen_particles: name of the collection of generated particles
+    @param rec_particles: name of the collection of reconstructed particles
+    @param max_dr: maximum distance of the matching
+    @param buffer_size: number of events buffered before filling
+    '''
+
+    def beginLoop(self, setup):
+        super(DetectorPerformance, self).beginLoop(setup)
+        detector = self.cfg_ana.detector
+        self.summary = PerformanceSummary(type(detector).__module__.split('.')[-1])
+        self.max_dr = getattr(self.cfg_ana, 'max_dr', 0.1)
+        self.buffer = []
+        self.buffer_size = getattr(self.cfg_ana, 'buffer_size', 1000)
+
+    def process(self, event):
+        gen = _kinematics(getattr(event, self.cfg_ana.gen_particles))
+        rec = _kinematics(getattr(event, self.cfg_ana.rec_particles))
+        matched = match(gen[:, 3:6], rec[:, 3:6], self.max_dr)
+        rec_matched = np.full((len(gen), 3), np.nan)
+        ok = matched >= 0
+        rec_matched[ok] = rec[matched[ok], :3]
+        self.buffer.append((categories(gen[:, 6], gen[:, 5]), gen[:, :3], rec_matched))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        '''Fills the summary with the buffered events.'''
+        if not self.buffer:
+            return
+        icategories, gen, rec = [np.concatenate(arrays) for arrays in zip(*self.buffer)]
+        self.buffer = []
+        self.summary.fill(icategories, gen, rec)
+
+    def endLoop(self, setup):
+        super(DetectorPerformance, self).endLoop(setup)
+        self.flush()
+        self.summary.save(os.path.join(self.dirName, SUMMARY_FILE))
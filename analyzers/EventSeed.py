@@ -0,0 +1,39 @@
+import hashlib
+
+import numpy as np
+
+import heppy.statistics.rrandom as random
+from heppy.framework.analyzer import Analyzer
+
+
+def event_seed(seed, iev):
+    '''Returns the 32 bit seed of event number iev.'''
+    digest = hashlib.sha1('{}:{}'.format(seed, iev).encode()).hexdigest()
+    return int(digest[:8], 16)
+
+
+class EventSeed(Analyzer):
+    '''Reseeds the random generators at the beginning of each event, from
+    the seed and the event number.
+
+    The random numbers of an event then do not depend on the events
+    processed before, and a sample processed in several event ranges, see
+    shard.py, gives the same result as a single job. The seed of the event
+    is stored as event.seed, and used by PapasParametric.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.EventSeed import EventSeed
+        event_seed = cfg.Analyzer(
+            EventSeed,
+            seed = 0xdeadbeef
+        )
+
+    @param seed: the seed of the sample
+    '''
+
+    def process(self, event):
+        seed = event_seed(self.cfg_ana.seed, event.iEv)
+        random.seed(seed)
+        np.random.seed(seed)
+        event.seed = seed
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+from heppy.papas.detectors.FCCHiggsDetectors.veto import GenArrays, VETO_FILE
+
+
+class GenVeto(Analyzer):
+    '''Vetoes events at generator level, before the simulation, see veto.py.
+
+    The predicates are applied in order to the generated particles, and
+    the event is vetoed at the first one failing: process returns False,
+    and the following analyzers of the sequence are skipped. The number of
+    events passing each predicate is kept in the counter gen_veto, and saved
+    in the analyzer directory at the end of the loop.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.GenVeto import GenVeto
+        from heppy.papas.detectors.FCCHiggsDetectors.veto import leptons, dilepton_mass
+        gen_veto = cfg.Analyzer(
+            GenVeto,
+            gen_particles = 'gen_particles_stable',
+            predicates = [
+                ('leptons', leptons(2, pt_min=10.)),
+                ('mll', dilepton_mass(80., 100.)),
+            ]
+        )
+
+    @param gen_particles: name of the collection of generated particles
+    @param predicates: list of (name, function), the function taking the
+      GenArrays of the event and returning True to keep the event.
+    '''
+
+    def beginLoop(self, setup):
+        super(GenVeto, self).beginLoop(setup)
+        self.predicates = list(getattr(self.cfg_ana, 'predicates', []))
+        self.counts = np.zeros(len(self.predicates) + 1, dtype=int)
+        self.counters.addCounter('gen_veto')
+        counter = self.counters.counter('gen_veto')
+        counter.register('all')
+        for name, predicate in self.predicates:
+            counter.register(name)
+        self.slog = StructuredLogger(self.logger)
+
+    def process(self, event):
+        counter = self.counters.counter('gen_veto')
+        counter.inc('all')
+        self.counts[0] += 1
+        if not self.predicates:
+            return True
+        gen = GenArrays(getattr(event, self.cfg_ana.gen_particles))
+        for index, (name, predicate) in enumerate(self.predicates):
+            if not predicate(gen):
+                self.slog.debug('vetoed', event=event.iEv, predicate=name)
+                return False
+            counter.inc(name)
+            self.counts[index + 1] += 1
+        return True
+
+    def endLoop(self, setup):
+        super(GenVeto, self).endLoop(setup)
+        np.savez(os.path.join(self.dirName, VETO_FILE),
+                 names=['all'] + [name for name, predicate in self.predicates],
+                 counts=self.counts)
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.history import \
+    HistoryStore, MEMORY_FILE, apply_mode, deep_size
+from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+
+
+class HistoryMode(Analyzer):
+    '''Applies a storage mode to the papas history, see history.py.
+
+    To be scheduled right after PapasSim: the nodes of the simulation are
+    folded into a HistoryStore, and the nodes added later by the block
+    builder and the reconstruction are folded as soon as they are added.
+
+    For each event, the number of nodes and the bytes stored in the
+    history after the simulation are saved in the analyzer directory. If
+    measure is True, the size of the full history of the simulation and
+    the size of the history at the end of the event are saved as well,
+    the history of each event being kept until the next event.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.HistoryMode import HistoryMode
+        history_mode = cfg.Analyzer(
+            HistoryMode,
+            detector = detector,
+            mode = 'compact',
+            measure = False
+        )
+
+    @param detector: the simulated detector, recorded with the measurements
+    @param mode: 'full', 'compact' or 'off'
+    @param measure: if True, the full sizes are measured, which is slow.
+    '''
+
+    def beginLoop(self, setup):
+        super(HistoryMode, self).beginLoop(setup)
+        self.mode = getattr(self.cfg_ana, 'mode', 'full')
+        self.measure = getattr(self.cfg_ana, 'measure', False)
+        self.sizes = []
+        self.history = None
+        self.slog = StructuredLogger(self.logger)
+
+    def _size(self, history):
+        if isinstance(history, HistoryStore):
+            return history.nbytes()
+        return deep_size(history) if self.measure else np.nan
+
+    def _record(self):
+        '''Records the size of the history of the previous event, which is
+        complete once the next event is processed.'''
+        history, self.history = self.history, None
+        if history is not None:
+            self.sizes[-1][3:] = [len(history), self._size(history)]
+
+    def process(self, event):
+        self._record()
+        history = event.papasevent.history
+        simulated = np.nan
+        if self.measure and isinstance(history, dict):
+            simulated = deep_size(history)
+        apply_mode(event.papasevent, self.mode)
+        history = event.papasevent.history
+        self.sizes.append([simulated, len(history), self._size(history),
+                           np.nan, np.nan])
+        if self.measure:
+            self.history = history
+        self.slog.debug('history', event=event.iEv, mode=self.mode,
+                        nodes=self.sizes[-1][1], stored=self.sizes[-1][2])
+
+    def endLoop(self, setup):
+        super(HistoryMode, self).endLoop(setup)
+        self._record()
+        sizes = np.array(self.sizes, dtype=float).reshape(-1, 5)
+        detector = getattr(self.cfg_ana, 'detector', None)
+        name = type(detector).__module__.split('.')[-1] if detector else ''
+        np.savez(os.path.join(self.dirName, MEMORY_FILE),
+                 detector=name, mode=self.mode, simulated=sizes[:, 0],
+                 sim_nodes=sizes[:, 1], sim_stored=sizes[:, 2],
+                 nodes=sizes[:, 3], stored=sizes[:, 4])
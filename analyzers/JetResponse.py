@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.detectors.FCCHiggsDetectors.jec_calibration import \
+    ResponseAccumulator, RESPONSE_FILE
+
+
+def match(gen_etas, gen_phis, rec_etas, rec_phis, max_dr):
+    '''Returns, for each gen jet, the index of the closest rec jet within
+    max_dr, or -1.'''
+    if not len(gen_etas) or not len(rec_etas):
+        return np.full(len(gen_etas), -1, dtype=int)
+    deta = gen_etas[:, np.newaxis] - rec_etas[np.newaxis, :]
+    dphi = gen_phis[:, np.newaxis] - rec_phis[np.newaxis, :]
+    dphi = (dphi + np.pi) % (2 * np.pi) - np.pi
+    dr2 = deta**2 + dphi**2
+    closest = np.argmin(dr2, axis=1)
+    found = dr2[np.arange(len(gen_etas)), closest] < max_dr**2
+    return np.where(found, closest, -1)
+
+
+def _kinematics(jets):
+    if not jets:
+        return np.empty((3, 0))
+    return np.array([(jet.pt(), jet.eta(), jet.phi()) for jet in jets]).T
+
+
+class JetResponse(Analyzer):
+    '''Accumulates the jet response for the derivation of the jet energy
+    corrections, see jec_calibration.py.
+
+    Each gen jet is matched to the closest rec jet within max_dr, and the
+    response rec pt / gen pt is filled in bins of gen jet pt and |eta|.
+    The rec jets must not be corrected. The accumulated response is saved
+    in the analyzer directory at the end of the loop, and converted to
+    corrections in bins of rec jet pt by jec_calibration.fit.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.JetResponse import JetResponse
+        jet_response = cfg.Analyzer(
+            JetResponse,
+            gen_jets = 'gen_jets',
+            rec_jets = 'rec_jets',
+            max_dr = 0.3
+        )
+    '''
+
+    def beginLoop(self, setup):
+        super(JetResponse, self).beginLoop(setup)
+        self.accumulator = ResponseAccumulator()
+
+    def process(self, event):
+        gen_pts, gen_etas, gen_phis = _kinematics(getattr(event, self.cfg_ana.gen_jets))
+        rec_pts, rec_etas, rec_phis = _kinematics(getattr(event, self.cfg_ana.rec_jets))
+        matched = match(gen_etas, gen_phis, rec_etas, rec_phis,
+                        getattr(self.cfg_ana, 'max_dr', 0.3))
+        ok = matched >= 0
+        self.accumulator.fill(gen_pts[ok], gen_etas[ok],
+                              rec_pts[matched[ok]] / gen_pts[ok])
+
+    def endLoop(self, setup):
+        super(JetResponse, self).endLoop(setup)
+        self.accumulator.save(os.path.join(self.dirName, RESPONSE_FILE))
@@ -0,0 +1,165 @@
+import itertools
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.graphtools.edge import Edge
+from heppy.papas.pfalgo.blockbuilder import BlockBuilder
+from heppy.papas.pfalgo.distance import Distance
+from heppy.papas.detectors.FCCHiggsDetectors.blocks import \
+    connected_blocks, make_pool, process_blocks
+from heppy.papas.detectors.FCCHiggsDetectors.linking import \
+    cell_size, find_links, max_link_angle
+from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+
+# track path points used by the track - cluster links
+_TRACK_POINTS = ['ecal_in', 'hcal_in']
+
+LINK_FINDING = ['all', 'grid']
+
+
+def _positions(element):
+    '''Returns the positions used to link the element: the track points
+    at the calorimeter surfaces, or the positions of the cluster and of
+    its subclusters.'''
+    points = getattr(getattr(element, 'path', None), 'points', None)
+    if points is not None:
+        return [points[name] for name in _TRACK_POINTS if name in points]
+    return [element.position] + [sub.position for sub in element.subclusters]
+
+
+def _block_edges(task):
+    '''Returns the list of (id1, id2, is_linked, distance) of all the
+    pairs of elements of a block.
+
+    task: (block, elements, tested), elements being the dictionary
+      uid -> element of the block, and tested the dictionary
+      (id1, id2) -> (is_linked, distance) of the pairs already tested.
+    '''
+    block, elements, tested = task
+    ruler = Distance()
+    edges = []
+    for id1, id2 in itertools.combinations(block, 2):
+        if (id1, id2) in tested:
+            linked, distance = tested[(id1, id2)]
+        else:
+            link_type, linked, distance = ruler(elements[id1], elements[id2])
+        edges.append((id1, id2, linked, distance))
+    return edges
+
+
+def _clusters(element):
+    return [] if hasattr(element, 'path') else [element] + list(element.subclusters)
+
+
+class PFBlockBuilder(Analyzer):
+    '''Builds the blocks of tracks and clusters, as PapasPFBlockBuilder,
+    with a choice of link finding.
+
+    With link_finding = 'all', every pair of elements is tested for a
+    link, as in PapasPFBlockBuilder. With 'grid', the elements are put in
+    an eta-phi grid, see linking.py, and only the pairs of elements which
+    can be within the largest link angle of the event are tested.
+
+    In both modes, the blocks are the connected components of the links,
+    see blocks.py, and the edges of all the pairs of elements of each
+    block are given to the heppy BlockBuilder, so that the blocks and the
+    history are the same as with PapasPFBlockBuilder. The edges of the
+    blocks are computed block by block, sequentially or concurrently,
+    see block_mode.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.PFBlockBuilder import PFBlockBuilder
+        pfblocks = cfg.Analyzer(
+            PFBlockBuilder,
+            track_type_and_subtype = 'ts',
+            ecal_type_and_subtype = 'em',
+            hcal_type_and_subtype = 'hm',
+            detector = detector,
+            link_finding = 'grid',
+            block_mode = 'sequential'
+        )
+
+    @param track_type_and_subtype, ecal_type_and_subtype, hcal_type_and_subtype:
+      the collections of elements, as for PapasPFBlockBuilder
+    @param detector: the simulated detector, giving the grid cell size
+    @param link_finding: 'all' or 'grid'
+    @param block_mode: 'sequential', 'thread' or 'process', see
+      blocks.process_blocks. The process mode needs picklable elements.
+    @param nworkers: number of threads or processes, by default the
+      number of CPUs
+    '''
+
+    def beginLoop(self, setup):
+        super(PFBlockBuilder, self).beginLoop(setup)
+        self.link_finding = getattr(self.cfg_ana, 'link_finding', 'grid')
+        if self.link_finding not in LINK_FINDING:
+            raise ValueError('unknown link finding: ' + self.link_finding)
+        if self.link_finding == 'grid':
+            self.cell_size = cell_size(self.cfg_ana.detector)
+        self.ruler = Distance()
+        self.block_mode = getattr(self.cfg_ana, 'block_mode', 'sequential')
+        self.pool = make_pool(self.block_mode, getattr(self.cfg_ana, 'nworkers', None))
+        self.slog = StructuredLogger(self.logger)
+
+    def _link_angle(self, elements):
+        clusters = [cluster for element in elements for cluster in _clusters(element)]
+        if not clusters:
+            # tracks are not linked together
+            return None
+        radii = [position.Mag() for element in elements
+                 for position in _positions(element)]
+        return max_link_angle(max(cluster.angular_size() for cluster in clusters),
+                              max(cluster.size() for cluster in clusters),
+                              min(radii))
+
+    def process(self, event):
+        papasevent = event.papasevent
+        elements = dict()
+        for type_and_subtype in [self.cfg_ana.track_type_and_subtype,
+                                 self.cfg_ana.ecal_type_and_subtype,
+                                 self.cfg_ana.hcal_type_and_subtype]:
+            elements.update(papasevent.get_collection(type_and_subtype))
+        uids = sorted(elements)
+        # (id1, id2) -> (is_linked, distance) of the tested pairs
+        tested = dict()
+
+        def is_linked(id1, id2):
+            link_type, linked, distance = self.ruler(elements[id1], elements[id2])
+            tested[(id1, id2)] = (linked, distance)
+            return linked
+
+        if self.link_finding == 'all':
+            pairs = [(id1, id2) for id1, id2 in itertools.combinations(uids, 2)
+                     if is_linked(id1, id2)]
+        else:
+            angle = self._link_angle(elements.values())
+            if angle is None:
+                pairs = []
+            else:
+                directions = [(uid, position.Eta(), position.Phi())
+                              for uid in uids for position in _positions(elements[uid])]
+                pairs = find_links(directions, is_linked, self.cell_size, angle)
+        tasks = []
+        for block in connected_blocks(uids, pairs):
+            block_tested = dict((pair, tested[pair])
+                                for pair in itertools.combinations(block, 2)
+                                if pair in tested)
+            tasks.append((block, dict((uid, elements[uid]) for uid in block),
+                          block_tested))
+        edges = dict()
+        for block_edges in process_blocks(tasks, _block_edges, self.block_mode,
+                                          pool=self.pool,
+                                          size=lambda task: len(task[0])):
+            for id1, id2, linked, distance in block_edges:
+                edge = Edge(id1, id2, linked, distance)
+                edges[edge.key] = edge
+        blockbuilder = BlockBuilder(uids, edges, papasevent.history)
+        papasevent.add_collection(blockbuilder.blocks)
+        self.slog.debug('blocks', event=event.iEv, elements=len(uids),
+                        tested=len(tested), links=len(pairs), blocks=len(tasks))
+
+    def endLoop(self, setup):
+        super(PFBlockBuilder, self).endLoop(setup)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
@@ -0,0 +1,148 @@
+import logging
+
+from heppy.framework.analyzer import Analyzer
+from heppy.papas.pfalgo.pfreconstructor import PFReconstructor as BlockReconstructor
+from heppy.papas.detectors.FCCHiggsDetectors.blocks import \
+    BlockHistory, make_pool, merge_history, process_blocks
+from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+
+
+class _BlockEvent(object):
+    '''Papas event holding a single block, its elements, and a
+    BlockHistory, given to the heppy PFReconstructor.'''
+
+    def __init__(self, collections, history):
+        self.collections = collections
+        self.history = history
+        self.added = []
+
+    def get_collection(self, type_and_subtype):
+        return self.collections.get(type_and_subtype, dict())
+
+    def get_object(self, uid):
+        for collection in self.collections.values():
+            if uid in collection:
+                return collection[uid]
+        return None
+
+    def add_collection(self, collection):
+        self.added.append(collection)
+
+
+def _reconstruct_block(task):
+    '''Reconstructs one block, and returns the particles, the collections
+    added by the reconstruction and the BlockHistory.
+
+    task: (detector, logger name, blocks type and subtype, collections),
+      collections being the dictionary type and subtype -> collection of
+      the block and of its elements.
+    '''
+    detector, logger_name, blocksname, collections = task
+    known = [uid for collection in collections.values() for uid in collection]
+    event = _BlockEvent(collections, BlockHistory(known))
+    reconstructor = BlockReconstructor(detector, logging.getLogger(logger_name))
+    reconstructor.reconstruct(event, blocksname)
+    return reconstructor.particles, event.added, event.history
+
+
+class PFReconstructor(Analyzer):
+    '''Reconstructs the particles from the blocks, as PapasPFReconstructor,
+    block by block, sequentially or concurrently.
+
+    Each block is given, with its elements, to a heppy PFReconstructor of
+    its own, in a pool of threads or processes, see blocks.process_blocks.
+    Once all the blocks are reconstructed, the particles, the collections
+    added by the reconstruction (e.g. the split blocks) and the nodes and
+    links of the history recorded for each block, see blocks.BlockHistory,
+    are added to the papas event in the order of the block unique ids, so
+    the output does not depend on the block mode. The largest blocks are
+    submitted first, which cuts the time of the events with a few very
+    large blocks, e.g. jets.
+
+    The particles are the same as with PapasPFReconstructor, but their
+    unique ids are given by a reconstructor per block. An error is raised
+    if two blocks give the same unique id.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.PFReconstructor import PFReconstructor
+        pfreconstruct_blocks = cfg.Analyzer(
+            PFReconstructor,
+            track_type_and_subtype = 'ts',
+            ecal_type_and_subtype = 'em',
+            hcal_type_and_subtype = 'hm',
+            block_type_and_subtype = 'br',
+            detector = detector,
+            output = 'rec_particles',
+            block_mode = 'process'
+        )
+
+    @param track_type_and_subtype, ecal_type_and_subtype, hcal_type_and_subtype,
+      block_type_and_subtype: the collections of elements and of blocks,
+      as for PapasPFReconstructor
+    @param detector: the simulated detector
+    @param output: name of the list of reconstructed particles, sorted by
+      decreasing energy
+    @param block_mode: 'sequential', 'thread' or 'process', see
+      blocks.process_blocks. The process mode needs picklable elements
+      and detector. With threads, the python code of the reconstruction
+      does not run in parallel.
+    @param nworkers: number of threads or processes, by default the
+      number of CPUs
+    '''
+
+    def beginLoop(self, setup):
+        super(PFReconstructor, self).beginLoop(setup)
+        self.block_mode = getattr(self.cfg_ana, 'block_mode', 'sequential')
+        self.pool = make_pool(self.block_mode, getattr(self.cfg_ana, 'nworkers', None))
+        self.slog = StructuredLogger(self.logger)
+
+    def process(self, event):
+        papasevent = event.papasevent
+        blocksname = self.cfg_ana.block_type_and_subtype
+        elements = dict((type_and_subtype, papasevent.get_collection(type_and_subtype))
+                        for type_and_subtype in [self.cfg_ana.track_type_and_subtype,
+                                                 self.cfg_ana.ecal_type_and_subtype,
+                                                 self.cfg_ana.hcal_type_and_subtype])
+        blocks = papasevent.get_collection(blocksname)
+        tasks = []
+        for uid in sorted(blocks):
+            block = blocks[uid]
+            uids = set(block.element_uids)
+            collections = dict((name, dict((element_uid, element)
+                                           for element_uid, element in collection.items()
+                                           if element_uid in uids))
+                               for name, collection in elements.items())
+            collections[blocksname] = {uid: block}
+            tasks.append((self.cfg_ana.detector, self.logger.name, blocksname,
+                          collections))
+        particles = dict()
+        added = []
+        for block_particles, block_added, block_history in process_blocks(
+                tasks, _reconstruct_block, self.block_mode, pool=self.pool,
+                size=lambda task: sum(len(collection) for collection in task[3].values())):
+            if set(block_particles) & set(particles):
+                raise ValueError('particles of different blocks with the same '
+                                 'unique id, use PapasPFReconstructor')
+            merge_history(papasevent.history, block_history)
+            particles.update(block_particles)
+            # the collections added by each block, in the same order
+            for index, collection in enumerate(block_added):
+                if index == len(added):
+                    added.append(dict())
+                added[index].update(collection)
+        for collection in added:
+            if collection:
+                papasevent.add_collection(collection)
+        if particles:
+            papasevent.add_collection(particles)
+        setattr(event, self.cfg_ana.output,
+                sorted(particles.values(), key=lambda ptc: ptc.e(), reverse=True))
+        self.slog.debug('reconstructed', event=event.iEv, blocks=len(tasks),
+                        particles=len(particles))
+
+    def endLoop(self, setup):
+        super(PFReconstructor, self).endLoop(setup)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
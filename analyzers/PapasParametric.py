@@ -0,0 +1,220 @@
+import numpy as np
+from ROOT import TLorentzVector
+
+from heppy.framework.analyzer import Analyzer
+from heppy.particles.tlv.particle import Particle
+from heppy.papas.detectors.FCCHiggsDetectors import acceptance
+from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+from heppy.papas.detectors.FCCHiggsDetectors.maps import DetectorMaps
+from heppy.papas.detectors.FCCHiggsDetectors.probes import \
+    ProbeTrack, ProbeCluster
+
+ELECTRON, MUON, CHARGED, PHOTON, NEUTRAL = range(5)
+
+
+def _positive_gauss(rng, sigmas, max_draws=100):
+    '''Returns gaussian numbers of mean 1 and widths sigmas, drawn again
+    while they are not positive, so that smeared momenta keep their
+    direction. After max_draws, the remaining ones are clipped to the
+    smallest positive float.'''
+    values = rng.normal(1., sigmas)
+    sigmas = np.broadcast_to(sigmas, values.shape)
+    for i in range(max_draws):
+        negative = np.flatnonzero(values <= 0.)
+        if not len(negative):
+            return values
+        values[negative] = rng.normal(1., sigmas[negative])
+    return np.maximum(values, np.finfo(float).tiny)
+
+
+def _categories(pdgids, charges):
+    '''Returns the reconstruction category of each particle.'''
+    pdgids = np.abs(pdgids)
+    categories = np.where(charges != 0, CHARGED, NEUTRAL)
+    categories[pdgids == 22] = PHOTON
+    categories[pdgids == 11] = ELECTRON
+    categories[pdgids == 13] = MUON
+    return categories
+
+
+class PapasParametric(Analyzer):
+    '''Smear-only simulation, replacing the papas_sequence when no
+    particle flow is needed.
+
+    The stable generated particles are directly turned into reconstructed
+    particles, using the acceptances and resolutions of the detector:
+
+    - electrons and muons: lepton efficiencies and resolutions
+    - charged hadrons: tracker efficiency and resolution. charged hadrons
+      which are not tracked are treated as neutral hadrons.
+    - photons: ECAL efficiency, response and resolution
+    - neutral hadrons: HCAL efficiency, response and resolution
+
+    All random numbers of an event are drawn at once, and the calorimeter
+    energies are smeared with the batched smear methods of the calorimeters.
+    The momentum scale factors of the tracks and leptons are drawn again
+    while they are not positive, and the calorimeter particles with a
+    smeared energy which is not positive are dropped. The reconstructed
+    particles are sorted by decreasing energy, as in PapasPFReconstructor.
+    If maps are given (see maps.py), the efficiencies and the tracker and
+    lepton resolutions are interpolated in batch from the maps instead of
+    being computed particle by particle.
+    In the weight-based acceptance mode (see acceptance.py), all particles
+    with a non-zero efficiency are kept, with their acceptance weight.
+
+    Example::
+
+        from heppy.papas.detectors.FCCHiggsDetectors.analyzers.PapasParametric import PapasParametric
+        papas_parametric = cfg.Analyzer(
+            PapasParametric,
+            detector = detector,
+            gen_particles = 'gen_particles_stable',
+            output = 'rec_particles',
+            maps = None,
+            seed = 0xdeadbeef
+        )
+
+    @param detector: the detector, the single source of parametrization
+    @param gen_particles: name of the input collection of stable particles
+    @param output: name of the output collection of reconstructed particles,
+       as for PapasPFReconstructor
+    @param maps: optional path to the maps of the detector
+    @param seed: optional seed of the random generator. If the event has
+       a seed, see EventSeed.py, the random generator is reseeded with it.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(PapasParametric, self).__init__(*args, **kwargs)
+        self.detector = self.cfg_ana.detector
+        self.maps = None
+        path = getattr(self.cfg_ana, 'maps', None)
+        if path:
+            self.maps = DetectorMaps(path)
+            self.maps.check(self.detector)
+        self.rng = np.random.RandomState(getattr(self.cfg_ana, 'seed', None))
+        self.slog = StructuredLogger(self.logger)
+
+    def _efficiency_resolution(self, category, ptcs, pts, es, etas):
+        '''Returns the arrays of efficiencies and relative resolutions
+        for particles of one category. The calorimeter resolutions are
+        computed when smearing.'''
+        detector = self.detector
+        tracker = detector.elements['tracker']
+        if self.maps:
+            names = {ELECTRON: ('electron_efficiency', 'electron_resolution'),
+                     MUON: ('muon_efficiency', 'muon_resolution'),
+                     CHARGED: ('tracker_efficiency', 'tracker_resolution'),
+                     PHOTON: ('ecal_efficiency', None),
+                     NEUTRAL: ('hcal_efficiency', None)}[category]
+            xs = es if category in (PHOTON, NEUTRAL) else pts
+            eff = self.maps(names[0], xs, etas)
+            res = self.maps(names[1], xs, etas) if names[1] else None
+            return eff, res
+        if category == ELECTRON:
+            if hasattr(detector, 'electron_efficiency_formula'):
+                eff = detector.electron_efficiency_formula(pt=pts, eta=etas)
+            else:
+                eff = [detector.electron_efficiency(ptc) for ptc in ptcs]
+            res = [detector.electron_resolution(ptc) for ptc in ptcs]
+        elif category == MUON:
+            if hasattr(detector, 'muon_efficiency_formula'):
+                eff = detector.muon_efficiency_formula(pt=pts, eta=etas)
+            else:
+                eff = [detector.muon_efficiency(ptc) for ptc in ptcs]
+            if hasattr(detector, 'muon_resolutions'):
+                res = detector.muon_resolutions(pts, etas)
+            elif hasattr(detector, 'muon_resolution_formula'):
+                res = detector.muon_resolution_formula(pt=pts, eta=etas)
+            else:
+                res = [detector.muon_resolution(ptc) for ptc in ptcs]
+        elif category == CHARGED:
+            tracks = [ProbeTrack(ptc.pt(), ptc.eta(), ptc.phi()) for ptc in ptcs]
+            if hasattr(tracker, 'efficiencies'):
+                eff = tracker.efficiencies(pts, etas)
+            else:
+                eff = [tracker.efficiency(track) for track in tracks]
+            if hasattr(tracker, 'resolutions'):
+                res = tracker.resolutions(pts, etas)
+            else:
+                res = [tracker.resolution(track) for track in tracks]
+        else:
+            calo = detector.elements['ecal' if category == PHOTON else 'hcal']
+            if hasattr(calo, 'efficiencies'):
+                eff = calo.efficiencies(es, etas)
+            else:
+                eff = [calo.efficiency(ProbeCluster(ptc.e(), ptc.eta(), ptc.phi()))
+                       for ptc in ptcs]
+            res = None
+        return np.array(eff, dtype=float), res
+
+    def _make_particle(self, pdgid, charge, pt, eta, phi, m, weight):
+        tlv = TLorentzVector()
+        tlv.SetPtEtaPhiM(pt, eta, phi, m)
+        particle = Particle(pdgid, charge, tlv)
+        if __debug__:
+            self.slog.debug('reconstructed', pdgid=pdgid, pt=pt, eta=eta,
+                            phi=phi, weight=weight)
+        if acceptance.mode == 'weight':
+            particle.acceptance_weight = weight
+        return particle
+
+    def process(self, event):
+        ptcs = getattr(event, self.cfg_ana.gen_particles)
+        rec_particles = []
+        setattr(event, self.cfg_ana.output, rec_particles)
+        if not ptcs:
+            return
+        pdgids = np.array([ptc.pdgid() for ptc in ptcs])
+        charges = np.array([ptc.q() for ptc in ptcs])
+        kinematics = np.array([(ptc.pt(), ptc.eta(), ptc.phi(), ptc.e(), ptc.m())
+                               for ptc in ptcs])
+        pts, etas, phis, es, ms = kinematics.T
+        categories = _categories(pdgids, charges)
+        rng = self.rng
+        if hasattr(event, 'seed'):
+            rng = np.random.RandomState(event.seed)
+        # one random number for tracking, one for the calorimeters
+        randoms = rng.uniform(size=(2, len(ptcs)))
+
+        def accepted(category, indices, row):
+            eff, res = self._efficiency_resolution(
+                category, [ptcs[i] for i in indices],
+                pts[indices], es[indices], etas[indices])
+            if acceptance.mode == 'weight':
+                seen = eff > 0.
+            else:
+                seen = randoms[row, indices] < eff
+            return indices[seen], eff[seen], None if res is None else np.asarray(res)[seen]
+
+        # tracks and leptons: momentum smearing
+        untracked = []
+        for category in (ELECTRON, MUON, CHARGED):
+            indices = np.flatnonzero(categories == category)
+            if not len(indices):
+                continue
+            seen, eff, res = accepted(category, indices, 0)
+            if category == CHARGED:
+                untracked.extend(np.setdiff1d(indices, seen))
+            if __debug__:
+                self.slog.debug('tracked', category=category,
+                                n=len(indices), seen=len(seen))
+            scales = _positive_gauss(rng, res)
+            for i, w, scale in zip(seen, eff, scales):
+                rec_particles.append(self._make_particle(
+                    int(pdgids[i]), int(charges[i]), pts[i] * scale,
+                    etas[i], phis[i], ms[i], w))
+        # calorimeter clusters: energy smearing
+        categories[np.array(untracked, dtype=int)] = NEUTRAL
+        for category, name, pdgid in ((PHOTON, 'ecal', 22), (NEUTRAL, 'hcal', 130)):
+            indices = np.flatnonzero(categories == category)
+            if not len(indices):
+                continue
+            seen, eff, _ = accepted(category, indices, 1)
+            energies, _ = self.detector.elements[name].smear(
+                es[seen], etas[seen], rng)
+            for i, w, energy in zip(seen, eff, energies):
+                if energy <= 0.:
+                    continue
+                rec_particles.append(self._make_particle(
+                    pdgid, 0, energy / np.cosh(etas[i]), etas[i], phis[i], 0., w))
+        rec_particles.sort(key=lambda ptc: ptc.e(), reverse=True)
@@ -0,0 +1,349 @@
+'''Throughput benchmarks of the detector modules, with a baseline store.
+
+For each detector module, the benchmarks measure:
+
+- method:<name>: objects per second of the scalar and batch
+  parametrizations (resolutions, smearing, acceptances...)
+- sequence:<name>: events per second of the papas_sequence (full
+  simulation and particle flow) and of the parametric_sequence
+  (PapasParametric) of the config of the module, see config/, on
+  synthetic events. The analyzers of each module and sequence are
+  created in their own directory.
+
+Each benchmark is repeated, and its median and median absolute deviation
+(MAD) are stored. The throughputs depend on the machine, so no baseline
+is shipped with the package: the baseline, benchmarks/baseline.json by
+default, is recorded on the machine used for the comparisons, with heppy
+and ROOT installed for the sequence benchmarks, from the revision to
+compare to. record updates the benchmarks it runs, and keeps the
+others::
+
+    python benchmark.py record -r 7 CMS CMS_2T
+    python benchmark.py record -q papas CMS
+
+To compare the current code to the baseline::
+
+    python benchmark.py compare -t 0.1 CMS CMS_2T
+
+A benchmark is flagged as a regression if its median throughput dropped
+by more than the threshold (10% by default), and if the drop is larger
+than nsigma times the noise estimated from the MADs of both
+measurements. The command exits with status 1 if any benchmark regressed.
+
+The speedup of the parametric sequence over the papas sequence, measured
+on the same events, is printed by::
+
+    python benchmark.py speedup -m 10 -o benchmarks/speedup.json CMS CMS_2T
+
+which exits with status 1 if a speedup is below the minimum given, or if
+a module misses one of the sequences, and records the measurements in
+the output file if one is given.
+'''
+
+from __future__ import print_function
+
+import datetime
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors.equivalence import MODULES, sample
+from heppy.papas.detectors.FCCHiggsDetectors.probes import \
+    ProbeCluster, ProbeParticle, ProbeTrack
+
+FORMAT = 1
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'benchmarks', 'baseline.json')
+
+SEQUENCES = ['papas', 'parametric']
+
+
+def _throughput(func, nitems, runs):
+    '''Returns the list of items per second of runs calls of func.'''
+    values = []
+    for i in range(runs):
+        start = timeit.default_timer()
+        func()
+        values.append(nitems / max(timeit.default_timer() - start, 1e-12))
+    return values
+
+
+def _stats(values):
+    values = np.asarray(values, dtype=float)
+    median = float(np.median(values))
+    return dict(median=median, mad=float(np.median(np.abs(values - median))),
+                runs=values.tolist())
+
+
+def method_benchmarks(detector, n, rng):
+    '''Returns the dictionary name -> function of the method benchmarks,
+    each processing n objects.'''
+    pts, energies, etas = sample(n, rng)
+    tracks = [ProbeTrack(pt, eta) for pt, eta in zip(pts, etas)]
+    clusters = [ProbeCluster(e, eta) for e, eta in zip(energies, etas)]
+    muons = [ProbeParticle(13, pt, eta) for pt, eta in zip(pts, etas)]
+    tracker = detector.elements['tracker']
+    benchmarks = dict()
+    for name in ['ecal', 'hcal']:
+        calo = detector.elements[name]
+        benchmarks[name + '.energy_resolution'] = lambda calo=calo: [
+            calo.energy_resolution(e, eta) for e, eta in zip(energies, etas)]
+        benchmarks[name + '.smear'] = lambda calo=calo: calo.smear(
+            energies, etas, rng)
+        benchmarks[name + '.acceptance'] = lambda calo=calo: [
+            calo.acceptance(cluster) for cluster in clusters]
+    benchmarks['tracker.resolution'] = lambda: [
+        tracker.resolution(track) for track in tracks]
+    if hasattr(tracker, 'resolutions'):
+        benchmarks['tracker.resolutions'] = lambda: tracker.resolutions(pts, etas)
+    benchmarks['tracker.acceptance'] = lambda: [
+        tracker.acceptance(track) for track in tracks]
+    benchmarks['muon_efficiency'] = lambda: [
+        detector.muon_efficiency(ptc) for ptc in muons]
+    benchmarks['muon_resolution'] = lambda: [
+        detector.muon_resolution(ptc) for ptc in muons]
+    return benchmarks
+
+
+class _Event(object):
+    pass
+
+
+def _gen_event(rng, nparticles):
+    from ROOT import TLorentzVector
+    from heppy.particles.tlv.particle import Particle
+    species = [(211, 1, 0.1396), (-211, -1, 0.1396), (22, 0, 0.), (130, 0, 0.497),
+               (11, -1, 0.000511), (-13, 1, 0.105)]
+    ptcs = []
+    for index in rng.randint(len(species), size=nparticles):
+        pdgid, charge, mass = species[index]
+        tlv = TLorentzVector()
+        tlv.SetPtEtaPhiM(rng.exponential(8.) + 0.2, rng.uniform(-3., 3.),
+                         rng.uniform(-math.pi, math.pi), mass)
+        ptcs.append(Particle(pdgid, charge, tlv))
+    return ptcs
+
+
+def sequence_benchmark(module_name, sequence, nevents, rng, workdir):
+    '''Returns the function running the analyzers of the sequence of the
+    config of the module, e.g. papas_sequence of config/cfg_CMS.py, on
+    nevents synthetic events of 60 particles.
+
+    The analyzers are created in workdir, which must not exist.'''
+    import importlib
+    config = importlib.import_module(
+        'heppy.papas.detectors.FCCHiggsDetectors.config.cfg_' + module_name)
+    os.mkdir(workdir)
+    analyzers = [cfg_ana.class_object(cfg_ana, None, workdir)
+                 for cfg_ana in getattr(config, sequence + '_sequence')]
+    for analyzer in analyzers:
+        analyzer.beginLoop(None)
+    gen_particles = [_gen_event(rng, 60) for i in range(nevents)]
+
+    def run():
+        for i, ptcs in enumerate(gen_particles):
+            event = _Event()
+            event.iEv = i
+            event.gen_particles = ptcs
+            for analyzer in analyzers:
+                if analyzer.process(event) is False:
+                    break
+    return run
+
+
+def run(modules, n=20000, nevents=200, runs=5, seed=1, sequences=SEQUENCES):
+    '''Runs the benchmarks and returns the results dictionary
+    module -> benchmark -> dict(median, mad, runs).'''
+    import importlib
+    results = dict()
+    workdir = tempfile.mkdtemp()
+    try:
+        for module_name in modules:
+            module = importlib.import_module(
+                'heppy.papas.detectors.FCCHiggsDetectors.' + module_name)
+            detector = module.CMS()
+            rng = np.random.RandomState(seed)
+            module_results = results.setdefault(module_name, dict())
+            for name, func in sorted(method_benchmarks(detector, n, rng).items()):
+                module_results['method:' + name] = _stats(_throughput(func, n, runs))
+            for sequence in sequences:
+                func = sequence_benchmark(
+                    module_name, sequence, nevents, rng,
+                    os.path.join(workdir, module_name + '_' + sequence))
+                module_results['sequence:' + sequence] = _stats(
+                    _throughput(func, nevents, runs))
+    finally:
+        shutil.rmtree(workdir)
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(results, path=BASELINE):
+    '''Writes the results to the baseline file at path. The benchmarks of
+    the baseline which are not in the results are kept.'''
+    if os.path.exists(path):
+        previous = load(path)['results']
+        for module_name, module_results in results.items():
+            previous.setdefault(module_name, dict()).update(module_results)
+        results = previous
+    data = dict(format=FORMAT,
+                created=datetime.datetime.utcnow().isoformat(),
+                revision=_git_revision(), host=platform.node(),
+                python=platform.python_version(), numpy=np.__version__,
+                results=results)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as out:
+        json.dump(data, out, indent=2, sort_keys=True)
+    os.rename(tmp, path)
+
+
+def load(path=BASELINE):
+    if not os.path.exists(path):
+        raise IOError('no baseline file {}, record one with: '
+                      'python benchmark.py record'.format(path))
+    with open(path) as infile:
+        data = json.load(infile)
+    if data.get('format') != FORMAT:
+        raise ValueError('{}: unsupported baseline format {}'.format(
+            path, data.get('format')))
+    return data
+
+
+def compare(baseline, current, threshold=0.1, nsigma=3.):
+    '''Compares the current results to the baseline results.
+
+    Returns the list of (module, benchmark, baseline median, current
+    median, relative change, regressed).
+    '''
+    rows = []
+    for module_name in sorted(current):
+        for name in sorted(current[module_name]):
+            base = baseline.get(module_name, dict()).get(name)
+            if base is None:
+                continue
+            cur = current[module_name][name]
+            change = cur['median'] / base['median'] - 1.
+            # 1.4826 MAD estimates the standard deviation of gaussian noise
+            noise = 1.4826 * math.sqrt(base['mad']**2 + cur['mad']**2)
+            regressed = change < -threshold and \
+                base['median'] - cur['median'] > nsigma * noise
+            rows.append((module_name, name, base['median'], cur['median'],
+                         change, regressed))
+    return rows
+
+
+def speedup(results):
+    '''Returns the list of (module, papas events/s, parametric events/s,
+    speedup) of the modules of the results with both sequences.'''
+    rows = []
+    for module_name in sorted(results):
+        module_results = results[module_name]
+        if not all('sequence:' + sequence in module_results for sequence in SEQUENCES):
+            continue
+        papas, parametric = [module_results['sequence:' + sequence]['median']
+                             for sequence in SEQUENCES]
+        rows.append((module_name, papas, parametric, parametric / papas))
+    return rows
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog record|compare|speedup [options] [detector module] ...')
+    parser.add_option('-b', '--baseline', default=BASELINE,
+                      help='baseline file')
+    parser.add_option('-c', '--current', default=None,
+                      help='compare: results file to compare instead of running')
+    parser.add_option('-o', '--output', default=None,
+                      help='record: output file, by default the baseline file; '
+                      'speedup: file to record the measurements in')
+    parser.add_option('-n', '--nobjects', type='int', default=20000,
+                      help='number of objects of the method benchmarks')
+    parser.add_option('-e', '--nevents', type='int', default=200,
+                      help='number of events of the sequence benchmarks')
+    parser.add_option('-q', '--sequences', default=','.join(SEQUENCES),
+                      help='comma-separated sequences to benchmark, among ' +
+                      ', '.join(SEQUENCES))
+    parser.add_option('-r', '--runs', type='int', default=5,
+                      help='number of runs of each benchmark')
+    parser.add_option('-t', '--threshold', type='float', default=0.1,
+                      help='relative slowdown flagged as a regression')
+    parser.add_option('-s', '--nsigma', type='float', default=3.,
+                      help='minimum slowdown in units of the noise')
+    parser.add_option('-m', '--min-speedup', dest='min_speedup', type='float',
+                      default=10., help='speedup: minimum speedup of the '
+                      'parametric sequence over the papas sequence')
+    options, args = parser.parse_args()
+    if not args or args[0] not in ('record', 'compare', 'speedup'):
+        parser.error('please give the command, record, compare or speedup')
+    modules = args[1:] or MODULES
+    sequences = [name for name in options.sequences.split(',') if name]
+    unknown = set(sequences) - set(SEQUENCES)
+    if unknown:
+        parser.error('unknown sequences: ' + ', '.join(sorted(unknown)))
+    if args[0] == 'record':
+        results = run(modules, options.nobjects, options.nevents, options.runs,
+                      sequences=sequences)
+        record(results, options.output or options.baseline)
+        sys.exit(0)
+    if args[0] == 'speedup':
+        if options.current:
+            results = load(options.current)['results']
+        else:
+            results = run(modules, options.nobjects, options.nevents, options.runs,
+                          sequences=SEQUENCES)
+            if options.output:
+                record(results, options.output)
+        rows = speedup(results)
+        measured = set(row[0] for row in rows)
+        incomplete = [module_name for module_name in sorted(results)
+                      if module_name not in measured]
+        print('{:20} {:>12} {:>14} {:>8}'.format(
+            'module', 'papas/s', 'parametric/s', 'speedup'))
+        for module_name, papas, parametric, ratio in rows:
+            print('{:20} {:12.4g} {:14.4g} {:8.1f} {}'.format(
+                module_name, papas, parametric, ratio,
+                'TOO SLOW' if ratio < options.min_speedup else ''))
+        for module_name in incomplete:
+            print('{:20} missing sequences'.format(module_name))
+        sys.exit(1 if incomplete or not rows or
+                 any(row[-1] < options.min_speedup for row in rows) else 0)
+    try:
+        baseline = load(options.baseline)['results']
+        if options.current:
+            current = load(options.current)['results']
+    except (IOError, ValueError) as error:
+        parser.error(str(error))
+    if not options.current:
+        current = run(modules, options.nobjects, options.nevents, options.runs,
+                      sequences=sequences)
+    rows = compare(baseline, current, options.threshold, options.nsigma)
+    missing = [(module_name, name) for module_name in sorted(current)
+               for name in sorted(current[module_name])
+               if name not in baseline.get(module_name, dict())]
+    print('{:20} {:36} {:>12} {:>12} {:>8}'.format(
+        'module', 'benchmark', 'baseline/s', 'current/s', 'change'))
+    for module_name, name, base, cur, change, regressed in rows:
+        print('{:20} {:36} {:12.4g} {:12.4g} {:+7.1%} {}'.format(
+            module_name, name, base, cur, change, 'REGRESSION' if regressed else ''))
+    for module_name, name in missing:
+        print('{:20} {:36} not in the baseline'.format(module_name, name))
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
@@ -0,0 +1,193 @@
+'''Block decomposition and parallel per-block processing.
+
+Blocks are the connected components of the graph of linked elements.
+They are independent, and can be reconstructed concurrently.
+
+A block processed in a worker must not change the history of the event,
+which is shared by all blocks, and is lost with a process pool. It is
+given a BlockHistory instead, which records the nodes and links made by
+the block, and the records are merged into the history of the event in
+the order of the blocks, with merge_history, once the pool returns.
+'''
+
+from array import array
+from collections import OrderedDict
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+
+class UnionFind(object):
+    '''Array-backed union-find over the integers 0 ... n-1.
+
+    Uses union by size and path halving.
+    '''
+
+    def __init__(self, n):
+        self.parent = array('l', range(n))
+        self.size = array('l', [1] * n)
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        ri = self.find(i)
+        rj = self.find(j)
+        if ri == rj:
+            return ri
+        if self.size[ri] < self.size[rj]:
+            ri, rj = rj, ri
+        self.parent[rj] = ri
+        self.size[ri] += self.size[rj]
+        return ri
+
+
+def connected_blocks(ids, pairs):
+    '''Returns the blocks of linked elements.
+
+    ids: element identifiers.
+    pairs: iterable of linked (id1, id2) pairs.
+
+    Each block is a sorted list of identifiers, and the blocks are sorted
+    by their first identifier, so that the result does not depend on the
+    order of ids and pairs. Isolated elements make their own block.
+    '''
+    ids = sorted(ids)
+    index = dict((uid, i) for i, uid in enumerate(ids))
+    uf = UnionFind(len(ids))
+    for id1, id2 in pairs:
+        uf.union(index[id1], index[id2])
+    blocks = dict()
+    # ids are sorted, so each block is built sorted
+    for i, uid in enumerate(ids):
+        blocks.setdefault(uf.find(i), []).append(uid)
+    return sorted(blocks.values(), key=lambda block: block[0])
+
+
+def _call(args):
+    func, i, block = args
+    return i, func(block)
+
+
+def make_pool(mode, nworkers=None):
+    '''Returns a pool of nworkers threads or processes for process_blocks,
+    or None for the sequential mode.'''
+    if mode == 'sequential':
+        return None
+    elif mode == 'thread':
+        return ThreadPool(nworkers)
+    elif mode == 'process':
+        return Pool(nworkers)
+    raise ValueError('unknown block processing mode: ' + mode)
+
+
+def process_blocks(blocks, func, mode='sequential', nworkers=None, pool=None,
+                   size=len):
+    '''Applies func to each block and returns the list of results,
+    in the order of the blocks.
+
+    mode:
+      'sequential': blocks are processed one after the other.
+      'thread': blocks are processed in a pool of nworkers threads.
+      'process': blocks are processed in a pool of nworkers processes.
+         func and the blocks must then be picklable.
+    pool: a pool given by make_pool, reused instead of creating one,
+      e.g. for all the events of a job. it is not closed.
+    size: function returning the size of a block.
+
+    The largest blocks are submitted first, so that a single large block
+    does not end up being processed last. The results are put back in
+    the order of the blocks, so the output is the same in all modes.
+    '''
+    if (mode == 'sequential' and pool is None) or len(blocks) < 2:
+        return [func(block) for block in blocks]
+    own_pool = pool is None
+    if own_pool:
+        pool = make_pool(mode, nworkers)
+    order = sorted(range(len(blocks)), key=lambda i: -size(blocks[i]))
+    results = [None] * len(blocks)
+    try:
+        tasks = [(func, i, blocks[i]) for i in order]
+        for i, result in pool.imap_unordered(_call, tasks):
+            results[i] = result
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+    return results
+
+
+class _Stub(object):
+    '''Node of the history of the event seen from a block: the links
+    made to it are recorded, and made to the node of the event by
+    merge_history.'''
+
+    def __init__(self, value):
+        self.value = value
+        self.children = []
+        self.parents = []
+
+    def get_value(self):
+        return self.value
+
+    def add_child(self, child):
+        self.children.append(child)
+        child.parents.append(self)
+
+    def add_parent(self, parent):
+        parent.add_child(self)
+
+
+class BlockHistory(object):
+    '''History of the event seen from a block.
+
+    known: unique ids of the nodes of the history of the event that the
+      block can link to, e.g. the block and its elements.
+
+    The nodes added are kept in nodes, in the order they were added, and
+    the nodes of the event are looked up as stubs, kept in stubs.
+    '''
+
+    def __init__(self, known):
+        self.known = set(known)
+        self.nodes = OrderedDict()
+        self.stubs = OrderedDict()
+
+    def __contains__(self, uid):
+        return uid in self.nodes or uid in self.known
+
+    def __getitem__(self, uid):
+        if uid in self.nodes:
+            return self.nodes[uid]
+        if uid not in self.known:
+            raise KeyError(uid)
+        if uid not in self.stubs:
+            self.stubs[uid] = _Stub(uid)
+        return self.stubs[uid]
+
+    def __setitem__(self, uid, node):
+        self.nodes[uid] = node
+
+    def get(self, uid, default=None):
+        return self[uid] if uid in self else default
+
+
+def merge_history(history, block_history):
+    '''Adds the nodes and the links recorded in block_history to the
+    history of the event.'''
+    for node in block_history.nodes.values():
+        node.children = [child for child in node.children
+                         if not isinstance(child, _Stub)]
+        node.parents = [parent for parent in node.parents
+                        if not isinstance(parent, _Stub)]
+    for uid, node in block_history.nodes.items():
+        history[uid] = node
+    for uid, stub in block_history.stubs.items():
+        for child in stub.children:
+            history[uid].add_child(history[child.value])
+        for parent in stub.parents:
+            if not isinstance(parent, _Stub):
+                history[parent.value].add_child(history[uid])
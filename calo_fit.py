@@ -0,0 +1,277 @@
+'''Fit of the calorimeter resolution and response parameters.
+
+The ECAL and HCAL classes hold the parameters of
+
+- the relative energy resolution, eres:
+  sqrt( ([0]/sqrt(E))^2 + ([1]/E)^2 + [2]^2 )
+- the energy response, eresp, a fermi-dirac function:
+  [0]/(1 + exp( (E-[1]) /[2] ))
+
+for the barrel and the endcap. This tool:
+
+1. runs single particle samples through PapasSim with heppy, for each
+   detector variant and calorimeter, in parallel. The calibration config,
+   by default config/calo_calibration_cfg.py, contains the CaloResponse
+   analyzer, see analyzers/CaloResponse.py, and gets the detector variant
+   and the calorimeter as the heppy options detector and calorimeter.
+2. merges the accumulated reco / gen energy ratios of all jobs.
+3. fits the resolution and the response of all variants and regions at
+   once: a weighted linear least squares for the squared resolution,
+   and a batched Levenberg-Marquardt for the response.
+4. writes the new parameters into the detector modules.
+
+Example::
+
+    python calo_fit.py -N 100000 -w work CMS CMS_2T
+
+The HCAL of the CMS-like variants starts without response (eresp None):
+the fitted response is used once written in the module.
+'''
+
+from __future__ import print_function
+
+import importlib
+import os
+import re
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Welford
+
+ENERGY_EDGES = np.logspace(0, np.log10(200.), 31)
+CALORIMETERS = ['ecal', 'hcal']
+CALIBRATION_CFG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'config', 'calo_calibration_cfg.py')
+RESPONSE_FILE = 'calo_response.npz'
+REGIONS = ['barrel', 'endcap']
+
+
+def collect(outdir):
+    '''Returns the energy bin edges and the merged Welford accumulator
+    of all jobs in outdir, or None, None if there is none.'''
+    edges, merged = None, None
+    for dirpath, dirnames, filenames in sorted(os.walk(outdir)):
+        if RESPONSE_FILE not in filenames:
+            continue
+        with np.load(os.path.join(dirpath, RESPONSE_FILE)) as data:
+            edges = data['energy_edges']
+            acc = Welford.from_arrays(data['n'], data['mean'], data['m2'])
+        merged = acc if merged is None else merged.merge(acc)
+    return edges, merged
+
+
+def fit_resolution(energies, sigmas, weights):
+    '''Fits sigma^2 = a^2/E + b^2/E^2 + c^2 for a batch of fits.
+
+    energies, sigmas, weights: arrays of shape (nfits, npoints).
+    points with a weight of 0 are ignored.
+    Returns the (nfits, 3) array of (a, b, c).
+    '''
+    design = np.stack([1. / energies, 1. / energies**2,
+                       np.ones_like(energies)], axis=-1)
+    weighted = design * weights[..., np.newaxis]
+    lhs = np.einsum('kni,knj->kij', weighted, design)
+    rhs = np.einsum('kni,kn->ki', weighted, sigmas**2)
+    # small regularization for fits with few points
+    lhs += 1e-12 * np.eye(3)
+    coefs = np.linalg.solve(lhs, rhs[..., np.newaxis])[..., 0]
+    return np.sqrt(np.maximum(coefs, 0.))
+
+
+def fermi_dirac(energies, pars):
+    '''[0]/(1 + exp( (E-[1]) /[2] )) for a batch of parameters (nfits, 3).'''
+    x = np.clip((energies - pars[:, 1:2]) / pars[:, 2:3], -50., 50.)
+    return pars[:, 0:1] / (1. + np.exp(x))
+
+
+def _jacobian(energies, pars):
+    x = np.clip((energies - pars[:, 1:2]) / pars[:, 2:3], -50., 50.)
+    ex = np.exp(x)
+    d0 = 1. / (1. + ex)
+    d1 = pars[:, 0:1] * ex / (1. + ex)**2 / pars[:, 2:3]
+    d2 = d1 * (energies - pars[:, 1:2]) / pars[:, 2:3]
+    return np.stack([d0, d1, d2], axis=-1)
+
+
+def fit_response(energies, responses, weights, start, niter=100):
+    '''Fits the fermi-dirac response for a batch of fits with
+    Levenberg-Marquardt.
+
+    energies, responses, weights: arrays of shape (nfits, npoints).
+    start: (nfits, 3) array of starting parameters.
+    Returns the (nfits, 3) array of parameters.
+    '''
+    pars = np.array(start, dtype=float)
+    damping = np.full(len(pars), 1e-3)
+
+    def chi2(p):
+        return (weights * (responses - fermi_dirac(energies, p))**2).sum(axis=1)
+
+    current = chi2(pars)
+    for i in range(niter):
+        jac = _jacobian(energies, pars)
+        residuals = responses - fermi_dirac(energies, pars)
+        weighted = jac * weights[..., np.newaxis]
+        jtj = np.einsum('kni,knj->kij', weighted, jac)
+        grad = np.einsum('kni,kn->ki', weighted, residuals)
+        diag = np.einsum('kii->ki', jtj)
+        lhs = jtj + (damping[:, np.newaxis] * (diag + 1e-12))[..., np.newaxis] * np.eye(3)
+        step = np.linalg.solve(lhs, grad[..., np.newaxis])[..., 0]
+        trial = pars + step
+        new = chi2(trial)
+        better = np.isfinite(new) & (new < current)
+        pars[better] = trial[better]
+        current[better] = new[better]
+        damping = np.where(better, damping / 10., damping * 10.)
+    return pars
+
+
+def _format(pars):
+    return '[' + ', '.join('{:.6g}'.format(par) for par in pars) + ']'
+
+
+def _replace(source, classname, attribute, pars):
+    '''Replaces the self.<attribute> line of class classname in source.
+    Returns the new source, unchanged if there is no such line.'''
+    start = source.index('class {}('.format(classname))
+    end = source.find('\nclass ', start + 1)
+    end = len(source) if end < 0 else end
+    block = source[start:end]
+    pattern = re.compile(r'^( *self\.{} = )(.*)$'.format(attribute), re.M)
+    match = pattern.search(block)
+    if not match:
+        return source
+    if match.group(2).startswith(('{', 'None')):
+        value = '{' + ', '.join("'{}':{}".format(region, _format(pars[region]))
+                                for region in REGIONS if region in pars) + '}'
+    else:
+        value = _format(pars['barrel'])
+    block = block[:match.start(2)] + value + block[match.end(2):]
+    return source[:start] + block + source[end:]
+
+
+def update_card(path, calorimeter, eres, eresp=None):
+    '''Writes the new parameters of calorimeter ('ecal' or 'hcal') in the
+    detector module path.
+
+    eres, eresp: dictionaries region -> parameters. eresp is only written
+    if the calorimeter class has an eresp attribute.
+    '''
+    with open(path) as infile:
+        source = infile.read()
+    classname = calorimeter.upper()
+    source = _replace(source, classname, 'eres', eres)
+    if eresp:
+        source = _replace(source, classname, 'eresp', eresp)
+    with open(path, 'w') as out:
+        out.write(source)
+
+
+def _run(variant, calorimeter, cfg, workdir, nevents):
+    outdir = os.path.join(workdir, calorimeter, variant)
+    subprocess.check_call(['heppy_loop.py', outdir, cfg, '-f',
+                           '-N', str(nevents), '-o', 'detector=' + variant,
+                           '-o', 'calorimeter=' + calorimeter])
+    return outdir
+
+
+def fit_all(jobs, min_entries=100):
+    '''Fits all jobs at once.
+
+    jobs: list of (variant, calorimeter, outdir).
+    Returns a dictionary (variant, calorimeter) -> (eres, eresp), with
+    eres and eresp dictionaries region -> parameters.
+    '''
+    points = []
+    for variant, calorimeter, outdir in jobs:
+        edges, acc = collect(outdir)
+        if acc is None:
+            print('no calorimeter response found in', outdir)
+            continue
+        calo = importlib.import_module(
+            'heppy.papas.detectors.FCCHiggsDetectors.' + variant
+        ).CMS().elements[calorimeter]
+        energies = np.sqrt(edges[1:] * edges[:-1])
+        for iregion, region in enumerate(REGIONS):
+            n = acc.n[:, iregion]
+            if (n >= min_entries).sum() < 3:
+                continue
+            mean = acc.mean[:, iregion]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                sigma = np.where(mean > 0, acc.std()[:, iregion] / mean, 0.)
+            weights = np.where((n >= min_entries) & np.isfinite(sigma), n, 0.)
+            start = [mean[weights > 0].max(), 0., -1.]
+            eresp = getattr(calo, 'eresp', None)
+            if isinstance(eresp, dict) and region in eresp:
+                start = eresp[region]
+            points.append(((variant, calorimeter, region), energies,
+                           np.nan_to_num(sigma), np.nan_to_num(mean),
+                           weights, start))
+    results = dict()
+    if not points:
+        return results
+    keys, energies, sigmas, means, weights, starts = zip(*points)
+    energies, sigmas, means, weights = [np.array(array) for array in
+                                        (energies, sigmas, means, weights)]
+    eres = fit_resolution(energies, sigmas, weights)
+    eresp = fit_response(energies, means, weights, np.array(starts))
+    for (variant, calorimeter, region), res, resp in zip(keys, eres, eresp):
+        pars = results.setdefault((variant, calorimeter), (dict(), dict()))
+        pars[0][region] = res.tolist()
+        pars[1][region] = resp.tolist()
+    return results
+
+
+def calibrate(variants, cfgs, workdir, nevents, min_entries=100):
+    '''Runs the samples, fits the parameters and updates the detector
+    modules.
+
+    cfgs: dictionary calorimeter -> calibration config.
+    '''
+    tasks = [(variant, calorimeter) for variant in variants
+             for calorimeter in sorted(cfgs)]
+    pool = ThreadPool(len(tasks))
+    try:
+        outdirs = pool.map(
+            lambda task: _run(task[0], task[1], cfgs[task[1]], workdir, nevents),
+            tasks
+        )
+    finally:
+        pool.close()
+        pool.join()
+    results = fit_all([task + (outdir,) for task, outdir in zip(tasks, outdirs)],
+                      min_entries)
+    package = os.path.dirname(os.path.abspath(__file__))
+    for (variant, calorimeter), (eres, eresp) in sorted(results.items()):
+        update_card(os.path.join(package, variant + '.py'), calorimeter,
+                    eres, eresp)
+        print('{} {}: eres {} eresp {}'.format(variant, calorimeter, eres, eresp))
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] <detector module> ...')
+    parser.add_option('--ecal-cfg', dest='ecal_cfg', default=CALIBRATION_CFG,
+                      help='calibration config for the ECAL')
+    parser.add_option('--hcal-cfg', dest='hcal_cfg', default=CALIBRATION_CFG,
+                      help='calibration config for the HCAL')
+    parser.add_option('-c', '--calorimeters', default=','.join(CALORIMETERS),
+                      help='comma-separated calorimeters to fit')
+    parser.add_option('-N', '--nevents', type='int', default=100000,
+                      help='number of events per variant and calorimeter')
+    parser.add_option('-w', '--workdir', default='calo_fit',
+                      help='directory for the heppy outputs')
+    parser.add_option('-m', '--min-entries', dest='min_entries', type='int',
+                      default=100, help='minimum number of events per bin')
+    options, args = parser.parse_args()
+    calorimeters = options.calorimeters.split(',')
+    if set(calorimeters) - set(CALORIMETERS):
+        parser.error('calorimeters must be among ' + ', '.join(CALORIMETERS))
+    cfgs = dict((calorimeter, cfg) for calorimeter, cfg in
+                [('ecal', options.ecal_cfg), ('hcal', options.hcal_cfg)]
+                if calorimeter in calorimeters)
+    if not args:
+        parser.error('please provide detector modules')
+    calibrate(args, cfgs, options.workdir, options.nevents, options.min_entries)
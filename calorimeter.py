@@ -0,0 +1,63 @@
+'''Batched calorimeter smearing, shared by the ECAL and HCAL classes.
+
+The smear methods of the calorimeters classify the clusters in barrel and
+endcap once, pick the resolution and response parameters of each cluster,
+and hand them over to the smear function below, which computes response
+and resolution and draws all gaussians in one go.
+'''
+
+import numpy as np
+
+
+def region_parameters(pars, endcap):
+    '''Returns the per-cluster parameters as an (n, 3) array.
+
+    pars: dictionary with the 'barrel' and 'endcap' parameters.
+    endcap: boolean array, True for clusters in the endcap.
+    '''
+    barrel = np.asarray(pars['barrel'], dtype=float)
+    endcap_pars = np.asarray(pars['endcap'], dtype=float)
+    return np.where(np.asarray(endcap)[:, np.newaxis], endcap_pars, barrel)
+
+
+def resolution(energies, eres):
+    '''Relative energy resolution sqrt( (a/sqrt(E))^2 + (b/E)^2 + c^2 ).
+
+    eres: (a, b, c), or an (n, 3) array with one set of parameters
+      per cluster.
+    '''
+    eres = np.asarray(eres, dtype=float)
+    stoch = eres[..., 0] / np.sqrt(energies)
+    noise = eres[..., 1] / energies
+    constant = eres[..., 2]
+    return np.sqrt(stoch**2 + noise**2 + constant**2)
+
+
+def response(energies, eresp):
+    '''Energy response, fermi-dirac function [0]/(1 + exp( (E-[1]) /[2] )).
+
+    eresp: parameters, as for resolution.
+    '''
+    eresp = np.asarray(eresp, dtype=float)
+    return eresp[..., 0] / (1 + np.exp((energies - eresp[..., 1]) / eresp[..., 2]))
+
+
+def smear(energies, eres, eresp, rng):
+    '''Smears the cluster energies.
+
+    energies: array of true cluster energies.
+    eres: resolution parameters, see resolution.
+    eresp: response parameters, see response, or None for a response of 1.
+    rng: numpy random generator, e.g. numpy.random.RandomState(seed).
+
+    Each energy is multiplied by a gaussian of mean the response and
+    width the resolution, as in the papas simulation.
+    Returns the smeared energies and the resolutions used.
+    '''
+    energies = np.asarray(energies, dtype=float)
+    eres = resolution(energies, eres) * np.ones_like(energies)
+    if eresp is None:
+        mean = 1.
+    else:
+        mean = response(energies, eresp)
+    return energies * rng.normal(mean, eres), eres
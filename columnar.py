@@ -0,0 +1,215 @@
+'''Columnar output files.
+
+A columnar file is a directory with compressed numpy chunks and a JSON
+manifest::
+
+    output/
+        manifest.json
+        chunk_000000.npz
+        chunk_000001.npz
+        ...
+
+Each chunk holds one array per column, for a range of events. Event-level
+columns have one value per event. A collection of objects is stored as
+one flat array per attribute, e.g. rec_particles.pt, and a per-event
+count, rec_particles.n.
+
+Chunks and manifest are written to a temporary file and renamed, so that
+a reader never sees a partial chunk, and the chunk files do not contain
+timestamps, so that the same content always gives the same bytes.
+The manifest records the detector fingerprint, see fingerprint.py, and
+optionally the count column of each object column and the chunk size of
+the writer, which are needed to merge files, see merge.
+'''
+
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+
+_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def write_npz(path, arrays):
+    '''Writes the dictionary of arrays to path, atomically and
+    deterministically.'''
+    tmp = path + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(arrays):
+            info = zipfile.ZipInfo(name + '.npy', date_time=_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            buf = io.BytesIO()
+            np.lib.format.write_array(buf, np.asanyarray(arrays[name]),
+                                      allow_pickle=False)
+            archive.writestr(info, buf.getvalue())
+    os.rename(tmp, path)
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as out:
+        json.dump(data, out, indent=2, sort_keys=True)
+    os.rename(tmp, path)
+
+
+def _concatenate(pieces, dtype=None):
+    '''Concatenates the arrays. The empty ones are ignored, as the files
+    written before the column dtypes were given have float empty
+    columns. Without values, the array is empty, of dtype or of the dtype
+    of the first piece.'''
+    filled = [piece for piece in pieces if len(piece)]
+    if not filled:
+        if dtype is None and pieces:
+            dtype = pieces[0].dtype
+        return np.empty(0, dtype=dtype)
+    merged = np.concatenate(filled)
+    return merged if dtype is None else merged.astype(dtype, copy=False)
+
+
+class ColumnBuffer(object):
+    '''Buffers event rows column by column.
+
+    dtypes: optional dictionary column -> dtype. The arrays of these
+      columns have this dtype, even without any value.
+    '''
+
+    def __init__(self, dtypes=None):
+        self.dtypes = dict(dtypes or {})
+        self.columns = dict()
+        self.nevents = 0
+
+    def add_event(self, values):
+        '''Adds one event. values: dictionary column -> value, or list or
+        array of values for object columns.'''
+        for name, value in values.items():
+            column = self.columns.setdefault(name, [])
+            if not isinstance(value, (list, tuple, np.ndarray)):
+                value = [value]
+            column.append(np.asarray(value, dtype=self.dtypes.get(name)))
+        self.nevents += 1
+
+    def arrays(self):
+        return dict((name, _concatenate(pieces, self.dtypes.get(name)))
+                    for name, pieces in self.columns.items())
+
+    def clear(self):
+        self.columns = dict()
+        self.nevents = 0
+
+
+class ColumnarFile(object):
+    '''Columnar file opened for appending chunks.
+
+    counts: optional dictionary object column -> count column.
+    chunk_size: optional number of events per chunk of the writer.
+    '''
+
+    def __init__(self, directory, fingerprint=None, counts=None, chunk_size=None):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as infile:
+                self.manifest = json.load(infile)
+            if fingerprint and self.manifest['fingerprint'] != fingerprint:
+                raise ValueError('cannot append to {}: different detector'.format(
+                    directory))
+        else:
+            self.manifest = dict(fingerprint=fingerprint, chunks=[], nevents=0)
+            if counts is not None:
+                self.manifest['counts'] = counts
+            if chunk_size is not None:
+                self.manifest['chunk_size'] = chunk_size
+            # an empty file is valid, e.g. for a job without any event
+            _write_json(path, self.manifest)
+
+    def append(self, arrays, nevents):
+        '''Appends a chunk of nevents events.'''
+        name = 'chunk_{:06d}.npz'.format(len(self.manifest['chunks']))
+        write_npz(os.path.join(self.directory, name), arrays)
+        self.manifest['chunks'].append(dict(name=name, nevents=nevents))
+        self.manifest['nevents'] += nevents
+        _write_json(os.path.join(self.directory, MANIFEST), self.manifest)
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as infile:
+        return json.load(infile)
+
+
+def iter_chunks(directory, columns=None):
+    '''Yields the dictionaries of arrays of the chunks of a columnar file.'''
+    for chunk in read_manifest(directory)['chunks']:
+        with np.load(os.path.join(directory, chunk['name'])) as data:
+            names = data.files if columns is None else columns
+            yield dict((name, data[name]) for name in names)
+
+
+def read(directory, columns=None):
+    '''Returns the dictionary of the concatenated arrays of all chunks.'''
+    chunks = list(iter_chunks(directory, columns))
+    if not chunks:
+        return dict()
+    return dict((name, np.concatenate([chunk[name] for chunk in chunks]))
+                for name in chunks[0])
+
+
+def merge(directories, output, chunk_size=None):
+    '''Merges the columnar files in directories, in this order, into a new
+    columnar file output.
+
+    The events are cut in chunks of chunk_size events, by default the
+    chunk size of the writer, so that the merged file of the files of
+    consecutive event ranges is identical to the file written by a single
+    job over all events.
+    '''
+    manifests = [read_manifest(directory) for directory in directories]
+    first = manifests[0]
+    for directory, manifest in zip(directories, manifests):
+        if manifest['fingerprint'] != first['fingerprint'] or \
+                manifest.get('counts') != first.get('counts'):
+            raise ValueError('cannot merge {}: different detector or columns'.format(
+                directory))
+    counts = first.get('counts', dict())
+    chunk_size = chunk_size or first.get('chunk_size')
+    if not chunk_size:
+        raise ValueError('chunk size not given, and not in the manifests')
+    merged = ColumnarFile(output, first['fingerprint'], first.get('counts'),
+                          first.get('chunk_size'))
+    pieces = dict()
+    state = dict(nevents=0)
+
+    def flush():
+        if state['nevents']:
+            merged.append(dict((name, _concatenate(values))
+                               for name, values in pieces.items()),
+                          state['nevents'])
+        pieces.clear()
+        state['nevents'] = 0
+
+    for directory, manifest in zip(directories, manifests):
+        for chunk, arrays in zip(manifest['chunks'], iter_chunks(directory)):
+            nevents = chunk['nevents']
+            offsets = dict((name, np.concatenate([[0], np.cumsum(arrays[name])]))
+                           for name in set(counts.values()) if name in arrays)
+            start = 0
+            while start < nevents:
+                stop = min(nevents, start + chunk_size - state['nevents'])
+                for name, array in arrays.items():
+                    if name in counts:
+                        offset = offsets[counts[name]]
+                        piece = array[offset[start]:offset[stop]]
+                    else:
+                        piece = array[start:stop]
+                    pieces.setdefault(name, []).append(piece)
+                state['nevents'] += stop - start
+                start = stop
+                if state['nevents'] == chunk_size:
+                    flush()
+    flush()
+    return merged
@@ -0,0 +1,98 @@
+'''Analysis configuration running the papas sequence of one of the
+detectors of this package on FCC EDM files::
+
+    heppy_loop.py Out config/analysis_cfg.py -N 1000 \
+        -o files=zh_1.root,zh_2.root -o detector=CMS_2T
+
+The heppy options are:
+
+- files: comma-separated input files
+- detector: detector module of this package (default CMS). The sequence
+  is taken from the generated config/cfg_<detector>.py
+- sequence: 'papas' (default), the full simulation and reconstruction,
+  or 'parametric', the smear-only simulation
+- seed: if given, the random generators are reseeded at each event from
+  the seed and the event number, see analyzers/EventSeed.py. Given by
+  shard.py, so that the shards of a sample reproduce a single job.
+- pf_links: 'grid' to build the blocks with the eta-phi grid link
+  finding, see analyzers/PFBlockBuilder.py, instead of testing all the
+  pairs of elements with PapasPFBlockBuilder
+- pf_block_mode: 'sequential' (default), 'thread' or 'process', to
+  compute the edges of the blocks concurrently, with pf_nworkers threads
+  or processes, see blocks.py. Uses analyzers/PFBlockBuilder.py.
+- pf_reconstruct_mode: 'thread' or 'process' to reconstruct the blocks
+  concurrently, with pf_nworkers threads or processes, see
+  analyzers/PFReconstructor.py, instead of PapasPFReconstructor
+  ('sequential', default)
+- performance: if given, the binned performance summary of the detector
+  is filled, see performance.py
+- acceptance: 'weight' to run in the weight-based acceptance mode and
+  compute the event weight of the lepton selection, see acceptance.py and
+  analyzers/AcceptanceWeight.py. Only with the parametric sequence, the
+  particles of the PF reconstruction do not carry acceptance weights.
+'''
+
+import importlib
+
+import heppy.framework.config as cfg
+from heppy.framework.heppy_loop import getHeppyOption
+from heppy.papas.detectors.FCCHiggsDetectors.lazy import LazyClass
+
+detector_name = getHeppyOption('detector', 'CMS')
+papas_cfg = importlib.import_module(
+    'heppy.papas.detectors.FCCHiggsDetectors.config.cfg_' + detector_name)
+
+# reads the generated particles of the FCC EDM files
+Reader = LazyClass('heppy.analyzers.fcc.Reader.Reader')
+source = cfg.Analyzer(
+    Reader,
+    gen_particles = 'GenParticle',
+    gen_vertices = 'GenVertex'
+)
+
+sequence = [source]
+seed = getHeppyOption('seed')
+if seed is not None:
+    papas_cfg.event_seed.seed = int(str(seed), 0)
+    sequence.append(papas_cfg.event_seed)
+sequence_name = getHeppyOption('sequence', 'papas')
+sequence.extend(getattr(papas_cfg, sequence_name + '_sequence'))
+block_mode = getHeppyOption('pf_block_mode', 'sequential')
+pf_links = getHeppyOption('pf_links', 'all')
+if pf_links != 'all' or block_mode != 'sequential':
+    papas_cfg.pfblocks_grid.link_finding = pf_links
+    papas_cfg.pfblocks_grid.block_mode = block_mode
+    nworkers = getHeppyOption('pf_nworkers')
+    papas_cfg.pfblocks_grid.nworkers = int(nworkers) if nworkers else None
+    sequence = [papas_cfg.pfblocks_grid if analyzer is papas_cfg.pfblocks else analyzer
+                for analyzer in sequence]
+reconstruct_mode = getHeppyOption('pf_reconstruct_mode', 'sequential')
+if reconstruct_mode != 'sequential':
+    papas_cfg.pfreconstruct_blocks.block_mode = reconstruct_mode
+    nworkers = getHeppyOption('pf_nworkers')
+    papas_cfg.pfreconstruct_blocks.nworkers = int(nworkers) if nworkers else None
+    sequence = [papas_cfg.pfreconstruct_blocks if analyzer is papas_cfg.pfreconstruct
+                else analyzer for analyzer in sequence]
+if getHeppyOption('performance'):
+    sequence.append(papas_cfg.detector_performance)
+if getHeppyOption('acceptance', 'random') == 'weight':
+    if sequence_name != 'parametric':
+        raise ValueError('acceptance=weight needs sequence=parametric')
+    from heppy.papas.detectors.FCCHiggsDetectors import acceptance
+    acceptance.set_mode('weight')
+    sequence.extend([papas_cfg.selected_leptons, papas_cfg.acceptance_weight])
+
+files = getHeppyOption('files')
+component = cfg.Component(
+    detector_name,
+    files = files.split(',') if files else []
+)
+
+from heppy.framework.eventsfcc import Events
+
+config = cfg.Config(
+    components = [component],
+    sequence = cfg.Sequence(sequence),
+    services = [],
+    events_class = Events
+)
@@ -0,0 +1,75 @@
+'''Calibration configuration of the calorimeter parametrizations, run by
+calo_fit.py for each detector and calorimeter on a single particle gun::
+
+    heppy_loop.py Out config/calo_calibration_cfg.py -N 100000 \
+        -o detector=CMS_2T -o calorimeter=hcal
+
+The heppy options are:
+
+- detector: detector module of this package (default CMS). The papas
+  simulation is taken from the generated config/cfg_<detector>.py
+- calorimeter: 'ecal' (default) or 'hcal'
+- pdgid: particle of the gun, by default a photon for the ECAL and a
+  K0L for the HCAL
+- emin, emax: energy range of the gun, in GeV (default 1 to 200)
+'''
+
+import importlib
+import math
+
+import heppy.framework.config as cfg
+from heppy.framework.heppy_loop import getHeppyOption
+from heppy.papas.detectors.FCCHiggsDetectors.lazy import LazyClass
+
+detector_name = getHeppyOption('detector', 'CMS')
+papas_cfg = importlib.import_module(
+    'heppy.papas.detectors.FCCHiggsDetectors.config.cfg_' + detector_name)
+
+calorimeter = getHeppyOption('calorimeter', 'ecal')
+if calorimeter not in ['ecal', 'hcal']:
+    raise ValueError('calorimeter must be ecal or hcal, not ' + calorimeter)
+# particles of the gun and smeared clusters of each calorimeter
+PDGIDS = {'ecal': 22, 'hcal': 130}
+CLUSTERS = {'ecal': 'es', 'hcal': 'hs'}
+
+# one particle per event, flat in energy, in the barrel and the endcaps
+Gun = LazyClass('heppy.analyzers.Gun.Gun')
+gun = cfg.Analyzer(
+    Gun,
+    pdgid = int(getHeppyOption('pdgid', PDGIDS[calorimeter])),
+    thetamin = -math.pi / 2. + 0.2,
+    thetamax = math.pi / 2. - 0.2,
+    ptmin = float(getHeppyOption('emin', 1.)),
+    ptmax = float(getHeppyOption('emax', 200.)),
+    flat_pt = False
+)
+
+CaloResponse = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.CaloResponse.CaloResponse')
+calo_response = cfg.Analyzer(
+    CaloResponse,
+    detector = papas_cfg.detector,
+    calorimeter = calorimeter,
+    gen_particles = 'gen_particles_stable',
+    clusters = CLUSTERS[calorimeter]
+)
+
+sequence = cfg.Sequence([
+    gun,
+    papas_cfg.gen_particles_stable,
+    papas_cfg.papas,
+    calo_response,
+])
+
+component = cfg.Component(
+    '{}_{}'.format(detector_name, calorimeter),
+    files = [None]
+)
+
+from heppy.framework.eventsgen import Events
+
+config = cfg.Config(
+    components = [component],
+    sequence = sequence,
+    services = [],
+    events_class = Events
+)
@@ -1,12 +1,15 @@
 import heppy.framework.config as cfg
 from heppy.configuration import Collider
 import logging
+import os
+# analyzers are given by their dotted path, and imported on first use
+from heppy.papas.detectors.FCCHiggsDetectors.lazy import LazyClass
 
 
 # Use a Selector to select stable gen particles for simulation
 # from the output of "source" 
 # help(Selector) for more information
-from heppy.analyzers.Selector import Selector
+Selector = LazyClass('heppy.analyzers.Selector.Selector')
 gen_particles_stable = cfg.Analyzer(
     Selector,
     output = 'gen_particles_stable',
@@ -15,10 +18,34 @@ gen_particles_stable = cfg.Analyzer(
     filter_func = lambda x : x.status()==1 and abs(x.pdgid()) not in [12,14,16] and x.pt()>1e-5
 )
 
+# gen-level veto of the events before the simulation, see veto.py.
+# the vetoed events skip the rest of the sequence.
+# all events are kept by default.
+GenVeto = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.GenVeto.GenVeto')
+gen_veto = cfg.Analyzer(
+    GenVeto,
+    gen_particles = 'gen_particles_stable',
+    predicates = [
+        # e.g. for ZH -> l l X, with
+        # from heppy.papas.detectors.FCCHiggsDetectors.veto import leptons, dilepton_mass
+        # ('leptons', leptons(2, pt_min=10.)),
+        # ('mll', dilepton_mass(80., 100.)),
+    ]
+)
+
+# log profile, 'default', 'debug' or 'production', see logs.py: log level
+# of the analyzers, PapasSim verbose printout and history mode. default
+# keeps the settings of this file, debug logs all the analyzers at DEBUG
+# level. with production, run python -O to compile out the per-object log calls.
+from heppy.papas.detectors.FCCHiggsDetectors.logs import profile as log_profile
+from heppy.papas.detectors.FCCHiggsDetectors.logs import apply_profile
+log_profile_name = os.environ.get('PAPAS_LOG_PROFILE', 'default')
+log_options = log_profile(log_profile_name)
+
 # configure the papas fast simulation with the CMS detector
 # help(Papas) for more information
 # history nodes keeps track of which particles produced which tracks, clusters 
-from heppy.analyzers.PapasSim import PapasSim
+PapasSim = LazyClass('heppy.analyzers.PapasSim.PapasSim')
 # from heppy.analyzers.Papas import Papas
 from heppy.papas.detectors.FCCHiggsDetectors.CMS import CMS
 detector = CMS()
@@ -29,10 +56,13 @@ papas = cfg.Analyzer(
     detector = detector,
     gen_particles = 'gen_particles_stable',
     sim_particles = 'sim_particles',
-    verbose = True
+    verbose = log_options['verbose']
 )
 
-from heppy.analyzers.PapasDisplay import PapasDisplay
+# the display analyzers are not in the papas_sequence.
+# PapasDisplay and the graphics libraries are only imported
+# if one of them is actually scheduled.
+PapasDisplay = LazyClass('heppy.analyzers.PapasDisplay.PapasDisplay')
 papasdisplay = cfg.Analyzer(
     PapasDisplay,
     instance_label = 'papas',
@@ -57,7 +87,7 @@ papasdisplaycompare = cfg.Analyzer(
 )
 
 # group the clusters, tracks from simulation into connected blocks ready for reconstruction
-from heppy.analyzers.PapasPFBlockBuilder import PapasPFBlockBuilder
+PapasPFBlockBuilder = LazyClass('heppy.analyzers.PapasPFBlockBuilder.PapasPFBlockBuilder')
 pfblocks = cfg.Analyzer(
     PapasPFBlockBuilder,
     track_type_and_subtype = 'ts', 
@@ -65,8 +95,23 @@ pfblocks = cfg.Analyzer(
     hcal_type_and_subtype = 'hm'
 )
 
+# the same blocks, with the eta-phi grid link finding of linking.py, and
+# the edges of the blocks computed sequentially or in a pool of threads or
+# processes, see blocks.py. replaces pfblocks with the heppy options
+# pf_links=grid or pf_block_mode of analysis_cfg.py
+PFBlockBuilder = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.PFBlockBuilder.PFBlockBuilder')
+pfblocks_grid = cfg.Analyzer(
+    PFBlockBuilder,
+    track_type_and_subtype = 'ts', 
+    ecal_type_and_subtype = 'em', 
+    hcal_type_and_subtype = 'hm',
+    detector = detector,
+    link_finding = 'grid',
+    block_mode = 'sequential'
+)
+
 #reconstruct particles from blocks
-from heppy.analyzers.PapasPFReconstructor import PapasPFReconstructor
+PapasPFReconstructor = LazyClass('heppy.analyzers.PapasPFReconstructor.PapasPFReconstructor')
 pfreconstruct = cfg.Analyzer(
     PapasPFReconstructor,
     track_type_and_subtype = 'ts', 
@@ -79,9 +124,113 @@ pfreconstruct = cfg.Analyzer(
     log_level=logging.WARNING
 )
 
+# the same reconstruction, block by block, sequentially or in a pool of
+# threads or processes, see analyzers/PFReconstructor.py. replaces
+# pfreconstruct with the heppy option pf_reconstruct_mode of analysis_cfg.py
+PFReconstructor = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.PFReconstructor.PFReconstructor')
+pfreconstruct_blocks = cfg.Analyzer(
+    PFReconstructor,
+    track_type_and_subtype = 'ts', 
+    ecal_type_and_subtype = 'em', 
+    hcal_type_and_subtype = 'hm',
+    block_type_and_subtype = 'br',
+    detector = detector,
+    output = 'rec_particles',
+    block_mode = 'sequential',
+    log_level=logging.WARNING
+)
+
+# storage of the papas history, see history.py: 'full', 'compact'
+# (integer arrays) or 'off'. right after papas, so that the block builder
+# and the reconstruction add their nodes to the compact history.
+# measure = True also saves the size of the full history of the simulation.
+HistoryMode = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.HistoryMode.HistoryMode')
+history_mode = cfg.Analyzer(
+    HistoryMode,
+    detector = detector,
+    mode = log_options['history'],
+    measure = False
+)
+
+# reseeds the random generators at each event from the seed and the
+# event number, so that a sharded job reproduces a single job, see shard.py.
+# not in the sequences: it changes the random numbers of the events, and is
+# only added by analysis_cfg.py when the heppy option seed is given.
+EventSeed = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.EventSeed.EventSeed')
+event_seed = cfg.Analyzer(
+    EventSeed,
+    seed = 0xdeadbeef
+)
+
+# binned efficiency, response and resolution of the detector, saved
+# instead of the particles, see performance.py. not in the sequences, as
+# the matching of the particles costs time: append it to the sequence,
+# or give the heppy option performance to analysis_cfg.py.
+DetectorPerformance = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.DetectorPerformance.DetectorPerformance')
+detector_performance = cfg.Analyzer(
+    DetectorPerformance,
+    detector = detector,
+    gen_particles = 'gen_particles_stable',
+    rec_particles = 'rec_particles',
+    max_dr = 0.1
+)
+
+# event weight of a selection in the weight-based acceptance mode, see
+# acceptance.py: the probability that the selected leptons are seen.
+# not in the sequences: added by analysis_cfg.py with the heppy option
+# acceptance=weight, for the parametric sequence, whose rec particles
+# carry the acceptance weights.
+selected_leptons = cfg.Analyzer(
+    Selector,
+    instance_label = 'selected_leptons',
+    output = 'selected_leptons',
+    input_objects = 'rec_particles',
+    filter_func = lambda ptc: abs(ptc.pdgid()) in [11, 13] and ptc.pt() > 10.
+)
+AcceptanceWeight = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.AcceptanceWeight.AcceptanceWeight')
+acceptance_weight = cfg.Analyzer(
+    AcceptanceWeight,
+    input_objects = ['selected_leptons'],
+    lost_objects = [],
+    output = 'acceptance_weight'
+)
+
 papas_sequence = [
     gen_particles_stable,
+    gen_veto,
     papas,
+    history_mode,
     pfblocks,
     pfreconstruct,
 ]
+
+# per-analyzer wall time, CPU time and memory, see instrument.py
+# from heppy.papas.detectors.FCCHiggsDetectors.instrument import instrument
+# papas_sequence = instrument(papas_sequence)
+
+# cProfile of one analyzer, for a range of events or the slowest ones,
+# see profiling.py
+# from heppy.papas.detectors.FCCHiggsDetectors.profiling import profile
+# profile(pfreconstruct, slowest=10)
+
+# smear-only simulation, without particle flow: the stable particles are
+# directly turned into rec_particles using the detector parametrizations
+PapasParametric = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.PapasParametric.PapasParametric')
+papas_parametric = cfg.Analyzer(
+    PapasParametric,
+    detector = detector,
+    gen_particles = 'gen_particles_stable',
+    output = 'rec_particles'
+)
+
+parametric_sequence = [
+    gen_particles_stable,
+    gen_veto,
+    papas_parametric,
+]
+
+# the analyzers of the chain log to their heppy logger at the level of
+# the log profile, or of this file with the default profile
+apply_profile(papas_sequence + parametric_sequence +
+              [pfblocks_grid, pfreconstruct_blocks, event_seed, detector_performance,
+               selected_leptons, acceptance_weight], log_profile_name)
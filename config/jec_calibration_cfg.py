@@ -0,0 +1,77 @@
+'''Calibration configuration of the jet energy corrections, run by
+jec_calibration.py for each detector on Z->jj FCC EDM files::
+
+    heppy_loop.py Out config/jec_calibration_cfg.py -N 100000 \
+        -o files=zjj_1.root,zjj_2.root -o detector=CMS_2T
+
+The heppy options are:
+
+- files: comma-separated input files
+- detector: detector module of this package (default CMS). The papas
+  sequence is taken from the generated config/cfg_<detector>.py
+- njets: number of exclusive jets (default 2)
+'''
+
+import importlib
+
+import heppy.framework.config as cfg
+from heppy.framework.heppy_loop import getHeppyOption
+from heppy.papas.detectors.FCCHiggsDetectors.lazy import LazyClass
+
+detector_name = getHeppyOption('detector', 'CMS')
+papas_cfg = importlib.import_module(
+    'heppy.papas.detectors.FCCHiggsDetectors.config.cfg_' + detector_name)
+njets = int(getHeppyOption('njets', 2))
+
+# reads the generated particles of the FCC EDM files
+Reader = LazyClass('heppy.analyzers.fcc.Reader.Reader')
+source = cfg.Analyzer(
+    Reader,
+    gen_particles = 'GenParticle',
+    gen_vertices = 'GenVertex'
+)
+
+# exclusive jets of the stable generated particles and of the
+# reconstructed particles, without jet energy corrections
+JetClusterizer = LazyClass('heppy.analyzers.JetClusterizer.JetClusterizer')
+gen_jets = cfg.Analyzer(
+    JetClusterizer,
+    instance_label = 'gen_jets',
+    output = 'gen_jets',
+    particles = 'gen_particles_stable',
+    fastjet_args = dict(njets=njets)
+)
+rec_jets = cfg.Analyzer(
+    JetClusterizer,
+    instance_label = 'rec_jets',
+    output = 'rec_jets',
+    particles = 'rec_particles',
+    fastjet_args = dict(njets=njets)
+)
+
+JetResponse = LazyClass('heppy.papas.detectors.FCCHiggsDetectors.analyzers.JetResponse.JetResponse')
+jet_response = cfg.Analyzer(
+    JetResponse,
+    gen_jets = 'gen_jets',
+    rec_jets = 'rec_jets',
+    max_dr = 0.3
+)
+
+sequence = cfg.Sequence(
+    [source] + papas_cfg.papas_sequence + [gen_jets, rec_jets, jet_response]
+)
+
+files = getHeppyOption('files')
+component = cfg.Component(
+    detector_name,
+    files = files.split(',') if files else []
+)
+
+from heppy.framework.eventsfcc import Events
+
+config = cfg.Config(
+    components = [component],
+    sequence = sequence,
+    services = [],
+    events_class = Events
+)
@@ -0,0 +1,311 @@
+'''Compiler for the formulas of the Delphes cards.
+
+The EfficiencyFormula and ResolutionFormula of the Delphes modules are
+expressions of the particle pt, eta, phi and energy, e.g. the muon
+momentum resolution of the CMS card::
+
+    (abs(eta) <= 0.5) * (pt > 0.1) * sqrt(0.01^2 + pt^2*1.0e-4^2) +
+    (abs(eta) > 0.5 && abs(eta) <= 1.5) * (pt > 0.1) * sqrt(0.015^2 + pt^2*1.5e-4^2) +
+    (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 0.1) * sqrt(0.025^2 + pt^2*3.5e-4^2)
+
+A Formula parses the expression once, translates it to the source of a
+numpy function and of a plain python function for single values, and
+compiles them. Only numbers, the variables, the functions in FUNCTIONS
+and the operators of the expressions of the cards are accepted, so the
+card text is never evaluated as python, and the only source compiled is
+the one produced by the parser::
+
+    resolution = Formula(text)
+    resolution(pt=pts, eta=etas)          # arrays
+    resolution.scalar(pt=pt, eta=eta)     # floats, much faster than numpy
+'''
+
+import math
+import re
+
+import numpy as np
+
+VARIABLES = ['pt', 'eta', 'phi', 'energy']
+
+# function name -> (numpy function, plain python function)
+FUNCTIONS = dict(
+    abs=('np.abs', 'abs'), sqrt=('np.sqrt', 'math.sqrt'),
+    exp=('np.exp', 'math.exp'), log=('np.log', 'math.log'),
+    log10=('np.log10', 'math.log10'), sin=('np.sin', 'math.sin'),
+    cos=('np.cos', 'math.cos'), tan=('np.tan', 'math.tan'),
+    sinh=('np.sinh', 'math.sinh'), cosh=('np.cosh', 'math.cosh'),
+    tanh=('np.tanh', 'math.tanh'),
+)
+
+# source templates of the operators, for numpy and for plain python.
+# the logical operators give 0 or 1, as in the cards.
+NUMPY = dict(
+    function=0, logical_or='np.logical_or({}, {})',
+    logical_and='np.logical_and({}, {})', logical_not='np.logical_not({})',
+    power='np.power(1. * {}, {})',
+)
+PYTHON = dict(
+    function=1, logical_or='(bool({}) or bool({}))',
+    logical_and='(bool({}) and bool({}))', logical_not='(not {})',
+    power='((1. * {}) ** {})',
+)
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?) |
+    (?P<name>[A-Za-z_][A-Za-z_0-9]*(?:::[A-Za-z_][A-Za-z_0-9]*)?) |
+    (?P<operator>&&|\|\||<=|>=|==|!=|[-+*/^()<>!])
+)''', re.X)
+
+_COMPARISONS = ['<', '>', '<=', '>=', '==', '!=']
+
+
+class FormulaError(ValueError):
+    pass
+
+
+def tokenize(text):
+    '''Returns the list of (kind, value) tokens of text.'''
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise FormulaError('unexpected character at {} in {}'.format(
+                pos, text))
+        pos = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _Parser(object):
+    '''Recursive descent parser, producing the tree of the formula.
+
+    Precedences, from lowest to highest:
+    ||, &&, comparisons, + -, * /, unary - + !, ^ (right associative)
+
+    The nodes of the tree are lists, which can be saved as json:
+    ['number', value], ['variable', name], ['function', name, argument],
+    ['or', left, right], ['and', left, right], ['not', operand],
+    ['compare', operator, left, right], ['arithmetic', operator, left, right],
+    ['sign', operator, operand], ['power', base, exponent].
+    '''
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][1]
+        return None
+
+    def next(self):
+        if self.pos == len(self.tokens):
+            raise FormulaError('unexpected end of ' + self.text)
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        kind, token = self.next()
+        if token != value:
+            raise FormulaError('expected {} instead of {} in {}'.format(
+                value, token, self.text))
+
+    def parse(self):
+        tree = self.logical_or()
+        if self.pos != len(self.tokens):
+            raise FormulaError('unexpected {} in {}'.format(
+                self.peek(), self.text))
+        return tree
+
+    def logical_or(self):
+        tree = self.logical_and()
+        while self.peek() == '||':
+            self.next()
+            tree = ['or', tree, self.logical_and()]
+        return tree
+
+    def logical_and(self):
+        tree = self.comparison()
+        while self.peek() == '&&':
+            self.next()
+            tree = ['and', tree, self.comparison()]
+        return tree
+
+    def comparison(self):
+        tree = self.additive()
+        if self.peek() in _COMPARISONS:
+            operator = self.next()[1]
+            tree = ['compare', operator, tree, self.additive()]
+        return tree
+
+    def additive(self):
+        tree = self.multiplicative()
+        while self.peek() in ('+', '-'):
+            operator = self.next()[1]
+            tree = ['arithmetic', operator, tree, self.multiplicative()]
+        return tree
+
+    def multiplicative(self):
+        tree = self.unary()
+        while self.peek() in ('*', '/'):
+            operator = self.next()[1]
+            tree = ['arithmetic', operator, tree, self.unary()]
+        return tree
+
+    def unary(self):
+        if self.peek() == '!':
+            self.next()
+            return ['not', self.unary()]
+        if self.peek() in ('-', '+'):
+            operator = self.next()[1]
+            return ['sign', operator, self.unary()]
+        return self.power()
+
+    def power(self):
+        tree = self.atom()
+        if self.peek() == '^':
+            self.next()
+            tree = ['power', tree, self.unary()]
+        return tree
+
+    def atom(self):
+        kind, token = self.next()
+        if kind == 'number':
+            return ['number', float(token)]
+        if token == '(':
+            tree = self.logical_or()
+            self.expect(')')
+            return tree
+        if kind == 'name':
+            name = token.split('::')[-1].lower() if '::' in token else token
+            if self.peek() == '(':
+                if name not in FUNCTIONS:
+                    raise FormulaError('unknown function {} in {}'.format(
+                        token, self.text))
+                self.next()
+                argument = self.logical_or()
+                self.expect(')')
+                return ['function', name, argument]
+            if token not in VARIABLES:
+                raise FormulaError('unknown variable {} in {}'.format(
+                    token, self.text))
+            return ['variable', token]
+        raise FormulaError('unexpected {} in {}'.format(token, self.text))
+
+
+def parse(text):
+    '''Returns the tree of the formula, see _Parser.'''
+    return _Parser(text).parse()
+
+
+_ARITY = {'number': 1, 'variable': 1, 'function': 2, 'or': 2, 'and': 2,
+          'not': 1, 'compare': 3, 'arithmetic': 3, 'sign': 2, 'power': 2}
+
+
+def generate(tree, dialect=NUMPY):
+    '''Returns the python expression of the tree, with the operators of
+    dialect. The tree is checked, so that only the nodes produced by the
+    parser are accepted, e.g. for trees read from a file.'''
+    if not isinstance(tree, list) or not tree or \
+            _ARITY.get(tree[0]) != len(tree) - 1:
+        raise FormulaError('invalid node {!r}'.format(tree))
+    node = tree[0]
+    if node == 'number':
+        value = tree[1]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise FormulaError('invalid number {!r}'.format(value))
+        value = float(value)
+        if math.isinf(value) or math.isnan(value):
+            return 'float({!r})'.format(repr(value))
+        return repr(value)
+    if node == 'variable':
+        if tree[1] not in VARIABLES:
+            raise FormulaError('unknown variable {!r}'.format(tree[1]))
+        return tree[1]
+    if node == 'function':
+        if tree[1] not in FUNCTIONS:
+            raise FormulaError('unknown function {!r}'.format(tree[1]))
+        return '{}({})'.format(FUNCTIONS[tree[1]][dialect['function']],
+                               generate(tree[2], dialect))
+    if node in ('or', 'and'):
+        return dialect['logical_' + node].format(generate(tree[1], dialect),
+                                                 generate(tree[2], dialect))
+    if node == 'not':
+        return dialect['logical_not'].format(generate(tree[1], dialect))
+    if node == 'power':
+        return dialect['power'].format(generate(tree[1], dialect),
+                                       generate(tree[2], dialect))
+    operator = tree[1]
+    if node == 'sign':
+        if operator not in ('-', '+'):
+            raise FormulaError('invalid sign {!r}'.format(operator))
+        return '({}{})'.format(operator, generate(tree[2], dialect))
+    if operator not in (_COMPARISONS if node == 'compare' else ['+', '-', '*', '/']):
+        raise FormulaError('invalid operator {!r}'.format(operator))
+    left, right = generate(tree[2], dialect), generate(tree[3], dialect)
+    if operator == '/':
+        return '(1. * {} / {})'.format(left, right)
+    return '({} {} {})'.format(left, operator, right)
+
+
+def translate(text, dialect=NUMPY):
+    '''Returns the source of the python function computing the formula,
+    with numpy or in plain python, see NUMPY and PYTHON.'''
+    return _source(parse(text), dialect)
+
+
+def _source(tree, dialect):
+    return 'def formula({}):\n    return {}\n'.format(
+        ', '.join(VARIABLES), generate(tree, dialect))
+
+
+def _compile(source):
+    namespace = dict(np=np, math=math)
+    exec(compile(source, '<delphes formula>', 'exec'), namespace)
+    return namespace['formula']
+
+
+class Formula(object):
+    '''Delphes formula compiled to a numpy function, and to a plain python
+    function for single values.
+
+    text: the formula, as in the card.
+    tree: optional tree of the formula given by parse(text), e.g. from a
+      compiled card file, to skip the parsing. It is checked by generate.
+    '''
+
+    def __init__(self, text, tree=None):
+        self.text = ' '.join(text.split())
+        self.tree = tree if tree is not None else parse(self.text)
+        self.source = _source(self.tree, NUMPY)
+        self._function = _compile(self.source)
+        self._scalar = _compile(_source(self.tree, PYTHON))
+
+    def __call__(self, pt=0., eta=0., phi=0., energy=0.):
+        '''Returns the values of the formula, as a float array with the
+        broadcast shape of the arguments.'''
+        pt, eta, phi, energy = [np.asarray(value, dtype=float)
+                                for value in (pt, eta, phi, energy)]
+        values = self._function(pt, eta, phi, energy)
+        shape = np.broadcast(pt, eta, phi, energy).shape
+        return np.broadcast_to(np.asarray(values, dtype=float), shape)
+
+    def scalar(self, pt=0., eta=0., phi=0., energy=0.):
+        '''Returns the value of the formula for single values, as a float.
+        Out of the domain of the math functions, e.g. sqrt of a negative
+        number, the value is the one of the numpy function.'''
+        try:
+            # numpy scalars would make the python arithmetic slow
+            return float(self._scalar(float(pt), float(eta), float(phi),
+                                      float(energy)))
+        except (ArithmeticError, TypeError, ValueError):
+            with np.errstate(all='ignore'):
+                return float(self(pt, eta, phi, energy))
+
+    def __repr__(self):
+        return 'Formula({!r})'.format(self.text)
@@ -0,0 +1,359 @@
+'''Detectors built from a Delphes card.
+
+The card is a Tcl file with one block per module::
+
+    module Efficiency ChargedHadronTrackingEfficiency {
+      set InputArray ParticlePropagator/chargedHadrons
+      set EfficiencyFormula {
+        (pt <= 0.1) * (0.00) +
+        (abs(eta) <= 1.5) * (pt > 0.1) * (0.70) + ...
+      }
+    }
+
+load_card reads the formulas of the modules listed in ROLES, compiles
+them with delphes.py, and returns a CardDetector. The CardDetector has
+the interface of the CMS detectors of this package, and reuses the
+geometry, the materials and the parametrizations which are not in the
+card (e.g. calorimeter efficiencies and response) of a base detector
+module::
+
+    from heppy.papas.detectors.FCCHiggsDetectors.delphes_card import load_card
+    detector = load_card('delphes_card_CMS.tcl', base='CMS')
+
+The formulas are cached in a compiled card file, <card>.compiled.json,
+as the trees given by the parser of delphes.py, together with the hash of
+the card, so that the next loads of the same card skip the parsing. No
+python source is stored: the trees are checked and translated again when
+loaded. The cache is rebuilt when the card changes, or when a tree is
+invalid.
+
+This tool compiles cards and prints the formulas found::
+
+    python delphes_card.py delphes_card_CMS.tcl
+'''
+
+from __future__ import print_function
+
+import hashlib
+import importlib
+import json
+import os
+
+import numpy as np
+
+from heppy.papas.detectors.detector import Detector
+from heppy.papas.detectors.FCCHiggsDetectors.acceptance import accept
+from heppy.papas.detectors.FCCHiggsDetectors.delphes import Formula, FormulaError
+
+# version of the compiled card files, to be increased when the
+# trees of the formulas change
+FORMAT = 2
+
+# role -> list of (module, parameter) of the card, the first one
+# found is used. energy resolutions of the cards are absolute, in GeV,
+# momentum resolutions are relative.
+ROLES = dict(
+    tracker_efficiency=[('ChargedHadronTrackingEfficiency', 'EfficiencyFormula')],
+    tracker_resolution=[('ChargedHadronMomentumSmearing', 'ResolutionFormula')],
+    ecal_resolution=[('ECal', 'ResolutionFormula'),
+                     ('Calorimeter', 'ECalResolutionFormula')],
+    hcal_resolution=[('HCal', 'ResolutionFormula'),
+                     ('Calorimeter', 'HCalResolutionFormula')],
+    electron_efficiency=[('ElectronEfficiency', 'EfficiencyFormula')],
+    electron_resolution=[('ElectronEnergySmearing', 'ResolutionFormula')],
+    muon_efficiency=[('MuonEfficiency', 'EfficiencyFormula')],
+    muon_resolution=[('MuonMomentumSmearing', 'ResolutionFormula')],
+)
+
+
+def _strip_comments(text):
+    lines = []
+    for line in text.splitlines():
+        if line.lstrip().startswith('#'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines).replace('\\\n', ' ')
+
+
+def _words(text):
+    '''Yields the words of Tcl text, a braced group being one word.'''
+    pos = 0
+    while pos < len(text):
+        if text[pos].isspace():
+            pos += 1
+        elif text[pos] == '{':
+            depth, start = 0, pos
+            while pos < len(text):
+                if text[pos] == '{':
+                    depth += 1
+                elif text[pos] == '}':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                pos += 1
+            if depth:
+                raise ValueError('unbalanced braces in card')
+            yield text[start:pos + 1]
+            pos += 1
+        else:
+            start = pos
+            while pos < len(text) and not text[pos].isspace():
+                pos += 1
+            yield text[start:pos]
+
+
+def _statements(text):
+    '''Returns the list of statements of Tcl text, each a list of words.'''
+    statements = []
+    for line in _split_lines(text):
+        words = list(_words(line))
+        if words:
+            statements.append(words)
+    return statements
+
+
+def _split_lines(text):
+    '''Splits text in lines, keeping braced groups on one line.'''
+    lines, depth, start = [], 0, 0
+    for pos, char in enumerate(text):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == '\n' and depth == 0:
+            lines.append(text[start:pos])
+            start = pos + 1
+    lines.append(text[start:])
+    return lines
+
+
+def parse_card(text):
+    '''Returns a dictionary module name -> (module type, parameters),
+    parameters being a dictionary name -> value of the set statements.
+    Braced values are returned without the braces.'''
+    modules = dict()
+    for words in _statements(_strip_comments(text)):
+        if words[0] != 'module' or len(words) != 4:
+            continue
+        mtype, name, body = words[1], words[2], words[3][1:-1]
+        parameters = dict()
+        for statement in _statements(body):
+            if statement[0] == 'set' and len(statement) >= 3:
+                value = statement[2]
+                if value.startswith('{'):
+                    value = value[1:-1]
+                parameters[statement[1]] = ' '.join(value.split())
+        modules[name] = (mtype, parameters)
+    return modules
+
+
+def card_formulas(modules):
+    '''Returns the dictionary role -> formula text of the parsed card.'''
+    formulas = dict()
+    for role, candidates in ROLES.items():
+        for module, parameter in candidates:
+            if module in modules and parameter in modules[module][1]:
+                formulas[role] = modules[module][1][parameter]
+                break
+    return formulas
+
+
+def _hash(path):
+    with open(path, 'rb') as infile:
+        return hashlib.sha1(infile.read()).hexdigest()
+
+
+def compile_card(path):
+    '''Parses the card, writes the compiled card file, and returns the
+    dictionary role -> Formula.'''
+    with open(path) as infile:
+        texts = card_formulas(parse_card(infile.read()))
+    formulas = dict((role, Formula(text)) for role, text in texts.items())
+    compiled = dict(format=FORMAT, card_sha1=_hash(path),
+                    formulas=dict((role, dict(text=formula.text, tree=formula.tree))
+                                  for role, formula in formulas.items()))
+    cache = path + '.compiled.json'
+    tmp = cache + '.tmp'
+    with open(tmp, 'w') as out:
+        json.dump(compiled, out, indent=2, sort_keys=True)
+    os.rename(tmp, cache)
+    return formulas
+
+
+def card_formulas_cached(path):
+    '''Returns the dictionary role -> Formula of the card, from the
+    compiled card file if it is up to date.'''
+    cache = path + '.compiled.json'
+    if os.path.exists(cache):
+        with open(cache) as infile:
+            compiled = json.load(infile)
+        if compiled.get('format') == FORMAT and \
+                compiled.get('card_sha1') == _hash(path):
+            try:
+                return dict((role, Formula(item['text'], item['tree']))
+                            for role, item in compiled['formulas'].items())
+            except (FormulaError, KeyError, TypeError):
+                pass
+    return compile_card(path)
+
+
+class CardTracker(object):
+    '''Tracker with the efficiency and resolution of the card, and the
+    other attributes of the tracker of the base detector.'''
+
+    def __init__(self, base, efficiency, resolution):
+        self.base = base
+        self.efficiency_formula = efficiency
+        self.resolution_formula = resolution
+
+    def __getattr__(self, name):
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def efficiency(self, track):
+        if self.efficiency_formula is None:
+            return self.base.efficiency(track)
+        p3 = track.p3()
+        return self.efficiency_formula.scalar(pt=p3.Pt(), eta=p3.Eta(),
+                                              phi=p3.Phi(), energy=p3.Mag())
+
+    def efficiencies(self, pts, etas):
+        '''Returns the efficiencies for arrays of pt and eta.'''
+        if self.efficiency_formula is None:
+            return self.base.efficiencies(pts, etas)
+        return self.efficiency_formula(pt=pts, eta=etas,
+                                       energy=pts * np.cosh(etas))
+
+    def acceptance(self, track):
+        return accept(track, self.efficiency(track))
+
+    def resolution(self, track):
+        if self.resolution_formula is None:
+            return self.base.resolution(track)
+        p3 = track.p3()
+        return self.resolution_formula.scalar(pt=p3.Pt(), eta=p3.Eta(),
+                                              phi=p3.Phi(), energy=p3.Mag())
+
+    def resolutions(self, pts, etas):
+        '''Returns the relative pt resolutions for arrays of pt and eta.'''
+        if self.resolution_formula is None:
+            return self.base.resolutions(pts, etas)
+        return self.resolution_formula(pt=pts, eta=etas,
+                                       energy=pts * np.cosh(etas))
+
+
+class CardCalorimeter(object):
+    '''Calorimeter with the energy resolution of the card, and no
+    response correction. The other attributes are those of the
+    calorimeter of the base detector.'''
+
+    def __init__(self, base, resolution):
+        self.base = base
+        self.resolution_formula = resolution
+
+    def __getattr__(self, name):
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def energy_resolution(self, energy, eta=0.):
+        if energy <= 0.:
+            return 0.
+        return self.resolution_formula.scalar(energy=energy, eta=eta) / energy
+
+    def energy_response(self, energy, eta=0.):
+        return 1.
+
+    def smear(self, energies, etas, rng):
+        '''Smears an array of cluster energies at once.
+        Returns the smeared energies and the resolutions used.'''
+        energies = np.asarray(energies, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eres = np.where(energies > 0.,
+                            self.resolution_formula(energy=energies, eta=etas) /
+                            energies, 0.)
+        return energies * rng.normal(1., eres), eres
+
+
+class CardDetector(Detector):
+    '''Detector with the parametrizations of a Delphes card.
+
+    formulas: dictionary role -> Formula, see ROLES. the roles which are
+      missing are taken from the base detector.
+    base: the base detector, e.g. the CMS detector of CMS.py.
+    '''
+
+    def __init__(self, formulas, base):
+        super(CardDetector, self).__init__()
+        self.base = base
+        self.formulas = formulas
+        self.elements.update(base.elements)
+        if 'tracker_efficiency' in formulas or 'tracker_resolution' in formulas:
+            self.elements['tracker'] = CardTracker(
+                base.elements['tracker'], formulas.get('tracker_efficiency'),
+                formulas.get('tracker_resolution'))
+        for name in ['ecal', 'hcal']:
+            if name + '_resolution' in formulas:
+                self.elements[name] = CardCalorimeter(
+                    base.elements[name], formulas[name + '_resolution'])
+        # used in batch by PapasParametric
+        for role in ['electron_efficiency', 'muon_efficiency', 'muon_resolution']:
+            if role in formulas:
+                setattr(self, role + '_formula', formulas[role])
+
+    def _lepton(self, role, ptc):
+        return self.formulas[role].scalar(pt=ptc.pt(), eta=ptc.eta(),
+                                          phi=ptc.phi(), energy=ptc.e())
+
+    def electron_efficiency(self, ptc):
+        if 'electron_efficiency' not in self.formulas:
+            return self.base.electron_efficiency(ptc)
+        return self._lepton('electron_efficiency', ptc)
+
+    def electron_acceptance(self, ptc):
+        return accept(ptc, self.electron_efficiency(ptc))
+
+    def electron_resolution(self, ptc):
+        # the card gives the absolute energy resolution
+        if 'electron_resolution' not in self.formulas:
+            return self.base.electron_resolution(ptc)
+        return self._lepton('electron_resolution', ptc) / ptc.e()
+
+    def muon_efficiency(self, ptc):
+        if 'muon_efficiency' not in self.formulas:
+            return self.base.muon_efficiency(ptc)
+        return self._lepton('muon_efficiency', ptc)
+
+    def muon_acceptance(self, ptc):
+        return accept(ptc, self.muon_efficiency(ptc))
+
+    def muon_resolution(self, ptc):
+        if 'muon_resolution' not in self.formulas:
+            return self.base.muon_resolution(ptc)
+        return self._lepton('muon_resolution', ptc)
+
+    def jet_energy_correction(self, jet):
+        return self.base.jet_energy_correction(jet)
+
+
+def load_card(path, base='CMS'):
+    '''Returns the CardDetector of the card at path, built on the CMS
+    detector of the detector module base of this package.'''
+    module = importlib.import_module(
+        'heppy.papas.detectors.FCCHiggsDetectors.' + base)
+    return CardDetector(card_formulas_cached(path), module.CMS())
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog <card.tcl> ...')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('please provide Delphes cards')
+    for path in args:
+        formulas = compile_card(path)
+        print(path)
+        for role in sorted(ROLES):
+            print('  {:22} {}'.format(role, 'found' if role in formulas
+                                      else 'not in card, taken from the base detector'))
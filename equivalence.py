@@ -0,0 +1,351 @@
+'''Equivalence of the batch and scalar paths of the detector
+parametrizations.
+
+The batch paths (calorimeter smear, tracker resolutions, compiled
+Delphes formulas, vectorized acceptance draws) must reproduce the scalar
+methods used by the papas simulation. For each detector module, both
+paths are run on the same synthetic objects:
+
+- deterministic outputs (resolutions, efficiencies) must be equal, up
+  to a relative difference of rtol from the floating point rounding.
+- the compiled Delphes formulas are also compared to the methods of the
+  detector modules they replace, copied here as reference functions.
+  The objects where the formulas are meant to differ, listed in
+  EXPECTED_DIFFERENCES, are left out: the bin edges of the card, and the
+  pt-dependent muon resolution. The bin edges are added to the objects.
+- the tracker resolution tables are compared to the exact Gluckstern
+  formula. The tables are interpolated in eta, and must agree with the
+  exact formula within itol.
+- stochastic outputs are compared statistically: the smeared energies
+  with a two-sample Kolmogorov-Smirnov test, the acceptances with a
+  chi2 test of the accepted fractions in bins of |eta|. The check fails
+  if the p-value is below alpha.
+
+Each check reports the time of both paths and the speedup::
+
+    python equivalence.py -n 1000000 CMS CMS_2T
+
+The script exits with status 1 if a check fails. The statistical tests
+only use numpy.
+'''
+
+from __future__ import print_function
+
+import importlib
+import math
+import sys
+import timeit
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors import tracking
+from heppy.papas.detectors.FCCHiggsDetectors.probes import \
+    ProbeCluster, ProbeParticle, ProbeTrack
+
+MODULES = ['CMS', 'CMS_2T', 'CMS_2T_ECAL', 'CMS_2T_HCAL', 'CMS_2T_LEP3_Tracker',
+           'CMS_2T_Tracker', 'CMS_LEP3_Tracker']
+
+ETA_BINS = np.linspace(0., 5., 21)
+
+
+def ks_2samp(a, b):
+    '''Returns the Kolmogorov-Smirnov statistic and the asymptotic
+    p-value of the two samples a and b.'''
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, values, side='right') / float(len(a))
+    cdf_b = np.searchsorted(b, values, side='right') / float(len(b))
+    d = np.abs(cdf_a - cdf_b).max()
+    ne = len(a) * len(b) / float(len(a) + len(b))
+    lam = (math.sqrt(ne) + 0.12 + 0.11 / math.sqrt(ne)) * d
+    if lam < 0.2:
+        return d, 1.
+    k = np.arange(1, 101)
+    p = 2. * np.sum((-1.)**(k - 1) * np.exp(-2. * k**2 * lam**2))
+    return d, float(min(max(p, 0.), 1.))
+
+
+def chi2_sf(x, dof):
+    '''Survival function of the chi2 distribution, with the
+    Wilson-Hilferty approximation.'''
+    if dof <= 0:
+        return 1.
+    z = ((x / dof)**(1. / 3) - (1. - 2. / (9. * dof))) / math.sqrt(2. / (9. * dof))
+    return 0.5 * math.erfc(z / math.sqrt(2.))
+
+
+def chi2_fractions(bins, accepted_a, accepted_b, nbins):
+    '''Returns the chi2 and the p-value of the test that the accepted
+    fractions of a and b are the same in each bin.
+
+    bins: bin index of each object, the same objects being used in a and b.
+    accepted_a, accepted_b: boolean arrays.
+    '''
+    total = np.bincount(bins, minlength=nbins).astype(float)
+    counts = np.array([np.bincount(bins, weights=accepted, minlength=nbins)
+                       for accepted in (accepted_a, accepted_b)])
+    pooled = counts.sum(axis=0) / (2. * np.maximum(total, 1.))
+    variance = total * pooled * (1. - pooled)
+    used = variance > 0.
+    if not used.any():
+        # all efficiencies are 0 or 1, both paths must agree exactly
+        same = np.array_equal(counts[0], counts[1])
+        return 0., 1. if same else 0.
+    diff = counts[0][used] - counts[1][used]
+    chi2 = float(np.sum(diff**2 / (2. * variance[used])))
+    return chi2, chi2_sf(chi2, int(used.sum()))
+
+
+class Result(object):
+
+    def __init__(self, module, name, test, statistic, pvalue, passed,
+                 scalar_time, batch_time):
+        self.module = module
+        self.name = name
+        self.test = test
+        self.statistic = statistic
+        self.pvalue = pvalue
+        self.passed = passed
+        self.scalar_time = scalar_time
+        self.batch_time = batch_time
+
+    def speedup(self):
+        return self.scalar_time / max(self.batch_time, 1e-12)
+
+    def format(self):
+        return '{:20} {:24} {:6} {:10.3g} {:8.3g} {:5} {:9.3f} {:9.3f} {:8.1f}'.format(
+            self.module, self.name, self.test, self.statistic, self.pvalue,
+            'ok' if self.passed else 'FAIL', self.scalar_time, self.batch_time,
+            self.speedup())
+
+
+HEADER = '{:20} {:24} {:6} {:>10} {:>8} {:5} {:>9} {:>9} {:>8}'.format(
+    'module', 'check', 'test', 'statistic', 'p', '', 'scalar/s', 'batch/s',
+    'speedup')
+
+
+def reference_electron_efficiency(pt, eta):
+    '''Electron efficiency of electron_acceptance in the detector modules
+    before the compiled Delphes formulas.'''
+    if pt < 10.:
+        return 0.
+    else:
+        eta = abs(eta)
+        if eta < 1.5:
+            return 0.95
+        elif eta < 2.5:
+            return 0.85
+        else:
+            return 0.
+
+
+def reference_muon_efficiency(pt, eta):
+    '''Muon efficiency of muon_acceptance in the detector modules before
+    the compiled Delphes formulas.'''
+    eta = abs(eta)
+    if pt < 10.:
+        return 0.
+    elif eta < 2.4:
+        return 0.95
+    else:
+        return 0.
+
+
+def reference_muon_resolution(pt, eta):
+    '''muon_resolution of the detector modules before the compiled Delphes
+    formulas, without pt dependence.'''
+    eta = abs(eta)
+    if eta < 0.5:
+        cstt, vart = 0.01, 1e-4
+    elif eta < 1.5:
+        cstt, vart = 0.015, 1.5e-4
+    else:
+        cstt, vart = 0.025, 3.5e-4
+    return math.sqrt(cstt**2 + vart**2)
+
+
+def reference_tracker_resolution(model, pt, eta):
+    '''Gluckstern formula computed exactly for a single track, see
+    tracking.py, without the coefficient tables of the model.'''
+    eta = min(abs(eta), tracking.ETA_MAX)
+    lever_arm = model.rad
+    if eta:
+        lever_arm = min(lever_arm, model.z / math.sinh(eta))
+    a = model.sigma_x / (0.3 * model.field * lever_arm**2) * \
+        math.sqrt(720. / (model.nhits + 4))
+    b = 0.0136 * tracking.MS_FACTOR / (0.3 * model.field * lever_arm) * \
+        math.sqrt(model.x_x0 * math.cosh(eta))
+    return math.sqrt((a * pt)**2 + b**2)
+
+
+REFERENCES = dict(
+    electron_efficiency=reference_electron_efficiency,
+    muon_efficiency=reference_muon_efficiency,
+    muon_resolution=reference_muon_resolution,
+)
+
+# intended differences of the compiled formulas with the references:
+# role -> (description, function of pt and eta returning True where the
+# values differ). the objects are excluded from the _ref checks.
+EXPECTED_DIFFERENCES = dict(
+    electron_efficiency=(
+        'pt = 10 and |eta| = 1.5, 2.5 in the lower bin, <= of the card',
+        lambda pt, eta: pt == 10. or abs(eta) in (1.5, 2.5)),
+    muon_efficiency=(
+        'pt = 10 and |eta| = 2.4 in the lower bin, <= of the card',
+        lambda pt, eta: pt == 10. or abs(eta) == 2.4),
+    muon_resolution=(
+        'pt-dependent resolution of the card for |eta| <= 2.5 and pt > 0.1',
+        lambda pt, eta: abs(eta) <= 2.5 and pt > 0.1),
+)
+
+# pt and |eta| of the bin edges of the references and of the card
+# formulas, added to the objects of the _ref checks
+EDGE_PTS = [0.1, 10.]
+EDGE_ETAS = [0., 0.5, 1.5, 2.4, 2.5]
+
+
+def _timed(func):
+    start = timeit.default_timer()
+    result = func()
+    return result, timeit.default_timer() - start
+
+
+def sample(n, rng):
+    '''Returns pts, energies and etas of n synthetic objects, log-uniform
+    in pt and energy, uniform in eta.'''
+    pts = np.exp(rng.uniform(np.log(0.1), np.log(500.), n))
+    energies = np.exp(rng.uniform(np.log(0.2), np.log(500.), n))
+    etas = rng.uniform(-5., 5., n)
+    return pts, energies, etas
+
+
+def checks(module_name, n, rng, rtol=1e-12, alpha=1e-3, itol=5e-3):
+    '''Runs the checks of the detector module, and returns the list
+    of Results.'''
+    module = importlib.import_module(
+        'heppy.papas.detectors.FCCHiggsDetectors.' + module_name)
+    detector = module.CMS()
+    pts, energies, etas = sample(n, rng)
+    tracks = [ProbeTrack(pt, eta) for pt, eta in zip(pts, etas)]
+    clusters = [ProbeCluster(e, eta) for e, eta in zip(energies, etas)]
+    bins = np.clip(np.digitize(np.abs(etas), ETA_BINS) - 1, 0, len(ETA_BINS) - 2)
+    nbins = len(ETA_BINS) - 1
+    results = []
+
+    def exact(name, scalar, batch, tolerance=rtol, test='exact'):
+        expected, scalar_time = _timed(lambda: np.array(scalar(), dtype=float))
+        values, batch_time = _timed(lambda: np.asarray(batch(), dtype=float))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff = np.abs(values - expected) / np.maximum(np.abs(expected), 1e-300)
+        diff = float(np.nanmax(np.where(values == expected, 0., diff)))
+        results.append(Result(module_name, name, test, diff, float('nan'),
+                              diff <= tolerance, scalar_time, batch_time))
+
+    def distribution(name, scalar, batch):
+        expected, scalar_time = _timed(lambda: np.array(scalar(), dtype=float))
+        values, batch_time = _timed(lambda: np.asarray(batch(), dtype=float))
+        d, p = ks_2samp(expected, values)
+        results.append(Result(module_name, name, 'ks', d, p, p >= alpha,
+                              scalar_time, batch_time))
+
+    def fractions(name, scalar, efficiency):
+        accepted_a, scalar_time = _timed(lambda: np.array(scalar(), dtype=bool))
+
+        def batch():
+            eff = np.array(efficiency(), dtype=float)
+            return rng.uniform(size=len(eff)) < eff
+        accepted_b, batch_time = _timed(batch)
+        chi2, p = chi2_fractions(bins, accepted_a, accepted_b, nbins)
+        results.append(Result(module_name, name, 'chi2', chi2, p, p >= alpha,
+                              scalar_time, batch_time))
+
+    for name in ['ecal', 'hcal']:
+        calo = detector.elements[name]
+        exact(name + '_resolution',
+              lambda: [calo.energy_resolution(e, eta)
+                       for e, eta in zip(energies, etas)],
+              lambda: calo.smear(energies, etas, rng)[1])
+        distribution(name + '_smear',
+                     lambda: [e * rng.normal(calo.energy_response(e, eta),
+                                             calo.energy_resolution(e, eta))
+                              for e, eta in zip(energies, etas)],
+                     lambda: calo.smear(energies, etas, rng)[0])
+        exact(name + '_efficiency',
+              lambda: [calo.efficiency(cluster) for cluster in clusters],
+              lambda: calo.efficiencies(energies, etas))
+        fractions(name + '_acceptance',
+                  lambda: [calo.acceptance(cluster) for cluster in clusters],
+                  lambda: calo.efficiencies(energies, etas))
+
+    tracker = detector.elements['tracker']
+    if hasattr(tracker, 'resolutions'):
+        exact('tracker_resolution',
+              lambda: [tracker.resolution(track) for track in tracks],
+              lambda: tracker.resolutions(pts, etas))
+    if hasattr(tracker, 'model'):
+        exact('tracker_resolution_ref',
+              lambda: [reference_tracker_resolution(tracker.model, pt, eta)
+                       for pt, eta in zip(pts, etas)],
+              lambda: tracker.resolutions(pts, etas), itol, 'interp')
+    exact('tracker_efficiency',
+          lambda: [tracker.efficiency(track) for track in tracks],
+          lambda: tracker.efficiencies(pts, etas))
+    fractions('tracker_acceptance',
+              lambda: [tracker.acceptance(track) for track in tracks],
+              lambda: tracker.efficiencies(pts, etas))
+
+    for lepton, pdgid in [('electron', 11), ('muon', 13)]:
+        ptcs = [ProbeParticle(pdgid, pt, eta) for pt, eta in zip(pts, etas)]
+        for quantity in ['efficiency', 'resolution']:
+            role = '{}_{}'.format(lepton, quantity)
+            formula = getattr(detector, role + '_formula', None)
+            if formula is None:
+                continue
+            method = getattr(detector, role)
+            batch = getattr(detector, role + 's', None)
+            if batch is None:
+                batch = lambda pts, etas: formula(pt=pts, eta=etas)
+            # the scalar method and the batch path, both from the formula
+            exact(role,
+                  lambda: [method(ptc) for ptc in ptcs],
+                  lambda: batch(pts, etas))
+            # the formula against the baseline implementation, on the
+            # objects outside of the expected differences
+            edge_pts, edge_etas = [np.ravel(values) for values in np.meshgrid(
+                EDGE_PTS, EDGE_ETAS + [-eta for eta in EDGE_ETAS])]
+            ref_pts = np.concatenate([pts, edge_pts])
+            ref_etas = np.concatenate([etas, edge_etas])
+            differs = EXPECTED_DIFFERENCES[role][1]
+            kept = np.array([not differs(pt, eta)
+                             for pt, eta in zip(ref_pts, ref_etas)], dtype=bool)
+            exact(role + '_ref',
+                  lambda: [REFERENCES[role](pt, eta)
+                           for pt, eta in zip(ref_pts[kept], ref_etas[kept])],
+                  lambda: batch(ref_pts[kept], ref_etas[kept]))
+    return results
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] [detector module] ...')
+    parser.add_option('-n', '--nobjects', type='int', default=100000,
+                      help='number of synthetic objects per check')
+    parser.add_option('-a', '--alpha', type='float', default=1e-3,
+                      help='minimum p-value of the statistical tests')
+    parser.add_option('-r', '--rtol', type='float', default=1e-12,
+                      help='relative tolerance of the exact comparisons')
+    parser.add_option('-i', '--itol', type='float', default=5e-3,
+                      help='relative tolerance of the interpolated tables')
+    parser.add_option('-s', '--seed', type='int', default=1,
+                      help='seed of the synthetic samples')
+    options, args = parser.parse_args()
+    rng = np.random.RandomState(options.seed)
+    failed = False
+    print(HEADER)
+    for module_name in args or MODULES:
+        for result in checks(module_name, options.nobjects, rng,
+                             options.rtol, options.alpha, options.itol):
+            print(result.format())
+            failed = failed or not result.passed
+    sys.exit(1 if failed else 0)
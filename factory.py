@@ -0,0 +1,83 @@
+'''Builds detectors from a dictionary of parameters.
+
+Starts from one of the detector modules of this package, and changes
+the field strength and the calorimeter and tracker geometry:
+
+    detector = make_detector(dict(base='CMS', field=2., ecal_depth=0.3))
+
+Parameters:
+  base: name of the detector module, default 'CMS'.
+  field: magnitude of the magnetic field in T.
+  ecal_depth: ECAL barrel thickness in m, keeping the ECAL inner surface.
+    The endcap thickness is scaled by the same factor.
+  ecal_nX0, ecal_nLambdaI: ECAL thickness in radiation and interaction
+    lengths, by default those of the base ECAL. The ECAL material is
+    rebuilt as in CMS_2T_ECAL: X0 and lambdaI are depth / ecal_nX0 and
+    depth / ecal_nLambdaI. The geometry only changes with ecal_depth.
+  hcal_inner_radius: HCAL inner radius in m, keeping the HCAL thickness.
+  tracker_theta_max: maximum theta of the tracker acceptance, in degrees.
+    only for trackers with a theta_max acceptance, like CMS_2T_Tracker.
+
+The ECAL barrel must stay inside the HCAL, and with ecal_depth, the ECAL
+endcap must stay in front of the HCAL endcap. The endcaps of the base
+modules are not checked: in CMS_2T_ECAL, they start at the same z.
+'''
+
+import importlib
+import math
+
+import heppy.papas.detectors.material as material
+from heppy.papas.detectors.geometry import VolumeCylinder
+
+PARAMETERS = ['base', 'field', 'ecal_depth', 'ecal_nX0', 'ecal_nLambdaI',
+              'hcal_inner_radius', 'tracker_theta_max']
+
+
+def make_detector(params):
+    '''Returns a detector built from the params dictionary.'''
+    unknown = set(params) - set(PARAMETERS)
+    if unknown:
+        raise ValueError('unknown detector parameters: ' +
+                         ', '.join(sorted(unknown)))
+    module = importlib.import_module(
+        'heppy.papas.detectors.FCCHiggsDetectors.' + params.get('base', 'CMS')
+    )
+    detector = module.CMS()
+    if 'field' in params:
+        detector.elements['field'] = module.Field(params['field'])
+        tracker = detector.elements['tracker']
+        if hasattr(tracker, 'model'):
+            tracker.model = tracker.model.for_field(params['field'])
+    if set(['ecal_depth', 'ecal_nX0', 'ecal_nLambdaI']) & set(params):
+        ecal = detector.elements['ecal']
+        inner = ecal.volume.inner
+        base_depth = ecal.volume.outer.rad - inner.rad
+        depth = params.get('ecal_depth', base_depth)
+        nX0 = params.get('ecal_nX0', base_depth / ecal.material.x0)
+        nLambdaI = params.get('ecal_nLambdaI', base_depth / ecal.material.lambdaI)
+        if 'ecal_depth' in params:
+            endcap_depth = (ecal.volume.outer.z - inner.z) * depth / base_depth
+            ecal.volume = VolumeCylinder('ecal', inner.rad + depth,
+                                         inner.z + endcap_depth,
+                                         inner.rad, inner.z)
+        ecal.material = material.Material('ECAL', depth / nX0, depth / nLambdaI)
+    if 'hcal_inner_radius' in params:
+        hcal = detector.elements['hcal']
+        volume = hcal.volume
+        thickness = volume.outer.rad - volume.inner.rad
+        rad = params['hcal_inner_radius']
+        hcal.volume = VolumeCylinder('hcal', rad + thickness, volume.outer.z,
+                                     rad, volume.inner.z)
+    ecal_outer = detector.elements['ecal'].volume.outer
+    hcal_inner = detector.elements['hcal'].volume.inner
+    if ecal_outer.rad > hcal_inner.rad:
+        raise ValueError('the ECAL barrel overlaps with the HCAL')
+    if 'ecal_depth' in params and ecal_outer.z > hcal_inner.z:
+        raise ValueError('the ECAL endcap overlaps with the HCAL')
+    if 'tracker_theta_max' in params:
+        tracker = detector.elements['tracker']
+        if not hasattr(tracker, 'theta_max'):
+            raise ValueError('the tracker of {} has no theta_max'.format(
+                module.__name__))
+        tracker.theta_max = params['tracker_theta_max'] * math.pi / 180.
+    return detector
@@ -0,0 +1,42 @@
+'''Detector fingerprint, to tag the products derived from a detector.
+
+The fingerprint changes whenever the source of the detector module or
+the parameters of the detector elements change, e.g. for detectors built
+with factory.make_detector.
+'''
+
+import hashlib
+import inspect
+import sys
+
+import numpy as np
+
+_SIMPLE = (bool, int, float, str, type(None))
+
+
+def _describe(obj, depth=0):
+    '''Returns a deterministic description of the parameters of obj.'''
+    if isinstance(obj, _SIMPLE):
+        return repr(obj)
+    elif isinstance(obj, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(obj).tobytes()).hexdigest()
+    elif isinstance(obj, (list, tuple)):
+        return '[' + ','.join(_describe(item, depth) for item in obj) + ']'
+    elif isinstance(obj, dict):
+        return '{' + ','.join('{}:{}'.format(key, _describe(obj[key], depth))
+                              for key in sorted(obj)) + '}'
+    elif hasattr(obj, '__dict__') and depth < 3:
+        return type(obj).__name__ + _describe(vars(obj), depth + 1)
+    return type(obj).__name__
+
+
+def fingerprint(detector):
+    '''Returns the fingerprint of detector, as a hexadecimal string.'''
+    sha = hashlib.sha1()
+    module = sys.modules[type(detector).__module__]
+    sha.update(module.__name__.encode())
+    sha.update(inspect.getsource(module).encode())
+    for name in sorted(detector.elements):
+        sha.update(name.encode())
+        sha.update(_describe(detector.elements[name]).encode())
+    return sha.hexdigest()
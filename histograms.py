@@ -0,0 +1,181 @@
+'''Streaming, mergeable accumulators backed by numpy.
+
+They are filled with arrays of values, event by event or chunk by chunk,
+and accumulators filled in different jobs can be merged.
+'''
+
+import numpy as np
+
+
+class Histogram1D(object):
+    '''Histogram with fixed binning, including underflow and overflow.'''
+
+    def __init__(self, nbins, low, high):
+        self.edges = np.linspace(low, high, nbins + 1)
+        # counts[0] is the underflow, counts[-1] the overflow
+        self.counts = np.zeros(nbins + 2)
+
+    def fill(self, values, weights=None):
+        '''Fills the histogram with an array of values.'''
+        indices = np.searchsorted(self.edges, np.atleast_1d(values), side='right')
+        if weights is not None:
+            weights = np.atleast_1d(weights)
+        self.counts += np.bincount(indices, weights=weights,
+                                   minlength=len(self.counts))
+
+    def merge(self, other):
+        '''Adds the content of other, which must have the same binning.'''
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('cannot merge histograms with different binnings')
+        self.counts += other.counts
+        return self
+
+    def entries(self):
+        return self.counts.sum()
+
+    def quantile(self, q):
+        '''Returns the q quantile, interpolated linearly within the bins.
+        Underflow and overflow are not used.'''
+        counts = self.counts[1:-1]
+        total = counts.sum()
+        if total == 0:
+            return float('nan')
+        cumulative = np.concatenate([[0.], np.cumsum(counts)]) / total
+        return float(np.interp(q, cumulative, self.edges))
+
+    def save(self, path):
+        np.savez(path, edges=self.edges, counts=self.counts)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            hist = cls(len(data['edges']) - 1, data['edges'][0], data['edges'][-1])
+            hist.edges = data['edges']
+            hist.counts = data['counts']
+        return hist
+
+
+class Welford(object):
+    '''Running count, mean and variance.
+
+    Arrays of values are added with fill, and accumulators are combined
+    with merge (Chan et al. parallel algorithm), so that numerical
+    precision is kept over large numbers of values.
+    The accumulator can hold an array of independent running moments,
+    of shape shape.
+    '''
+
+    def __init__(self, shape=()):
+        self.n = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        safe = np.where(total > 0, total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / safe
+        self.m2 = self.m2 + m2 + delta**2 * self.n * n / safe
+        self.n = total
+
+    def fill(self, values, index=None):
+        '''Adds an array of values.
+
+        index: for an accumulator of shape shape, array of the indices of
+          the moments each value contributes to, e.g. the bins of the values.
+        '''
+        values = np.asarray(values, dtype=float)
+        if index is None:
+            if not values.size:
+                return
+            mean = values.mean()
+            self._combine(values.size, mean, ((values - mean)**2).sum())
+            return
+        flat = np.ravel_multi_index(index, self.n.shape) if isinstance(index, tuple) \
+            else np.asarray(index)
+        size = self.n.size
+        n = np.bincount(flat, minlength=size).reshape(self.n.shape)
+        sums = np.bincount(flat, weights=values, minlength=size).reshape(self.n.shape)
+        mean = sums / np.where(n > 0, n, 1)
+        deviations = values - mean.ravel()[flat]
+        m2 = np.bincount(flat, weights=deviations**2,
+                         minlength=size).reshape(self.n.shape)
+        self._combine(n, mean, m2)
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2)
+        return self
+
+    def variance(self):
+        '''Unbiased variance, nan with less than 2 values.'''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > 1, self.m2 / (self.n - 1), np.nan)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def arrays(self):
+        '''Returns the dictionary of arrays, e.g. to save with numpy.savez.'''
+        return dict(n=self.n, mean=self.mean, m2=self.m2)
+
+    @classmethod
+    def from_arrays(cls, n, mean, m2):
+        acc = cls()
+        acc.n = np.asarray(n, dtype=float)
+        acc.mean = np.asarray(mean, dtype=float)
+        acc.m2 = np.asarray(m2, dtype=float)
+        return acc
+
+
+class Efficiency(object):
+    '''Efficiency with fixed binning, including underflow and overflow.
+
+    Each value is filled with a boolean, True if the object passed the
+    selection. The efficiency of a bin is the fraction of the objects of
+    the bin which passed.
+    '''
+
+    def __init__(self, nbins, low, high):
+        self.edges = np.linspace(low, high, nbins + 1)
+        # passed[0] and total[0] are the underflow, [-1] the overflow
+        self.passed = np.zeros(nbins + 2)
+        self.total = np.zeros(nbins + 2)
+
+    def fill(self, values, passed):
+        '''Fills the arrays of values and of booleans.'''
+        indices = np.searchsorted(self.edges, np.atleast_1d(values), side='right')
+        passed = np.atleast_1d(passed).astype(float)
+        self.passed += np.bincount(indices, weights=passed,
+                                   minlength=len(self.passed))
+        self.total += np.bincount(indices, minlength=len(self.total))
+
+    def merge(self, other):
+        '''Adds the content of other, which must have the same binning.'''
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('cannot merge efficiencies with different binnings')
+        self.passed += other.passed
+        self.total += other.total
+        return self
+
+    def efficiencies(self):
+        '''Returns the efficiency of each bin, nan for empty bins.'''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.total > 0, self.passed / self.total, np.nan)
+
+    def errors(self):
+        '''Returns the binomial uncertainty of the efficiency of each bin.'''
+        eff = self.efficiencies()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(eff * (1. - eff) / self.total)
+
+    def arrays(self):
+        '''Returns the dictionary of arrays, e.g. to save with numpy.savez.'''
+        return dict(edges=self.edges, passed=self.passed, total=self.total)
+
+    @classmethod
+    def from_arrays(cls, edges, passed, total):
+        eff = cls(len(edges) - 1, edges[0], edges[-1])
+        eff.edges = np.asarray(edges, dtype=float)
+        eff.passed = np.asarray(passed, dtype=float)
+        eff.total = np.asarray(total, dtype=float)
+        return eff
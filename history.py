@@ -0,0 +1,348 @@
+'''Storage modes of the papas history.
+
+The papas event holds the history, a dictionary unique id -> node, which
+keeps track of which particles produced which tracks and clusters, and of
+the blocks and particles of the reconstruction. Each node is an object
+with lists of parent and child nodes, which costs a lot of memory for
+large events. The history is built by PapasSim, extended by the block
+builder and the reconstruction, and most production jobs never read it.
+
+The HistoryMode analyzer, scheduled right after PapasSim, applies one of
+the MODES to the history of each event:
+
+- full: the history is left untouched
+- compact: the history is replaced by a HistoryStore, which keeps the
+  unique ids and the parent -> child edges in integer arrays. The nodes
+  created afterwards by the block builder and the reconstruction are
+  folded into the arrays as soon as they are added, and the store gives
+  lightweight node views to the code reading the history.
+- off: the history is replaced by a HistoryStore which keeps nothing
+
+The nodes of the simulation are folded when HistoryMode runs, so they
+only live during PapasSim, and the later steps never hold node objects.
+HistoryMode saves the number of nodes and the bytes stored after the
+simulation for each event, and can also measure the size of the full
+history of the simulation and the size of the history at the end of the
+event. This
+tool prints the measurements of several jobs, e.g. one per detector
+variant::
+
+    python history.py Job_CMS/*HistoryMode* Job_CMS_2T/*HistoryMode* ...
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+from array import array
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+import numpy as np
+
+MODES = ['full', 'compact', 'off']
+MEMORY_FILE = 'history_memory.npz'
+
+
+class CompactHistory(object):
+    '''History graph stored as integer arrays.
+
+    ids: sorted array of the unique ids of the nodes.
+    parents, children: node indices of the edges, sorted by parent.
+    '''
+
+    def __init__(self, ids, parents, children):
+        self.ids = np.asarray(ids, dtype=np.uint64)
+        order = np.lexsort((children, parents))
+        self.parents = np.asarray(parents, dtype=np.int32)[order]
+        self.children = np.asarray(children, dtype=np.int32)[order]
+        self._by_child = None
+
+    @classmethod
+    def from_nodes(cls, history):
+        '''Builds the compact history from a dictionary id -> node.'''
+        ids = np.array(sorted(history), dtype=np.uint64)
+        edges = [(node.value, child.value) for node in history.values()
+                 for child in node.children]
+        if not edges:
+            return cls(ids, [], [])
+        parents, children = np.array(edges, dtype=np.uint64).T
+        return cls(ids, np.searchsorted(ids, parents),
+                   np.searchsorted(ids, children))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _index(self, uid):
+        index = np.searchsorted(self.ids, np.uint64(uid))
+        if index == len(self.ids) or self.ids[index] != uid:
+            raise KeyError(uid)
+        return index
+
+    def __contains__(self, uid):
+        try:
+            self._index(uid)
+        except KeyError:
+            return False
+        return True
+
+    def children_of(self, uid):
+        '''Returns the list of the unique ids of the children of uid.'''
+        index = self._index(uid)
+        start, stop = np.searchsorted(self.parents, [index, index + 1])
+        return [int(value) for value in self.ids[self.children[start:stop]]]
+
+    def parents_of(self, uid):
+        '''Returns the list of the unique ids of the parents of uid.'''
+        if self._by_child is None:
+            order = np.argsort(self.children, kind='mergesort')
+            self._by_child = self.children[order], self.parents[order]
+        children, parents = self._by_child
+        index = self._index(uid)
+        start, stop = np.searchsorted(children, [index, index + 1])
+        return [int(value) for value in self.ids[parents[start:stop]]]
+
+    def nbytes(self):
+        return self.ids.nbytes + self.parents.nbytes + self.children.nbytes
+
+
+def deep_size(obj):
+    '''Returns the size in bytes of obj and of all objects it refers to,
+    through containers, instance dictionaries and slots.'''
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, np.ndarray):
+            size += obj.nbytes
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                stack.append(getattr(obj, slot))
+    return size
+
+
+class _NodeView(object):
+    '''Node of a HistoryStore, with the interface of the papas nodes.'''
+
+    __slots__ = ['store', 'value']
+
+    def __init__(self, store, value):
+        self.store = store
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+    def add_child(self, child):
+        self.store.add_edge(self.value, child.value)
+
+    def add_parent(self, parent):
+        self.store.add_edge(parent.value, self.value)
+
+    @property
+    def children(self):
+        return [_NodeView(self.store, uid) for uid in self.store.children_of(self.value)]
+
+    @property
+    def parents(self):
+        return [_NodeView(self.store, uid) for uid in self.store.parents_of(self.value)]
+
+
+class _NullNode(object):
+    '''Node of a history which is off: links are dropped.'''
+
+    children = ()
+    parents = ()
+
+    def __init__(self, value):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+    def add_child(self, child):
+        pass
+
+    def add_parent(self, parent):
+        pass
+
+
+class HistoryStore(MutableMapping):
+    '''History mapping unique id -> node, storing the graph in arrays as
+    the nodes and edges are added.
+
+    mode: 'compact' to keep the unique ids and the edges, 'off' to keep
+      nothing. When off, the store is empty, and any node looked up is a
+      node without links.
+    '''
+
+    def __init__(self, mode='compact'):
+        if mode not in ('compact', 'off'):
+            raise ValueError('history store mode must be compact or off, not ' + mode)
+        self.mode = mode
+        self._ids = set()
+        self._parents = array('Q')
+        self._children = array('Q')
+        self._compact = None
+        # number of edges of the arrays when last deduplicated
+        self._deduplicated = 0
+        # (node, number of children, number of parents folded) of the node
+        # added last, whose new links are folded at the next access, in
+        # case they were made on the node object after adding it
+        self._last = None
+
+    def _flush(self):
+        if self._last is None:
+            return
+        node, nchildren, nparents = self._last
+        children, parents = node.children, node.parents
+        for child in children[nchildren:]:
+            self.add_edge(node.value, child.value)
+        for parent in parents[nparents:]:
+            self.add_edge(parent.value, node.value)
+        self._last = node, len(children), len(parents)
+
+    def add_edge(self, parent, child):
+        if self.mode == 'off':
+            return
+        self._ids.add(parent)
+        self._ids.add(child)
+        self._parents.append(parent)
+        self._children.append(child)
+        self._compact = None
+
+    def __setitem__(self, uid, node):
+        '''Folds the node and its links into the store, the node object
+        itself is not kept.'''
+        if self.mode == 'off':
+            return
+        self._flush()
+        self._last = None
+        self._ids.add(uid)
+        self._compact = None
+        children = list(getattr(node, 'children', ()))
+        parents = list(getattr(node, 'parents', ()))
+        for child in children:
+            self.add_edge(uid, child.value)
+        for parent in parents:
+            self.add_edge(parent.value, uid)
+        if getattr(node, 'value', None) == uid and isinstance(node.children, list):
+            self._last = node, len(children), len(parents)
+
+    def __getitem__(self, uid):
+        if self.mode == 'off':
+            return _NullNode(uid)
+        self._flush()
+        if uid not in self._ids:
+            raise KeyError(uid)
+        return _NodeView(self, uid)
+
+    def __delitem__(self, uid):
+        raise TypeError('nodes cannot be removed from a HistoryStore')
+
+    def __contains__(self, uid):
+        return uid in self._ids
+
+    def __iter__(self):
+        return iter(sorted(self._ids))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _deduplicate(self):
+        '''Removes the duplicate edges from the arrays. An edge is added
+        twice when both of its nodes are folded, from the children of the
+        parent and from the parents of the child.'''
+        self._flush()
+        if self._deduplicated == len(self._parents):
+            return
+        edges = np.unique(np.array([self._parents, self._children],
+                                   dtype=np.uint64).reshape(2, -1), axis=1)
+        self._parents = array('Q', edges[0].tolist())
+        self._children = array('Q', edges[1].tolist())
+        self._deduplicated = len(self._parents)
+
+    def compact(self):
+        '''Returns the CompactHistory of the store.'''
+        self._deduplicate()
+        if self._compact is None:
+            ids = np.array(sorted(self._ids), dtype=np.uint64)
+            parents = np.array(self._parents, dtype=np.uint64)
+            children = np.array(self._children, dtype=np.uint64)
+            self._compact = CompactHistory(ids, np.searchsorted(ids, parents),
+                                           np.searchsorted(ids, children))
+        return self._compact
+
+    def children_of(self, uid):
+        return self.compact().children_of(uid)
+
+    def parents_of(self, uid):
+        return self.compact().parents_of(uid)
+
+    def nbytes(self):
+        '''Returns the number of bytes of the ids and edges stored, the
+        duplicate edges being removed first.'''
+        self._deduplicate()
+        return (sys.getsizeof(self._ids) + sum(sys.getsizeof(uid) for uid in self._ids) +
+                sys.getsizeof(self._parents) + sys.getsizeof(self._children))
+
+
+def apply_mode(papasevent, mode):
+    '''Applies the history mode to the papas event: the history is
+    replaced by a HistoryStore, holding the nodes already created, except
+    in full mode.'''
+    if mode not in MODES:
+        raise ValueError('history mode must be one of {}, not {}'.format(
+            MODES, mode))
+    if mode == 'full' or isinstance(papasevent.history, HistoryStore):
+        return
+    store = HistoryStore(mode)
+    for uid, node in papasevent.history.items():
+        store[uid] = node
+    papasevent.history = store
+
+
+def summary(directory):
+    '''Returns (detector, mode, nevents, mean number of nodes after the
+    simulation, mean full and stored sizes in kB after the simulation,
+    mean number of nodes and stored size in kB at the end of the event)
+    for a job. The sizes which were not measured are nan.'''
+    with np.load(os.path.join(directory, MEMORY_FILE)) as data:
+        detector, mode = str(data['detector']), str(data['mode'])
+        columns = [data[key] for key in ['sim_nodes', 'simulated', 'sim_stored',
+                                         'nodes', 'stored']]
+    if not len(columns[0]):
+        return (detector, mode, 0) + (np.nan,) * 5
+    nodes, simulated, sim_stored, end_nodes, stored = [column.mean() for column in columns]
+    return (detector, mode, len(columns[0]), nodes, simulated / 1e3,
+            sim_stored / 1e3, end_nodes, stored / 1e3)
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog <HistoryMode analyzer directory> ...')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('please provide analyzer directories')
+    print('{:24} {:>8} {:>8} | {:^31} | {:^20}'.format(
+        '', '', '', 'simulation', 'end of event'))
+    print('{:24} {:>8} {:>8} | {:>9} {:>10} {:>10} | {:>9} {:>10}'.format(
+        'detector', 'mode', 'events', 'nodes', 'full/kB', 'stored/kB',
+        'nodes', 'stored/kB'))
+    for directory in args:
+        print('{:24} {:>8} {:8d} | {:9.1f} {:10.1f} {:10.1f} | {:9.1f} {:10.1f}'.format(
+            *summary(directory)))
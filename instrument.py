@@ -0,0 +1,135 @@
+'''Per-analyzer wall time, CPU time and memory instrumentation.
+
+Wrap a sequence in a config::
+
+    from heppy.papas.detectors.FCCHiggsDetectors.instrument import instrument
+    papas_sequence = instrument(papas_sequence)
+
+For each analyzer, the wall time, the CPU time and the net memory allocated
+during process are recorded for every event. At the end of the loop,
+each analyzer writes instrumentation.txt (percentile summary) and
+instrumentation.npz (histogram of log10 of the wall time, and per-event
+values) to its directory, and a summary line to instrumentation.txt in
+the looper directory, to compare the stages.
+
+Memory is measured with tracemalloc (python 3), which slows down the
+job; it can be switched off with memory=False.
+'''
+
+import os
+import timeit
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Histogram1D
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from time import process_time as cpu_time
+except ImportError:
+    from time import clock as cpu_time
+
+PERCENTILES = [50, 90, 99]
+
+# log10 of the wall time in s, from 1 us to 100 s
+WALL_TIME_BINS = (80, -6., 2.)
+
+
+class StageStats(object):
+    '''Per-event measurements of one analyzer.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = []
+        self.cpu = []
+        self.memory = []
+
+    def summary(self):
+        '''Returns a dictionary quantity -> (mean, percentiles...)'''
+        result = dict()
+        for quantity in ['wall', 'cpu', 'memory']:
+            values = np.asarray(getattr(self, quantity), dtype=float)
+            if not len(values):
+                continue
+            result[quantity] = [values.mean()] + \
+                list(np.percentile(values, PERCENTILES)) + [values.max()]
+        return result
+
+    def format(self):
+        header = 'mean ' + ' '.join('p{}'.format(p) for p in PERCENTILES) + ' max'
+        lines = ['{} ({} events)'.format(self.name, len(self.wall)),
+                 '{:10} {}'.format('', header)]
+        units = dict(wall=('ms', 1e3), cpu=('ms', 1e3), memory=('kB', 1e-3))
+        for quantity, values in sorted(self.summary().items()):
+            unit, scale = units[quantity]
+            lines.append('{:10} '.format(quantity + '/' + unit) +
+                         ' '.join('{:.3g}'.format(value * scale) for value in values))
+        return '\n'.join(lines)
+
+    def write(self, directory):
+        with open(os.path.join(directory, 'instrumentation.txt'), 'w') as out:
+            out.write(self.format() + '\n')
+        hist = Histogram1D(*WALL_TIME_BINS)
+        wall = np.asarray(self.wall, dtype=float)
+        hist.fill(np.log10(np.maximum(wall, 1e-9)))
+        np.savez(os.path.join(directory, 'instrumentation.npz'),
+                 log10_wall_edges=hist.edges, log10_wall_counts=hist.counts,
+                 wall=wall, cpu=np.asarray(self.cpu, dtype=float),
+                 memory=np.asarray(self.memory, dtype=float))
+
+
+class Instrumented(object):
+    '''Replaces the class of an analyzer configuration. Instantiates the
+    analyzer, and wraps its process and endLoop methods.'''
+
+    def __init__(self, class_object, memory=True):
+        self.class_object = class_object
+        self.memory = memory and tracemalloc is not None
+        self.__module__ = class_object.__module__
+        self.__name__ = class_object.__name__
+
+    def __call__(self, *args, **kwargs):
+        analyzer = self.class_object(*args, **kwargs)
+        stats = StageStats(analyzer.name)
+        process = analyzer.process
+        end_loop = analyzer.endLoop
+        measure_memory = self.memory
+        if measure_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        def timed_process(event):
+            if measure_memory:
+                memory_start = tracemalloc.get_traced_memory()[0]
+            cpu_start = cpu_time()
+            wall_start = timeit.default_timer()
+            result = process(event)
+            stats.wall.append(timeit.default_timer() - wall_start)
+            stats.cpu.append(cpu_time() - cpu_start)
+            if measure_memory:
+                stats.memory.append(tracemalloc.get_traced_memory()[0] - memory_start)
+            return result
+
+        def timed_end_loop(setup):
+            end_loop(setup)
+            stats.write(analyzer.dirName)
+            with open(os.path.join(analyzer.looperName,
+                                   'instrumentation.txt'), 'a') as out:
+                out.write(stats.format() + '\n\n')
+
+        analyzer.process = timed_process
+        analyzer.endLoop = timed_end_loop
+        analyzer.instrumentation = stats
+        return analyzer
+
+
+def instrument(sequence, memory=True):
+    '''Instruments all analyzer configurations in the sequence.
+    Returns the sequence.'''
+    for cfg_ana in sequence:
+        if not isinstance(cfg_ana.class_object, Instrumented):
+            cfg_ana.class_object = Instrumented(cfg_ana.class_object, memory)
+    return sequence
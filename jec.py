@@ -0,0 +1,119 @@
+'''Binned jet energy corrections.
+
+A correction table holds correction factors in bins of rec jet pt and
+|eta|, see jec_calibration.py.
+The factors are interpolated linearly between the bin centres, and
+clamped outside. Tables are stored as JSON files::
+
+    {
+      "detector": "CMS_2T",
+      "pt_edges": [10, 20, 50, 100, 200],
+      "eta_edges": [0, 1.3, 2.5, 5],
+      "factors": [[1.15, 1.18, 1.2], ...]
+    }
+
+with one row of factors per pt bin. The table of a detector module is
+looked for in the jec directory of this package, e.g. jec/CMS_2T.json,
+so that new corrections can be used without changing the code.
+'''
+
+import json
+import os
+
+import numpy as np
+
+JEC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jec')
+
+_cache = dict()
+
+
+def _interpolate(centres, values):
+    '''Returns the lower indices and weights for a linear interpolation
+    of values between the bin centres.'''
+    if len(centres) == 1:
+        return np.zeros(len(values), dtype=int), np.zeros(len(values))
+    values = np.clip(values, centres[0], centres[-1])
+    index = np.clip(np.searchsorted(centres, values, side='right') - 1,
+                    0, len(centres) - 2)
+    weight = (values - centres[index]) / (centres[index + 1] - centres[index])
+    return index, weight
+
+
+class JetEnergyCorrection(object):
+    '''Correction table in bins of jet pt and |eta|.'''
+
+    def __init__(self, pt_edges, eta_edges, factors, detector=None):
+        self.pt_edges = np.asarray(pt_edges, dtype=float)
+        self.eta_edges = np.asarray(eta_edges, dtype=float)
+        self.factors = np.asarray(factors, dtype=float)
+        self.detector = detector
+        expected = (len(self.pt_edges) - 1, len(self.eta_edges) - 1)
+        if self.factors.shape != expected:
+            raise ValueError('factors of shape {} for {} pt and {} eta bins'.format(
+                self.factors.shape, *expected))
+        self.pt_centres = 0.5 * (self.pt_edges[1:] + self.pt_edges[:-1])
+        self.eta_centres = 0.5 * (self.eta_edges[1:] + self.eta_edges[:-1])
+
+    def correction(self, pts, etas):
+        '''Returns the array of correction factors for arrays of jet
+        pts and etas.'''
+        ipt, wpt = _interpolate(self.pt_centres, np.asarray(pts, dtype=float))
+        ieta, weta = _interpolate(self.eta_centres,
+                                  np.abs(np.asarray(etas, dtype=float)))
+        # with a single bin along an axis, the weight is 0 and the
+        # upper index is never used
+        ipt1 = np.minimum(ipt + 1, len(self.pt_centres) - 1)
+        ieta1 = np.minimum(ieta + 1, len(self.eta_centres) - 1)
+        f = self.factors
+        return ((1 - wpt) * (1 - weta) * f[ipt, ieta] +
+                wpt * (1 - weta) * f[ipt1, ieta] +
+                (1 - wpt) * weta * f[ipt, ieta1] +
+                wpt * weta * f[ipt1, ieta1])
+
+    def corrections(self, jets):
+        '''Returns the array of correction factors for a list of jets,
+        in one pass.'''
+        if not jets:
+            return np.empty(0)
+        kinematics = np.array([(jet.pt(), jet.eta()) for jet in jets])
+        return self.correction(kinematics[:, 0], kinematics[:, 1])
+
+    def __call__(self, jet):
+        '''Returns the correction factor for one jet.'''
+        return float(self.correction([jet.pt()], [jet.eta()])[0])
+
+    def to_dict(self):
+        return dict(detector=self.detector,
+                    pt_edges=self.pt_edges.tolist(),
+                    eta_edges=self.eta_edges.tolist(),
+                    factors=self.factors.tolist())
+
+
+def save(path, table):
+    '''Writes the JetEnergyCorrection table to path.'''
+    with open(path, 'w') as out:
+        json.dump(table.to_dict(), out, indent=2)
+
+
+def load(path):
+    '''Returns the JetEnergyCorrection in path.
+
+    Tables are cached, and only read again if the file changed.
+    '''
+    path = os.path.abspath(path)
+    key = (path, os.path.getmtime(path))
+    if key not in _cache:
+        with open(path) as infile:
+            data = json.load(infile)
+        _cache[key] = JetEnergyCorrection(data['pt_edges'], data['eta_edges'],
+                                          data['factors'], data.get('detector'))
+    return _cache[key]
+
+
+def for_detector(name, directory=JEC_DIR):
+    '''Returns the JetEnergyCorrection of detector module name,
+    or None if there is no table for this detector.'''
+    path = os.path.join(directory, name + '.json')
+    if not os.path.exists(path):
+        return None
+    return load(path)
@@ -0,0 +1,216 @@
+'''Derivation of the jet energy corrections from Z->jj samples.
+
+1. The papas sequence is run on a sample for each detector variant, with
+   a calibration config containing the JetResponse analyzer (see
+   analyzers/JetResponse.py). The detector variant is passed to the
+   config as the heppy option detector, e.g. -o detector=CMS_2T.
+   The variants run in parallel.
+2. JetResponse matches rec jets to gen jets, and accumulates the
+   response rec pt / gen pt in bins of gen jet pt and |eta|, in a
+   ResponseAccumulator saved at the end of each job.
+3. The accumulators of all jobs of a variant are merged, and the median
+   response R is computed in each bin of gen jet pt.
+4. The corrections are applied to rec jets, so the table is inverted
+   numerically: a gen jet of pt g gives a rec jet of pt g R(g), to be
+   corrected by 1 / R(g). The correction is interpolated at the bin
+   centres of rec jet pt.
+5. The correction tables are written to the jec directory, where the
+   detectors pick them up, see jec.py.
+
+The calibration config, by default config/jec_calibration_cfg.py, gets
+the input files as the heppy option files.
+
+Example::
+
+    python jec_calibration.py -f zjj_1.root,zjj_2.root -N 100000 -w work CMS CMS_2T
+'''
+
+from __future__ import print_function
+
+import os
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors import jec
+
+PT_EDGES = [10., 15., 20., 30., 40., 50., 60., 80., 100., 150., 200.]
+ETA_EDGES = [0., 0.5, 1., 1.3, 1.5, 2., 2.5, 3.]
+RESPONSE_BINS = (200, 0., 2.)
+
+RESPONSE_FILE = 'jet_response.npz'
+CALIBRATION_CFG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'config', 'jec_calibration_cfg.py')
+
+
+class ResponseAccumulator(object):
+    '''Response histograms in bins of gen jet pt and |eta|.'''
+
+    def __init__(self, pt_edges=PT_EDGES, eta_edges=ETA_EDGES,
+                 response_bins=RESPONSE_BINS):
+        self.pt_edges = np.asarray(pt_edges, dtype=float)
+        self.eta_edges = np.asarray(eta_edges, dtype=float)
+        nbins, low, high = response_bins
+        self.response_edges = np.linspace(low, high, nbins + 1)
+        # response underflow and overflow included
+        self.counts = np.zeros((len(self.pt_edges) - 1,
+                                len(self.eta_edges) - 1,
+                                nbins + 2))
+
+    def fill(self, gen_pts, gen_etas, responses):
+        '''Fills arrays of gen jet pts and etas and of responses.
+        Jets outside of the pt and eta bins are ignored.'''
+        ipt = np.searchsorted(self.pt_edges, gen_pts, side='right') - 1
+        ieta = np.searchsorted(self.eta_edges, np.abs(gen_etas), side='right') - 1
+        inside = ((ipt >= 0) & (ipt < self.counts.shape[0]) &
+                  (ieta >= 0) & (ieta < self.counts.shape[1]))
+        iresp = np.searchsorted(self.response_edges, responses, side='right')
+        flat = np.ravel_multi_index((ipt[inside], ieta[inside], iresp[inside]),
+                                    self.counts.shape)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(
+            self.counts.shape)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def save(self, path):
+        np.savez(path, pt_edges=self.pt_edges, eta_edges=self.eta_edges,
+                 response_edges=self.response_edges, counts=self.counts)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            edges = data['response_edges']
+            acc = cls(data['pt_edges'], data['eta_edges'],
+                      (len(edges) - 1, edges[0], edges[-1]))
+            acc.counts = data['counts']
+        return acc
+
+    def medians(self, min_entries=50):
+        '''Returns the median response in each bin, nan for bins with
+        less than min_entries entries.'''
+        counts = self.counts[..., 1:-1]
+        total = counts.sum(axis=-1)
+        cumulative = np.cumsum(counts, axis=-1)
+        medians = np.full(total.shape, np.nan)
+        for index in zip(*np.nonzero(total >= min_entries)):
+            fractions = np.concatenate([[0.], cumulative[index]]) / total[index]
+            medians[index] = np.interp(0.5, fractions, self.response_edges)
+        return medians
+
+
+def invert(pt_centres, responses):
+    '''Returns the corrections at the rec jet pts pt_centres, from the
+    responses at the gen jet pts pt_centres.
+
+    pt_centres: array of the pt bin centres.
+    responses: (npt, neta) array of the responses.
+
+    The gen jets of pt g give rec jets of pt g R(g), to be corrected by
+    1 / R(g). The corrections are interpolated linearly in rec jet pt,
+    and clamped outside the rec jet pts of the bins.
+    '''
+    corrections = np.empty_like(responses)
+    for ieta in range(responses.shape[1]):
+        rec_pts = pt_centres * responses[:, ieta]
+        order = np.argsort(rec_pts, kind='mergesort')
+        corrections[:, ieta] = np.interp(pt_centres, rec_pts[order],
+                                         1. / responses[order, ieta])
+    return corrections
+
+
+def fit(accumulator, detector=None, min_entries=50):
+    '''Returns the JetEnergyCorrection table derived from accumulator,
+    in bins of rec jet pt, see invert.
+
+    Bins with too few entries get the response of the closest
+    pt bin in the same eta bin, or 1 if the eta bin is empty.
+    '''
+    responses = accumulator.medians(min_entries)
+    for ieta in range(responses.shape[1]):
+        column = responses[:, ieta]
+        filled = np.flatnonzero(np.isfinite(column) & (column > 0))
+        if not len(filled):
+            column[:] = 1.
+            continue
+        for ipt in np.flatnonzero(~(np.isfinite(column) & (column > 0))):
+            column[ipt] = column[filled[np.argmin(np.abs(filled - ipt))]]
+    pt_centres = 0.5 * (accumulator.pt_edges[1:] + accumulator.pt_edges[:-1])
+    return jec.JetEnergyCorrection(accumulator.pt_edges, accumulator.eta_edges,
+                                   invert(pt_centres, responses), detector)
+
+
+def collect(outdir):
+    '''Returns the merged ResponseAccumulator of all jobs in outdir,
+    or None if there is none.'''
+    merged = None
+    for dirpath, dirnames, filenames in sorted(os.walk(outdir)):
+        if RESPONSE_FILE in filenames:
+            acc = ResponseAccumulator.load(os.path.join(dirpath, RESPONSE_FILE))
+            merged = acc if merged is None else merged.merge(acc)
+    return merged
+
+
+def run_variant(variant, cfg, workdir, nevents, files=None):
+    '''Runs the calibration config for a detector variant with heppy,
+    and returns the output directory.'''
+    outdir = os.path.join(workdir, variant)
+    command = ['heppy_loop.py', outdir, cfg, '-f',
+               '-N', str(nevents), '-o', 'detector=' + variant]
+    if files:
+        command += ['-o', 'files=' + files]
+    subprocess.check_call(command)
+    return outdir
+
+
+def calibrate(variants, cfg, workdir, nevents, jec_dir=jec.JEC_DIR,
+              min_entries=50, files=None):
+    '''Runs the calibration for all variants in parallel, and writes
+    the correction tables to jec_dir.
+
+    files: comma-separated input files, given to cfg as the heppy option
+      files.
+    '''
+    pool = ThreadPool(len(variants))
+    try:
+        outdirs = pool.map(
+            lambda variant: run_variant(variant, cfg, workdir, nevents, files),
+            variants
+        )
+    finally:
+        pool.close()
+        pool.join()
+    if not os.path.isdir(jec_dir):
+        os.makedirs(jec_dir)
+    for variant, outdir in zip(variants, outdirs):
+        acc = collect(outdir)
+        if acc is None:
+            print('no jet response found for', variant)
+            continue
+        path = os.path.join(jec_dir, variant + '.json')
+        jec.save(path, fit(acc, variant, min_entries))
+        print('corrections for {} written to {}'.format(variant, path))
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] <detector module> ...')
+    parser.add_option('-c', '--cfg', default=CALIBRATION_CFG,
+                      help='calibration config')
+    parser.add_option('-f', '--files', default=None,
+                      help='comma-separated input files of the calibration config')
+    parser.add_option('-N', '--nevents', type='int', default=10000,
+                      help='number of events per variant')
+    parser.add_option('-w', '--workdir', default='jec_calibration',
+                      help='directory for the heppy outputs')
+    parser.add_option('-o', '--jec-dir', dest='jec_dir', default=jec.JEC_DIR,
+                      help='output directory of the correction tables')
+    parser.add_option('-m', '--min-entries', dest='min_entries', type='int',
+                      default=50, help='minimum number of jets per bin')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('please provide detector modules')
+    calibrate(args, options.cfg, options.workdir, options.nevents,
+              options.jec_dir, options.min_entries, options.files)
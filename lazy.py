@@ -0,0 +1,40 @@
+'''Lazy loading of analyzer classes in configuration files.
+
+A LazyClass can be given to cfg.Analyzer instead of the analyzer class.
+The module of the analyzer is only imported when the looper instantiates
+the analyzer, so analyzers which are configured but not scheduled in the
+sequence do not cost anything at startup.
+'''
+
+import importlib
+
+
+class LazyClass(object):
+    '''Proxy for a class given by its dotted path, e.g.
+    'heppy.analyzers.PapasDisplay.PapasDisplay'.
+
+    Example::
+
+        papasdisplay = cfg.Analyzer(
+            LazyClass('heppy.analyzers.PapasDisplay.PapasDisplay'),
+            ...
+        )
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.__module__, self.__name__ = path.rsplit('.', 1)
+        self._class = None
+
+    def resolve(self):
+        '''Imports and returns the class.'''
+        if self._class is None:
+            module = importlib.import_module(self.__module__)
+            self._class = getattr(module, self.__name__)
+        return self._class
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return 'LazyClass({!r})'.format(self.path)
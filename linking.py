@@ -0,0 +1,186 @@
+'''Spatial index for the track / cluster link finding.
+
+The PF block builder tests every pair of elements for a link, which
+scales quadratically with the number of tracks and clusters in the event.
+The EtaPhiGrid below bins the elements in eta-phi cells, so that only
+the elements in the cells within the largest link angle of an element
+need to be tested, see max_link_angle.
+'''
+
+import math
+from collections import defaultdict
+
+
+class _PdgId(object):
+    '''Minimal particle stand-in to query DetectorElement.cluster_size.'''
+
+    def __init__(self, pdgid):
+        self._pdgid = pdgid
+
+    def pdgid(self):
+        return self._pdgid
+
+
+# particle types for which the calorimeters define a cluster size
+_CLUSTER_SIZE_PDGIDS = [22, 11, 211, 130]
+
+
+def max_cluster_size(element):
+    '''Returns the largest cluster size (in m) defined by a calorimeter.'''
+    return max(element.cluster_size(_PdgId(pdgid))
+               for pdgid in _CLUSTER_SIZE_PDGIDS)
+
+
+def angular_size(element):
+    '''Returns the largest angular cluster size of a calorimeter,
+    computed at the inner radius of the calorimeter.'''
+    return math.atan(max_cluster_size(element) / element.volume.inner.rad)
+
+
+def cell_size(detector):
+    '''Returns the grid cell size in eta and phi for a detector.
+
+    An ECAL and an HCAL cluster can be linked if their distance is smaller
+    than the sum of their angular sizes, so the cells have the size of the
+    sum of the largest ECAL and HCAL angular sizes. The cells searched for
+    the neighbours of an element are given by the largest link angle of the
+    event, see max_link_angle, and cover a larger eta and phi range close
+    to the beam axis, see EtaPhiGrid._cells_within.
+    '''
+    return (angular_size(detector.elements['ecal']) +
+            angular_size(detector.elements['hcal']))
+
+
+def max_link_angle(max_angular_size, max_size, min_radius):
+    '''Returns the largest angle between the directions of two linked
+    elements.
+
+    max_angular_size: largest angular size of the clusters. ECAL and HCAL
+      clusters are linked within the sum of their angular sizes.
+    max_size: largest size of the clusters (in m). Clusters of the same
+      layer, and tracks and clusters, are linked within the sum of the
+      sizes, or the size, of the clusters, at a distance (in m) from the
+      origin larger than min_radius.
+    '''
+    # two points at a distance d, both further than r from the origin,
+    # are seen under an angle smaller than asin(d / r)
+    chord = min(1., 2. * max_size / min_radius)
+    return max(2. * max_angular_size, math.asin(chord))
+
+
+def _eta(theta):
+    return -math.log(math.tan(theta / 2.))
+
+
+class EtaPhiGrid(object):
+    '''Regular eta-phi grid holding element identifiers.
+
+    The directions within a given angle of an element cover a larger
+    eta and phi range close to the beam axis. The neighbours of an element
+    are searched in all the cells of this range, so that no pair of
+    elements within the angle is missed, whatever the cell size.
+
+    Example::
+
+        grid = EtaPhiGrid(cell_size(detector))
+        for uid, eta, phi in elements:
+            grid.add(uid, eta, phi)
+        for id1, id2 in grid.candidate_pairs(angle):
+            ...
+    '''
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.nphi = max(1, int(2 * math.pi / cell_size))
+        self.cells = defaultdict(list)
+        self.entries = []
+
+    def cell(self, eta, phi):
+        '''Returns the (ieta, iphi) index of the cell containing eta, phi.'''
+        ieta = int(math.floor(eta / self.cell_size))
+        return ieta, self._iphi(phi) % self.nphi
+
+    def _iphi(self, phi):
+        return int(math.floor((phi + math.pi) / (2 * math.pi) * self.nphi))
+
+    def add(self, uid, eta, phi):
+        '''Adds the element uid at eta, phi. An element can be added at
+        several positions.'''
+        self.cells[self.cell(eta, phi)].append(uid)
+        self.entries.append((uid, eta, phi))
+
+    def _cells_within(self, eta, phi, angle):
+        '''Returns the cells which can hold directions within angle of
+        eta, phi.'''
+        # ROOT gives eta = +- 1e10 along the beam axis
+        theta = 2. * math.atan(math.exp(-max(-50., min(50., eta))))
+        ietas = [ieta for ieta, iphi in self.cells]
+        ieta_low, ieta_high = min(ietas), max(ietas)
+        if theta + angle < math.pi:
+            ieta_low = max(ieta_low, self.cell(_eta(theta + angle), 0.)[0])
+        if theta - angle > 0.:
+            ieta_high = min(ieta_high, self.cell(_eta(theta - angle), 0.)[0])
+        # largest phi difference of the directions within angle, the
+        # whole phi range if the cone contains the beam axis
+        iphis = range(self.nphi)
+        if 0. < theta - angle and theta + angle < math.pi:
+            sin_dphi = math.sin(angle) / math.sin(theta)
+            if sin_dphi < 1.:
+                dphi = math.asin(sin_dphi)
+                low, high = self._iphi(phi - dphi), self._iphi(phi + dphi)
+                if high - low + 1 < self.nphi:
+                    iphis = [iphi % self.nphi for iphi in range(low, high + 1)]
+        if (ieta_high - ieta_low + 1) * len(iphis) > len(self.cells):
+            # e.g. close to the beam axis, fewer filled cells than cells
+            # in the range
+            iphis = set(iphis)
+            return [(ieta, iphi) for ieta, iphi in self.cells
+                    if ieta_low <= ieta <= ieta_high and iphi in iphis]
+        return [(ieta, iphi) for ieta in range(ieta_low, ieta_high + 1)
+                for iphi in iphis]
+
+    def neighbours(self, eta, phi, angle=None):
+        '''Returns the identifiers of the elements which can be within
+        angle of eta, phi, by default within the cell size.'''
+        if not self.cells:
+            return []
+        if angle is None:
+            angle = self.cell_size
+        uids = []
+        for key in self._cells_within(eta, phi, angle):
+            uids.extend(self.cells.get(key, []))
+        return uids
+
+    def candidate_pairs(self, angle=None):
+        '''Returns the sorted list of (id1, id2) pairs, id1 < id2, of
+        elements which can be within angle of each other, by default
+        within the cell size.'''
+        pairs = set()
+        for id1, eta, phi in self.entries:
+            for id2 in self.neighbours(eta, phi, angle):
+                if id1 < id2:
+                    pairs.add((id1, id2))
+                elif id2 < id1:
+                    pairs.add((id2, id1))
+        return sorted(pairs)
+
+
+def find_links(elements, is_linked, size, angle=None):
+    '''Returns the sorted list of linked (id1, id2) pairs.
+
+    elements: iterable of (uid, eta, phi). an element can be given at
+      several positions.
+    is_linked: function taking two identifiers and returning True
+      if the corresponding elements are linked.
+    size: cell size, see cell_size.
+    angle: largest angle between two linked elements, see
+      max_link_angle. by default the cell size.
+
+    Only pairs of elements in neighbouring cells are tested, which scales
+    about linearly with the number of elements instead of quadratically.
+    '''
+    grid = EtaPhiGrid(size)
+    for uid, eta, phi in elements:
+        grid.add(uid, eta, phi)
+    return [(id1, id2) for id1, id2 in grid.candidate_pairs(angle)
+            if is_linked(id1, id2)]
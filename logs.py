@@ -0,0 +1,191 @@
+'''Level-gated, lazily formatted structured logging.
+
+A structured message is an event name and key=value fields::
+
+    from heppy.papas.detectors.FCCHiggsDetectors.logs import StructuredLogger
+    self.slog = StructuredLogger(self.logger)
+    if __debug__:
+        self.slog.debug('smeared', pdgid=pdgid, e=energy)
+
+The fields are only formatted if the message is emitted, and the call is
+skipped if the level is not enabled. Per-object log calls are put under
+"if __debug__:", and are removed by the compiler when python runs with -O.
+
+The log profiles set the logging and the printouts of the papas chain in
+the configs, see apply_profile:
+
+- default: the settings of the configs, PapasPFReconstructor at WARNING
+  level and the other analyzers at the default level of heppy, PapasSim
+  verbose output and the full history
+- debug: as default, with all the analyzers logging at DEBUG level
+- production: the analyzers log at WARNING level, no verbose output, and
+  the history is compact, see history.py. Run with python -O to also
+  compile out the per-object log calls.
+
+The level of the debug and production profiles is given to all the
+analyzers of the chain as log_level, and each heppy analyzer logs to its
+own logger at this level. This tool
+measures the throughput of the sequences of a detector config with each
+profile, on synthetic events, see benchmark.py::
+
+    python logs.py -n 200 CMS
+    python -O logs.py -n 200 CMS
+'''
+
+from __future__ import print_function
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+from contextlib import contextmanager
+
+# a log_level of None keeps the level set in the config
+PROFILES = dict(
+    default=dict(verbose=True, log_level=None, history='full'),
+    debug=dict(verbose=True, log_level=logging.DEBUG, history='full'),
+    production=dict(verbose=False, log_level=logging.WARNING, history='compact'),
+)
+
+
+def profile(name):
+    '''Returns the options of the log profile name.'''
+    if name not in PROFILES:
+        raise ValueError('log profile must be one of {}, not {}'.format(
+            sorted(PROFILES), name))
+    return PROFILES[name]
+
+
+def apply_profile(analyzers, name):
+    '''Sets the options of the log profile name on the cfg analyzers: the
+    log level of all of them, the verbose flag of those which have one,
+    and the mode of the HistoryMode analyzers.
+
+    The log level set in the config is kept as configured_log_level, and
+    restored by the profiles without log level, so that the profiles can
+    be applied in turn to the same analyzers.'''
+    options = profile(name)
+    for analyzer in analyzers:
+        if not hasattr(analyzer, 'configured_log_level'):
+            analyzer.configured_log_level = getattr(analyzer, 'log_level', None)
+        level = options['log_level']
+        if level is None:
+            level = analyzer.configured_log_level
+        if level is not None:
+            analyzer.log_level = level
+        elif hasattr(analyzer, 'log_level'):
+            del analyzer.log_level
+        if hasattr(analyzer, 'verbose'):
+            analyzer.verbose = options['verbose']
+        if getattr(analyzer.class_object, '__name__', None) == 'HistoryMode':
+            analyzer.mode = options['history']
+
+
+class Fields(object):
+    '''Structured message, formatted when converted to a string.'''
+
+    __slots__ = ('name', 'fields')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join([self.name] + ['{}={}'.format(key, self.fields[key])
+                                       for key in sorted(self.fields)])
+
+
+class StructuredLogger(object):
+    '''Wraps a logging.Logger to log structured messages.'''
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def log(self, level, name, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, Fields(name, fields))
+
+    def debug(self, name, **fields):
+        self.log(logging.DEBUG, name, **fields)
+
+    def info(self, name, **fields):
+        self.log(logging.INFO, name, **fields)
+
+    def warning(self, name, **fields):
+        self.log(logging.WARNING, name, **fields)
+
+
+
+@contextmanager
+def _stdout_to(path):
+    '''Redirects the standard output to path, for the verbose printouts
+    and the stream handlers of the heppy loggers.'''
+    stdout = sys.stdout
+    with open(path, 'w') as out:
+        sys.stdout = out
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+def benchmark(module_name, sequences=('papas', 'parametric'), nevents=200,
+              runs=3, workdir=None):
+    '''Returns a dictionary (sequence, profile) -> events per second of
+    the sequences of the config of the module with each log profile, the
+    best of runs runs on nevents synthetic events.
+
+    The analyzers are created in workdir, in a temporary directory by
+    default, and their standard output is written to a .stdout.txt file
+    next to the directory of the analyzers.
+    '''
+    import importlib
+    import numpy as np
+    from heppy.papas.detectors.FCCHiggsDetectors.benchmark import sequence_benchmark
+    config = importlib.import_module(
+        'heppy.papas.detectors.FCCHiggsDetectors.config.cfg_' + module_name)
+    temporary = workdir is None
+    if temporary:
+        workdir = tempfile.mkdtemp(prefix='papas_logs_')
+    results = dict()
+    try:
+        for sequence in sequences:
+            for name in sorted(PROFILES):
+                apply_profile(getattr(config, sequence + '_sequence'), name)
+                directory = os.path.join(workdir, '_'.join([module_name, sequence, name]))
+                with _stdout_to(directory + '.stdout.txt'):
+                    run = sequence_benchmark(module_name, sequence, nevents,
+                                             np.random.RandomState(0xdeadbeef),
+                                             directory)
+                    best = min(timeit.repeat(run, number=1, repeat=runs))
+                results[(sequence, name)] = nevents / max(best, 1e-12)
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] <detector module>')
+    parser.add_option('-n', '--nevents', type='int', default=200,
+                      help='number of events')
+    parser.add_option('-r', '--runs', type='int', default=3,
+                      help='number of runs, the best one is kept')
+    parser.add_option('-q', '--sequences', default='papas,parametric',
+                      help='comma-separated sequences of the config')
+    parser.add_option('-w', '--workdir', default=None,
+                      help='directory of the analyzers, kept after the runs')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('please provide a detector module')
+    if options.workdir and not os.path.isdir(options.workdir):
+        os.makedirs(options.workdir)
+    results = benchmark(args[0], options.sequences.split(','), options.nevents,
+                        options.runs, options.workdir)
+    print('python -O: {}'.format(not __debug__))
+    print('{:12} {:12} {:>10}'.format('sequence', 'profile', 'events/s'))
+    for (sequence, name), value in sorted(results.items()):
+        print('{:12} {:12} {:10.1f}'.format(sequence, name, value))
@@ -1,6 +1,10 @@
 #!/bin/sh
 
-for f in *.py; do
+# generates config/cfg_<detector>.py for each detector module,
+# from the papas configuration template config/papas_cfg.py
+template=${TEMPLATE:-config/papas_cfg.py}
+
+for f in $(grep -l '^class CMS(Detector)' *.py); do
     name=$(basename $f .py)
-    sed "s|from heppy.papas.detectors.CMS import CMS|from heppy.papas.detectors.FCCHiggsDetectors.$name import CMS|" <$HEPPY/test/papas_cfg.py > config/cfg_$f
-done
\ No newline at end of file
+    sed "s|from heppy.papas.detectors.CMS import CMS|from heppy.papas.detectors.FCCHiggsDetectors.$name import CMS|" <$template > config/cfg_$f
+done
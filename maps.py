@@ -0,0 +1,130 @@
+'''Precomputed efficiency and resolution maps.
+
+export_maps evaluates the efficiency and resolution methods of all
+detector elements on dense (pt or E, |eta|) grids, and saves them in a
+compressed numpy file together with the detector fingerprint::
+
+    python maps.py -o maps CMS CMS_2T CMS_2T_Tracker
+
+DetectorMaps serves interpolated values from such a file, so that fast
+analyses do not need to call the python parametrizations::
+
+    maps = DetectorMaps('maps/CMS.npz')
+    eff = maps('tracker_efficiency', pts, etas)
+'''
+
+from __future__ import print_function
+
+import importlib
+import os
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors.fingerprint import fingerprint
+from heppy.papas.detectors.FCCHiggsDetectors.probes import \
+    ProbeTrack, ProbeCluster, ProbeParticle
+
+# default grids, logarithmic in pt and energy
+PT_GRID = np.logspace(-1, np.log10(500.), 200)
+ENERGY_GRID = np.logspace(-1, np.log10(500.), 200)
+ETA_GRID = np.linspace(0., 5., 251)
+
+
+def _evaluate(func, xs, etas):
+    return np.array([[func(x, eta) for eta in etas] for x in xs])
+
+
+def compute_maps(detector, pts=PT_GRID, energies=ENERGY_GRID, etas=ETA_GRID):
+    '''Returns a dictionary name -> 2D array for detector.
+
+    Tracker and lepton maps are binned in (pt, eta), calorimeter maps
+    in (energy, eta).
+    '''
+    tracker = detector.elements['tracker']
+    ecal = detector.elements['ecal']
+    hcal = detector.elements['hcal']
+    maps = dict()
+    maps['tracker_efficiency'] = _evaluate(
+        lambda pt, eta: tracker.efficiency(ProbeTrack(pt, eta)), pts, etas)
+    maps['tracker_resolution'] = _evaluate(
+        lambda pt, eta: tracker.resolution(ProbeTrack(pt, eta)), pts, etas)
+    for name, calo in [('ecal', ecal), ('hcal', hcal)]:
+        maps[name + '_efficiency'] = _evaluate(
+            lambda e, eta: calo.efficiency(ProbeCluster(e, eta)), energies, etas)
+        maps[name + '_resolution'] = _evaluate(
+            calo.energy_resolution, energies, etas)
+        maps[name + '_response'] = _evaluate(
+            calo.energy_response, energies, etas)
+    for name, pdgid in [('electron', 11), ('muon', 13)]:
+        for quantity in ['efficiency', 'resolution']:
+            method = getattr(detector, '_'.join([name, quantity]))
+            maps['_'.join([name, quantity])] = _evaluate(
+                lambda pt, eta: method(ProbeParticle(pdgid, pt, eta)), pts, etas)
+    return maps
+
+
+def save_maps(path, detector, maps, pts=PT_GRID, energies=ENERGY_GRID,
+              etas=ETA_GRID):
+    '''Saves the maps to path, with the axes and the detector fingerprint.'''
+    np.savez_compressed(path, pt=pts, energy=energies, eta=etas,
+                        fingerprint=np.array(fingerprint(detector)),
+                        **maps)
+
+
+def export_maps(detector, path):
+    '''Computes and saves the maps of detector.'''
+    save_maps(path, detector, compute_maps(detector))
+
+
+def _interpolate(axis, values):
+    '''Returns the lower bin indices and the interpolation weights
+    of values on axis. Values outside the axis are clamped.'''
+    values = np.clip(values, axis[0], axis[-1])
+    index = np.clip(np.searchsorted(axis, values, side='right') - 1,
+                    0, len(axis) - 2)
+    weight = (values - axis[index]) / (axis[index + 1] - axis[index])
+    return index, weight
+
+
+class DetectorMaps(object):
+    '''Bilinear interpolation in the maps of a detector.'''
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.fingerprint = str(data['fingerprint'])
+            self.axes = dict(pt=data['pt'], energy=data['energy'])
+            self.etas = data['eta']
+            self.maps = dict((name, data[name]) for name in data.files
+                             if name not in ['pt', 'energy', 'eta', 'fingerprint'])
+
+    def check(self, detector):
+        '''Raises ValueError if the maps were not made for detector.'''
+        if fingerprint(detector) != self.fingerprint:
+            raise ValueError('maps do not match the detector')
+
+    def __call__(self, name, xs, etas):
+        '''Returns the values of map name at xs (pt or energy) and etas.'''
+        values = self.maps[name]
+        axis = self.axes['energy' if name.startswith(('ecal', 'hcal')) else 'pt']
+        ix, wx = _interpolate(axis, np.asarray(xs, dtype=float))
+        ie, we = _interpolate(self.etas, np.abs(np.asarray(etas, dtype=float)))
+        return ((1 - wx) * (1 - we) * values[ix, ie] +
+                wx * (1 - we) * values[ix + 1, ie] +
+                (1 - wx) * we * values[ix, ie + 1] +
+                wx * we * values[ix + 1, ie + 1])
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] <detector module> ...')
+    parser.add_option('-o', '--outdir', default='.',
+                      help='output directory')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('please provide at least one detector module, e.g. CMS')
+    for name in args:
+        module = importlib.import_module(
+            'heppy.papas.detectors.FCCHiggsDetectors.' + name)
+        path = os.path.join(options.outdir, name + '.npz')
+        export_maps(module.CMS(), path)
+        print('maps for {} written to {}'.format(name, path))
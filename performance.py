@@ -0,0 +1,186 @@
+'''Binned performance summaries of the detector variants.
+
+The DetectorPerformance analyzer matches each stable generated particle
+to the closest reconstructed particle of the same charge, and fills
+during the papas sequence, for each particle category of CATEGORIES:
+
+- the reconstruction efficiency vs |eta|
+- the running mean and width of the energy response E rec / E gen and
+  of the pt resolution (pt rec - pt gen) / pt gen, in bins of |eta|
+- the distribution of the energy response
+
+Only these summaries are saved, with the name of the detector module, in
+the analyzer directory. The summaries of the shards of a job are merged
+by shard.py, and this tool prints the summaries of several jobs, e.g. one
+per detector variant::
+
+    python performance.py Job_CMS/*DetectorPerformance* Job_CMS_2T/*DetectorPerformance*
+'''
+
+from __future__ import print_function
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import \
+    Efficiency, Histogram1D, Welford
+
+SUMMARY_FILE = 'performance.npz'
+
+CATEGORIES = ['electron', 'muon', 'photon', 'charged_hadron', 'neutral_hadron']
+
+ETA_BINS = (25, 0., 5.)
+RESPONSE_BINS = (100, 0., 2.)
+
+
+def categories(pdgids, charges):
+    '''Returns the index in CATEGORIES of each particle.'''
+    pdgids = np.abs(pdgids)
+    return np.select([pdgids == 11, pdgids == 13, pdgids == 22, charges != 0],
+                     [0, 1, 2, 3], 4)
+
+
+def match(gen, rec, max_dr):
+    '''Returns, for each generated particle, the index of the closest
+    reconstructed particle of the same charge within max_dr, or -1.
+
+    gen, rec: arrays of (eta, phi, charge) rows. Several generated
+    particles can be matched to the same reconstructed particle.
+    '''
+    matched = np.full(len(gen), -1, dtype=int)
+    if not len(gen) or not len(rec):
+        return matched
+    deta = gen[:, 0, np.newaxis] - rec[np.newaxis, :, 0]
+    dphi = gen[:, 1, np.newaxis] - rec[np.newaxis, :, 1]
+    dphi = (dphi + np.pi) % (2 * np.pi) - np.pi
+    dr2 = deta**2 + dphi**2
+    dr2[gen[:, 2, np.newaxis] != rec[np.newaxis, :, 2]] = np.inf
+    closest = np.argmin(dr2, axis=1)
+    found = dr2[np.arange(len(gen)), closest] < max_dr**2
+    matched[found] = closest[found]
+    return matched
+
+
+class PerformanceSummary(object):
+    '''Efficiency, response and resolution accumulators of a detector.'''
+
+    def __init__(self, detector=''):
+        self.detector = detector
+        self.efficiency = [Efficiency(*ETA_BINS) for category in CATEGORIES]
+        self.eta_edges = self.efficiency[0].edges
+        shape = (len(CATEGORIES), ETA_BINS[0])
+        self.response = Welford(shape)
+        self.resolution = Welford(shape)
+        self.response_hists = [Histogram1D(*RESPONSE_BINS) for category in CATEGORIES]
+
+    def fill(self, icategories, gen, rec):
+        '''Fills the generated particles and their matched reconstructed
+        particles.
+
+        icategories: category index of the generated particles.
+        gen, rec: arrays of (pt, |eta|, energy) rows, rec rows being nan
+          for the generated particles which are not matched.
+        '''
+        matched = ~np.isnan(rec[:, 0])
+        ieta = np.searchsorted(self.eta_edges, gen[:, 1], side='right') - 1
+        inside = matched & (ieta >= 0) & (ieta < ETA_BINS[0])
+        response = rec[:, 2] / gen[:, 2]
+        resolution = (rec[:, 0] - gen[:, 0]) / gen[:, 0]
+        index = (icategories[inside], ieta[inside])
+        self.response.fill(response[inside], index)
+        self.resolution.fill(resolution[inside], index)
+        for icategory, efficiency in enumerate(self.efficiency):
+            selected = icategories == icategory
+            if not selected.any():
+                continue
+            efficiency.fill(gen[selected, 1], matched[selected])
+            self.response_hists[icategory].fill(response[selected & matched])
+
+    def merge(self, other):
+        if other.detector != self.detector:
+            raise ValueError('cannot merge the summaries of {} and {}'.format(
+                self.detector, other.detector))
+        for mine, theirs in zip(self.efficiency, other.efficiency):
+            mine.merge(theirs)
+        self.response.merge(other.response)
+        self.resolution.merge(other.resolution)
+        for mine, theirs in zip(self.response_hists, other.response_hists):
+            mine.merge(theirs)
+        return self
+
+    def save(self, path):
+        arrays = dict(detector=self.detector, categories=CATEGORIES,
+                      response_edges=self.response_hists[0].edges)
+        for name in ['response', 'resolution']:
+            for key, value in getattr(self, name).arrays().items():
+                arrays['{}_{}'.format(name, key)] = value
+        for category, efficiency, hist in zip(CATEGORIES, self.efficiency,
+                                              self.response_hists):
+            for key, value in efficiency.arrays().items():
+                arrays['efficiency_{}_{}'.format(category, key)] = value
+            arrays['response_counts_{}'.format(category)] = hist.counts
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if list(data['categories']) != CATEGORIES:
+                raise ValueError('{}: unknown categories {}'.format(
+                    path, list(data['categories'])))
+            summary = cls(str(data['detector']))
+            for name in ['response', 'resolution']:
+                setattr(summary, name, Welford.from_arrays(
+                    *[data['{}_{}'.format(name, key)] for key in ['n', 'mean', 'm2']]))
+            summary.efficiency = [
+                Efficiency.from_arrays(*[data['efficiency_{}_{}'.format(category, key)]
+                                         for key in ['edges', 'passed', 'total']])
+                for category in CATEGORIES]
+            summary.eta_edges = summary.efficiency[0].edges
+            for category, hist in zip(CATEGORIES, summary.response_hists):
+                hist.edges = data['response_edges']
+                hist.counts = data['response_counts_{}'.format(category)]
+        return summary
+
+    def table(self, category):
+        '''Returns the rows (eta low, eta high, efficiency, mean response,
+        response width, pt resolution) of the category.'''
+        icategory = CATEGORIES.index(category)
+        efficiencies = self.efficiency[icategory].efficiencies()[1:-1]
+        return [(self.eta_edges[i], self.eta_edges[i + 1], efficiencies[i],
+                 self.response.mean[icategory, i], self.response.std()[icategory, i],
+                 self.resolution.std()[icategory, i])
+                for i in range(ETA_BINS[0])
+                if self.efficiency[icategory].total[i + 1]]
+
+
+def merge(paths, output):
+    '''Merges the summaries at paths, see shard.MERGERS.'''
+    merged = None
+    for path in paths:
+        summary = PerformanceSummary.load(path)
+        merged = summary if merged is None else merged.merge(summary)
+    merged.save(output)
+
+
+if __name__ == '__main__':
+    import os
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog <DetectorPerformance analyzer directory> ...')
+    parser.add_option('-c', '--category', default=None,
+                      help='only print this category, one of ' + ', '.join(CATEGORIES))
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('please provide analyzer directories')
+    for directory in args:
+        summary = PerformanceSummary.load(os.path.join(directory, SUMMARY_FILE))
+        for category in [options.category] if options.category else CATEGORIES:
+            rows = summary.table(category)
+            if not rows:
+                continue
+            icategory = CATEGORIES.index(category)
+            print('{} {}: median response {:.3f}'.format(
+                summary.detector, category,
+                summary.response_hists[icategory].quantile(0.5)))
+            print('  {:>5} {:>5} {:>10} {:>10} {:>10} {:>10}'.format(
+                'eta', '', 'efficiency', 'response', 'width', 'pt res'))
+            for row in rows:
+                print('  {:5.2f} {:5.2f} {:10.3f} {:10.3f} {:10.3f} {:10.4f}'.format(*row))
@@ -0,0 +1,86 @@
+'''Lightweight stand-ins for the papas particles, tracks and clusters.
+
+They provide the few methods used by the detector parametrizations, so
+that acceptances and resolutions can be evaluated for given kinematics
+without running the simulation, e.g. in parameter scans.
+'''
+
+import math
+
+
+class ProbeVector(object):
+    '''Direction and transverse magnitude, with the TVector3 methods
+    used by the detectors.'''
+
+    def __init__(self, pt, eta, phi=0.):
+        self._pt = pt
+        self._eta = eta
+        self._phi = phi
+
+    def Pt(self):
+        return self._pt
+
+    def Eta(self):
+        return self._eta
+
+    def Phi(self):
+        return self._phi
+
+    def Theta(self):
+        return 2 * math.atan(math.exp(-self._eta))
+
+    def Mag(self):
+        return self._pt * math.cosh(self._eta)
+
+
+def _theta(eta):
+    '''papas theta, equal to zero at eta=0.'''
+    return math.pi / 2. - 2 * math.atan(math.exp(-eta))
+
+
+class ProbeParticle(object):
+
+    def __init__(self, pdgid, pt, eta, phi=0., e=None):
+        self._pdgid = pdgid
+        self._pt = pt
+        self._eta = eta
+        self._phi = phi
+        self._e = pt * math.cosh(eta) if e is None else e
+
+    def pdgid(self):
+        return self._pdgid
+
+    def pt(self):
+        return self._pt
+
+    def eta(self):
+        return self._eta
+
+    def phi(self):
+        return self._phi
+
+    def e(self):
+        return self._e
+
+    def theta(self):
+        return _theta(self._eta)
+
+
+class ProbeTrack(object):
+
+    def __init__(self, pt, eta, phi=0.):
+        self._p3 = ProbeVector(pt, eta, phi)
+
+    def p3(self):
+        return self._p3
+
+    def theta(self):
+        return _theta(self._p3.Eta())
+
+
+class ProbeCluster(object):
+
+    def __init__(self, energy, eta, phi=0.):
+        self.energy = energy
+        self.pt = energy / math.cosh(eta)
+        self.position = ProbeVector(1., eta, phi)
@@ -0,0 +1,159 @@
+'''cProfile capture for one analyzer of a sequence.
+
+In a config::
+
+    from heppy.papas.detectors.FCCHiggsDetectors.profiling import profile
+    profile(pfreconstruct, first=100, last=200)
+    # or, to keep the 10 slowest events:
+    profile(pfreconstruct, slowest=10)
+
+The process method of the analyzer runs under cProfile for the events
+iEv in [first, last), or for all events keeping the profiles of the
+slowest ones. At the end of the loop, the analyzer directory contains:
+
+- profile.pstats: the merged profile, for pstats or snakeviz
+- profile.collapsed: collapsed stacks, for flamegraph.pl, speedscope...
+  The stacks are rebuilt from the caller-callee graph of the profile,
+  which splits the time of a function among its callers.
+- profile_top.txt: the top functions by cumulative time, restricted
+  to the modules of this package.
+'''
+
+import cProfile
+import heapq
+import os
+import pstats
+import timeit
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+PACKAGE = 'FCCHiggsDetectors'
+
+
+def _label(func):
+    filename, lineno, name = func
+    return '{}:{}({})'.format(os.path.basename(filename), lineno, name)
+
+
+def collapsed_stacks(stats, max_depth=100):
+    '''Returns the list of (stack, microseconds) of a pstats.Stats.'''
+    callees = dict()
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            # edge is (cc, nc, tt, ct) in python 3, a call count in python 2
+            edge_time = edge[3] if isinstance(edge, tuple) else ct * edge / max(nc, 1)
+            callees.setdefault(caller, []).append((func, edge_time))
+    result = dict()
+
+    def visit(func, stack, time):
+        cc, nc, tt, ct, callers = stats.stats[func]
+        if ct <= 0. or time <= 0.:
+            return
+        stack = stack + (_label(func),)
+        fraction = time / ct
+        result[stack] = result.get(stack, 0.) + tt * fraction
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_time in callees.get(func, []):
+            if _label(callee) not in stack:
+                visit(callee, stack, edge_time * fraction)
+
+    for root in sorted(roots):
+        visit(root, (), stats.stats[root][3])
+    return [(';'.join(stack), int(round(time * 1e6)))
+            for stack, time in sorted(result.items()) if time * 1e6 >= 0.5]
+
+
+class Profiled(object):
+    '''Replaces the class of an analyzer configuration, and runs its
+    process method under cProfile for the selected events.'''
+
+    def __init__(self, class_object, first=None, last=None, slowest=None,
+                 top=30):
+        self.class_object = class_object
+        self.first = first
+        self.last = last
+        self.slowest = slowest
+        self.top = top
+        self.__module__ = class_object.__module__
+        self.__name__ = class_object.__name__
+
+    def selected(self, event):
+        '''Returns True if event is in the selected event range.'''
+        iev = getattr(event, 'iEv', 0)
+        if self.first is not None and iev < self.first:
+            return False
+        if self.last is not None and iev >= self.last:
+            return False
+        return True
+
+    def __call__(self, *args, **kwargs):
+        analyzer = self.class_object(*args, **kwargs)
+        process = analyzer.process
+        end_loop = analyzer.endLoop
+        # (wall time, iEv, profile), a min-heap in slowest mode
+        profiles = []
+
+        def profiled_process(event):
+            if not self.selected(event):
+                return process(event)
+            profiler = cProfile.Profile()
+            start = timeit.default_timer()
+            result = profiler.runcall(process, event)
+            item = (timeit.default_timer() - start, getattr(event, 'iEv', 0), profiler)
+            if self.slowest:
+                if len(profiles) < self.slowest:
+                    heapq.heappush(profiles, item)
+                else:
+                    heapq.heappushpop(profiles, item)
+            else:
+                profiles.append(item)
+            return result
+
+        def profiled_end_loop(setup):
+            end_loop(setup)
+            self.write(analyzer.dirName, profiles)
+
+        analyzer.process = profiled_process
+        analyzer.endLoop = profiled_end_loop
+        return analyzer
+
+    def write(self, directory, profiles):
+        if not profiles:
+            return
+        # the profiles do not compare, sort on time and event number only
+        profiles = sorted(profiles, key=lambda item: item[:2], reverse=True)
+        stats = pstats.Stats(profiles[0][2])
+        for item in profiles[1:]:
+            stats.add(item[2])
+        stats.dump_stats(os.path.join(directory, 'profile.pstats'))
+        with open(os.path.join(directory, 'profile.collapsed'), 'w') as out:
+            for stack, time in collapsed_stacks(stats):
+                out.write('{} {}\n'.format(stack, time))
+        stream = StringIO()
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(PACKAGE, self.top)
+        with open(os.path.join(directory, 'profile_top.txt'), 'w') as out:
+            out.write('profiled events (iEv, wall time in s):\n')
+            for wall, iev, profiler in profiles:
+                out.write('  {} {:.4f}\n'.format(iev, wall))
+            out.write(stream.getvalue())
+
+
+def profile(cfg_ana, first=None, last=None, slowest=None, top=30):
+    '''Turns on profiling for the analyzer configuration cfg_ana.
+
+    first, last: range of iEv to profile, all events by default.
+    slowest: if set, only the profiles of the slowest events are kept.
+    top: number of functions in the top report.
+    Returns cfg_ana.
+    '''
+    cfg_ana.class_object = Profiled(cfg_ana.class_object, first, last,
+                                    slowest, top)
+    return cfg_ana
@@ -0,0 +1,268 @@
+'''Detector parameter scans.
+
+Sweeps a grid of detector parameters (see factory.py) in a process pool.
+The input sample of generated particles is a .npy file memory-mapped by
+all workers, see save_sample. For each grid point, the sample is
+propagated through the geometry of the detector, see propagate, and the
+detector efficiencies and resolutions are evaluated at the calorimeter
+impact points, with the deposited energies. The metrics are written as
+one line of a tab-separated summary table::
+
+    python scan.py sample.npy scan.txt -g field=2,3.8 -g ecal_depth=0.2,0.25,0.3
+'''
+
+from __future__ import print_function
+
+import itertools
+import math
+from multiprocessing import Pool
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors.factory import make_detector
+from heppy.papas.detectors.FCCHiggsDetectors.probes import ProbeTrack, ProbeCluster
+
+SAMPLE_DTYPE = [('pdgid', 'i4'), ('pt', 'f8'), ('eta', 'f8'),
+                ('phi', 'f8'), ('e', 'f8')]
+
+CHARGED_HADRONS = set([211, 321, 2212])
+NEUTRAL_HADRONS = set([130, 310, 2112])
+
+METRICS = ['tracker_efficiency', 'tracker_resolution',
+           'ecal_efficiency', 'ecal_resolution', 'ecal_containment',
+           'hcal_efficiency', 'hcal_resolution', 'hcal_charged_efficiency']
+
+# critical energy of the ECAL material in GeV (PbWO4), and the
+# longitudinal shower profile parameter b, PDG review 34.5
+ECAL_CRITICAL_ENERGY = 9.6e-3
+SHOWER_B = 0.5
+
+# mean fraction of the energy of a hadron interacting in the ECAL deposited
+# in the ECAL, the papas simulation drawing it uniformly in [0, 0.7]
+ECAL_FRACTION = 0.35
+
+
+def save_sample(path, pdgid, pt, eta, phi, e):
+    '''Saves the particle kinematics arrays to a .npy file.'''
+    sample = np.empty(len(pdgid), dtype=SAMPLE_DTYPE)
+    sample['pdgid'] = pdgid
+    sample['pt'] = pt
+    sample['eta'] = eta
+    sample['phi'] = phi
+    sample['e'] = e
+    np.save(path, sample)
+
+
+def grid(axes):
+    '''Returns the list of parameter dictionaries for all combinations
+    of the values in axes, a dictionary parameter name -> list of values.'''
+    names = sorted(axes)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[axes[name] for name in names])]
+
+
+def _mean(values):
+    if not values:
+        return float('nan')
+    return sum(values) / float(len(values))
+
+
+def _weighted_mean(pairs):
+    if not pairs:
+        return float('nan')
+    return sum(w * x for w, x in pairs) / sum(w for w, x in pairs)
+
+
+def _distance(surface, theta):
+    '''Returns the distance from the origin to the closed cylinder surface
+    along a straight line of polar angle theta.'''
+    sin, cos = math.sin(theta), abs(math.cos(theta))
+    return min(surface.rad / sin if sin else float('inf'),
+               surface.z / cos if cos else float('inf'))
+
+
+def path_length(volume, eta):
+    '''Returns the length of the straight line from the origin at eta
+    inside volume, between its inner and outer surfaces.'''
+    theta = 2 * math.atan(math.exp(-eta))
+    return _distance(volume.outer, theta) - _distance(volume.inner, theta)
+
+
+def impact_eta(surface, pt, eta, field):
+    '''Returns the pseudo-rapidity of the position where a particle of
+    unit charge, produced at the origin with pt and eta, reaches the
+    closed cylinder surface in the field (T), or None if it never does.
+    The particle is neutral if field is 0.'''
+    if not field:
+        return eta
+    # radius of the helix in the transverse plane, in m
+    radius = pt / (0.3 * field)
+    if 2 * radius >= surface.rad:
+        arc = 2 * radius * math.asin(surface.rad / (2 * radius))
+        z = arc * math.sinh(eta)
+        if abs(z) <= surface.z:
+            return math.asinh(z / surface.rad)
+    if not eta:
+        # looping in the transverse plane
+        return None
+    arc = surface.z / abs(math.sinh(eta))
+    rho = 2 * radius * abs(math.sin(arc / (2 * radius)))
+    if not rho:
+        return math.copysign(float('inf'), eta)
+    return math.copysign(math.asinh(surface.z / rho), eta)
+
+
+def _gamma_p(a, x):
+    '''Returns the regularized lower incomplete gamma function P(a, x).'''
+    if x <= 0.:
+        return 0.
+    term = total = 1. / a
+    n = 0
+    while term > total * 1e-12:
+        n += 1
+        term *= x / (a + n)
+        total += term
+    return min(1., total * math.exp(-x + a * math.log(x) - math.lgamma(a)))
+
+
+def containment(energy, depth):
+    '''Returns the fraction of the energy of a photon shower contained in
+    depth radiation lengths, for the gamma longitudinal profile.'''
+    tmax = max(math.log(energy / ECAL_CRITICAL_ENERGY) + 0.5, 0.)
+    return _gamma_p(SHOWER_B * tmax + 1., SHOWER_B * depth)
+
+
+def propagate(detector, pdgid, pt, eta, e):
+    '''Returns the list of (element name, deposited energy, impact eta,
+    probability) of a particle in the detector.
+
+    Photons deposit the contained fraction of their energy in the ECAL,
+    see containment. Hadrons interact in the ECAL with the probability
+    given by its thickness along their path in interaction lengths, and
+    then leave ECAL_FRACTION of their energy in it, the rest going to the
+    HCAL. Charged particles follow a helix in the field, and the position
+    where they reach the HCAL gives the impact eta.
+    '''
+    ecal = detector.elements['ecal']
+    hcal = detector.elements['hcal']
+    if pdgid == 22:
+        depth = path_length(ecal.volume, eta) / ecal.material.x0
+        return [('ecal', e * containment(e, depth), eta, 1.)]
+    field = detector.elements['field'].magnitude if pdgid in CHARGED_HADRONS else 0.
+    position = impact_eta(hcal.volume.inner, pt, eta, field)
+    if position is None:
+        return []
+    # path length of the straight line at the impact eta
+    interaction = 1. - math.exp(-path_length(ecal.volume, position) /
+                                ecal.material.lambdaI)
+    return [('ecal', e * ECAL_FRACTION, position, interaction),
+            ('hcal', e * (1 - ECAL_FRACTION), position, interaction),
+            ('hcal', e, position, 1. - interaction)]
+
+
+def metrics(detector, sample):
+    '''Returns the dictionary of METRICS for detector on the sample.
+
+    The efficiencies are the mean efficiencies for charged hadrons (tracker
+    and HCAL), photons (ECAL) and neutral hadrons (HCAL), at the deposited
+    energies and impact points given by propagate. The resolutions are the
+    mean relative resolutions, weighted by the efficiencies, and the ECAL
+    containment is the mean contained fraction of the photon energies.
+    '''
+    tracker = detector.elements['tracker']
+    ecal = detector.elements['ecal']
+    hcal = detector.elements['hcal']
+    seen = dict((name, []) for name in METRICS)
+    for pdgid, pt, eta, phi, e in sample:
+        pdgid = abs(int(pdgid))
+        if pdgid in CHARGED_HADRONS:
+            track = ProbeTrack(pt, eta, phi)
+            eff = tracker.efficiency(track)
+            seen['tracker_efficiency'].append(eff)
+            if eff:
+                seen['tracker_resolution'].append((eff, tracker.resolution(track)))
+            seen['hcal_charged_efficiency'].append(sum(
+                probability * hcal.efficiency(ProbeCluster(energy, position, phi))
+                for name, energy, position, probability
+                in propagate(detector, pdgid, pt, eta, e) if name == 'hcal'))
+        elif pdgid == 22:
+            for name, energy, position, probability in propagate(
+                    detector, pdgid, pt, eta, e):
+                seen['ecal_containment'].append(energy / e)
+                eff = ecal.efficiency(ProbeCluster(energy, position, phi))
+                seen['ecal_efficiency'].append(eff)
+                if eff:
+                    seen['ecal_resolution'].append(
+                        (eff, ecal.energy_resolution(energy, position)))
+        elif pdgid in NEUTRAL_HADRONS:
+            eff = 0.
+            for name, energy, position, probability in propagate(
+                    detector, pdgid, pt, eta, e):
+                if name != 'hcal':
+                    continue
+                weight = probability * hcal.efficiency(
+                    ProbeCluster(energy, position, phi))
+                eff += weight
+                if weight:
+                    seen['hcal_resolution'].append(
+                        (weight, hcal.energy_resolution(energy, position)))
+            seen['hcal_efficiency'].append(eff)
+    result = dict()
+    for name in METRICS:
+        if name.endswith('resolution'):
+            result[name] = _weighted_mean(seen[name])
+        else:
+            result[name] = _mean(seen[name])
+    return result
+
+
+def _evaluate(args):
+    params, path = args
+    # each worker maps the same file, the pages are shared by the OS
+    sample = np.load(path, mmap_mode='r')
+    return metrics(make_detector(params), sample)
+
+
+def scan(points, path, nprocs=None):
+    '''Returns the list of metrics dictionaries for the list of parameter
+    dictionaries points, evaluated on the sample in the .npy file path.'''
+    pool = Pool(nprocs)
+    try:
+        return pool.map(_evaluate, [(params, path) for params in points])
+    finally:
+        pool.close()
+        pool.join()
+
+
+def write_table(path, points, results):
+    '''Writes the tab-separated summary table, one line per grid point.'''
+    names = sorted(set(itertools.chain(*points)))
+    with open(path, 'w') as out:
+        out.write('\t'.join(names + METRICS) + '\n')
+        for params, result in zip(points, results):
+            fields = [str(params.get(name, '')) for name in names]
+            fields += ['{:.6g}'.format(result[name]) for name in METRICS]
+            out.write('\t'.join(fields) + '\n')
+
+
+def _parse_axis(text):
+    name, values = text.split('=')
+    if name == 'base':
+        return name, values.split(',')
+    return name, [float(value) for value in values.split(',')]
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] <sample.npy> <table.txt>')
+    parser.add_option('-g', '--grid', action='append', default=[],
+                      help='parameter values, e.g. field=2,3.8. can be repeated.')
+    parser.add_option('-j', '--nprocs', type='int', default=None,
+                      help='number of processes, default: number of cpus')
+    options, args = parser.parse_args()
+    if len(args) != 2:
+        parser.error('please provide the input sample and the output table')
+    points = grid(dict(_parse_axis(text) for text in options.grid))
+    results = scan(points, args[0], options.nprocs)
+    write_table(args[1], points, results)
+    print('{} grid points written to {}'.format(len(points), args[1]))
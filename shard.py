@@ -0,0 +1,330 @@
+'''Event-range sharding of heppy jobs, and merging of their outputs.
+
+A sample of nevents events is split in shards of consecutive events,
+sized to last about the target duration given the throughput of the
+job, in events per second. The throughput is given, or measured on a
+short pilot job. The shards are run locally in parallel, each by a heppy
+Looper over its event range, or written as job descriptions for a
+batch system::
+
+    python shard.py plan config/analysis_cfg.py -N 1000000 -t 3600 --pilot 500 \\
+        -d CMS_2T --files zh_1.root,zh_2.root -w work -j 8
+    python shard.py plan config/analysis_cfg.py -N 1000000 -r 150 -w work --emit jobs.json
+    python shard.py merge work --output work/merged
+
+The config is a heppy analysis config defining config, as given to
+heppy_loop.py, e.g. config/analysis_cfg.py. The detector, the input files
+and the seed are passed to it as the heppy options detector, files and
+seed, as with heppy_loop.py -o. With the seed option, analysis_cfg.py
+reseeds the random generators at each event, see analyzers/EventSeed.py,
+so that the merged output is the one of a single job with the same seed.
+
+The plan removes the shard and pilot directories left in the work
+directory by a previous plan, and records the shards in SHARDS_FILE.
+The merge walks the output directory of the first shard of the plan,
+and merges into the output directory:
+
+- the columnar files, see columnar.py, re-chunked as in a single job
+- the accumulators listed in MERGERS, e.g. calorimeter and jet responses,
+  performance summaries, gen-level veto counts
+- the ROOT files, e.g. of the tree producers, with hadd. They are not
+  merged, and reported as such, if hadd is not available.
+
+The other files, e.g. the heppy logs and counters, are not merged.
+Histogram counts merge exactly, while the moments of Welford
+accumulators can differ by rounding.
+'''
+
+from __future__ import print_function
+
+import json
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+from heppy.papas.detectors.FCCHiggsDetectors import columnar, performance, veto
+from heppy.papas.detectors.FCCHiggsDetectors.calo_fit import \
+    RESPONSE_FILE as CALO_RESPONSE_FILE
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Welford
+from heppy.papas.detectors.FCCHiggsDetectors.jec_calibration import \
+    RESPONSE_FILE as JET_RESPONSE_FILE, ResponseAccumulator
+
+
+def _merge_welford(paths, output):
+    merged, extra = None, dict()
+    for path in paths:
+        with np.load(path) as data:
+            acc = Welford.from_arrays(data['n'], data['mean'], data['m2'])
+            extra = dict((name, data[name]) for name in data.files
+                         if name not in ('n', 'mean', 'm2'))
+        merged = acc if merged is None else merged.merge(acc)
+    arrays = merged.arrays()
+    arrays.update(extra)
+    np.savez(output, **arrays)
+
+
+def _merge_jet_response(paths, output):
+    merged = None
+    for path in paths:
+        acc = ResponseAccumulator.load(path)
+        merged = acc if merged is None else merged.merge(acc)
+    merged.save(output)
+
+
+SHARDS_FILE = 'shards.json'
+
+DEFAULT_SEED = 0xdeadbeef
+
+# file name -> function(paths, output) merging the files of the shards
+MERGERS = {
+    CALO_RESPONSE_FILE: _merge_welford,
+    JET_RESPONSE_FILE: _merge_jet_response,
+    performance.SUMMARY_FILE: performance.merge,
+    veto.VETO_FILE: veto.merge,
+}
+
+
+def shards(nevents, rate, duration):
+    '''Returns the list of (first event, number of events) of the shards
+    of a sample of nevents events, for a throughput rate in events/s and
+    a target duration in s.'''
+    size = max(int(rate * duration), 1)
+    nshards = int(math.ceil(nevents / float(size)))
+    # equal shards, the first ones one event longer
+    base, extra = divmod(nevents, nshards)
+    result, first = [], 0
+    for i in range(nshards):
+        n = base + (1 if i < extra else 0)
+        result.append((first, n))
+        first += n
+    return result
+
+
+def _load_config(path):
+    try:
+        import imp
+        return imp.load_source('cfg', path).config
+    except ImportError:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location('cfg', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.config
+
+
+def run_shard(cfg_path, outdir, first, nevents, options):
+    '''Runs the config over nevents events from first, in outdir.
+
+    options: dictionary of heppy options.
+    Returns the duration of the job in s.
+    '''
+    from heppy.framework.heppy_loop import setHeppyOption
+    from heppy.framework.looper import Looper
+    for name, value in options.items():
+        setHeppyOption(name, value)
+    start = timeit.default_timer()
+    looper = Looper(outdir, _load_config(cfg_path), nEvents=nevents,
+                    firstEvent=first, nPrint=0)
+    looper.loop()
+    looper.write()
+    return timeit.default_timer() - start
+
+
+def _run_shard(args):
+    return run_shard(*args)
+
+
+def _options(detector, files, seed):
+    options = dict(seed=str(seed))
+    if detector:
+        options['detector'] = detector
+    if files:
+        options['files'] = files
+    return options
+
+
+def measure_rate(cfg_path, workdir, nevents, options):
+    '''Runs a pilot job of nevents events, and returns the throughput
+    in events/s.'''
+    pool = multiprocessing.Pool(1)
+    try:
+        duration = pool.apply(run_shard, (cfg_path, os.path.join(workdir, 'pilot'),
+                                          0, nevents, options))
+    finally:
+        pool.close()
+        pool.join()
+    return nevents / duration
+
+
+def shard_dir(workdir, index):
+    return os.path.join(workdir, 'shard_{:05d}'.format(index))
+
+
+def prepare(workdir, ranges, options):
+    '''Removes the pilot and shard directories of a previous plan from
+    workdir, and records the shards of the new plan in SHARDS_FILE.'''
+    if os.path.isdir(workdir):
+        for name in os.listdir(workdir):
+            if name == 'pilot' or re.match(r'shard_\d{5}$', name):
+                shutil.rmtree(os.path.join(workdir, name))
+    else:
+        os.makedirs(workdir)
+    with open(os.path.join(workdir, SHARDS_FILE), 'w') as out:
+        json.dump(dict(ranges=ranges, options=options), out, indent=2,
+                  sort_keys=True)
+
+
+def _merge_root(paths, output):
+    subprocess.check_call(['hadd', '-f', output] + paths,
+                          stdout=subprocess.PIPE)
+
+
+def jobs(cfg_path, workdir, ranges, options):
+    '''Returns the job descriptions of the shards.'''
+    result = []
+    for index, (first, nevents) in enumerate(ranges):
+        outdir = shard_dir(workdir, index)
+        command = [sys.executable, '-m', 'heppy.papas.detectors.FCCHiggsDetectors.shard',
+                   'run', os.path.abspath(cfg_path), os.path.abspath(outdir),
+                   '--first', str(first), '-N', str(nevents)]
+        for name, value in sorted(options.items()):
+            command.extend(['-o', '{}={}'.format(name, value)])
+        result.append(dict(shard=index, first=first, nevents=nevents,
+                           config=os.path.abspath(cfg_path),
+                           outdir=os.path.abspath(outdir), options=options,
+                           command=command))
+    return result
+
+
+def run_local(cfg_path, workdir, ranges, options, nprocesses):
+    '''Runs the shards in parallel processes, one process per shard.'''
+    pool = multiprocessing.Pool(nprocesses, maxtasksperchild=1)
+    try:
+        durations = pool.map(_run_shard, [
+            (cfg_path, shard_dir(workdir, index), first, nevents, options)
+            for index, (first, nevents) in enumerate(ranges)
+        ], chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return durations
+
+
+def merge(workdir, output):
+    '''Merges the outputs of the shards of the plan of workdir into output.
+    Returns the list of the merged relative paths, and the list of the
+    ROOT files which could not be merged, hadd not being available.'''
+    with open(os.path.join(workdir, SHARDS_FILE)) as infile:
+        nshards = len(json.load(infile)['ranges'])
+    shard_dirs = [shard_dir(workdir, index) for index in range(nshards)]
+    missing = [directory for directory in shard_dirs if not os.path.isdir(directory)]
+    if missing:
+        raise ValueError('missing shards: ' + ', '.join(missing))
+    merged, skipped = [], []
+    for dirpath, dirnames, filenames in sorted(os.walk(shard_dirs[0])):
+        relative = os.path.relpath(dirpath, shard_dirs[0])
+        sources = [os.path.join(directory, relative) for directory in shard_dirs]
+        if columnar.MANIFEST in filenames:
+            columnar.merge(sources, os.path.join(output, relative))
+            merged.append(relative)
+            dirnames[:] = []
+            continue
+        for filename in sorted(filenames):
+            if filename in MERGERS:
+                merger = MERGERS[filename]
+            elif filename.endswith('.root'):
+                merger = _merge_root
+            else:
+                continue
+            target = os.path.join(output, relative)
+            if not os.path.isdir(target):
+                os.makedirs(target)
+            try:
+                merger([os.path.join(source, filename) for source in sources],
+                       os.path.join(target, filename))
+            except OSError:
+                # hadd not found
+                skipped.append(os.path.normpath(os.path.join(relative, filename)))
+                continue
+            merged.append(os.path.normpath(os.path.join(relative, filename)))
+    return merged, skipped
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='''%prog plan <config> [options]
+       %prog run <config> <outdir> --first <first> -N <nevents> [-o name=value]
+       %prog merge <workdir> --output <output>''')
+    parser.add_option('-N', '--nevents', type='int', default=None,
+                      help='number of events of the sample, or of the shard')
+    parser.add_option('--first', type='int', default=0,
+                      help='run: first event of the shard')
+    parser.add_option('-r', '--rate', type='float', default=None,
+                      help='plan: throughput in events/s')
+    parser.add_option('--pilot', type='int', default=200,
+                      help='plan: number of events of the pilot job measuring '
+                      'the throughput, if the rate is not given')
+    parser.add_option('-t', '--duration', type='float', default=3600.,
+                      help='plan: target duration of the shards in s')
+    parser.add_option('-d', '--detector', default=None,
+                      help='plan: detector module, passed as the heppy option detector')
+    parser.add_option('--files', default=None,
+                      help='plan: comma-separated input files, passed as the '
+                      'heppy option files')
+    parser.add_option('-s', '--seed', type='int', default=DEFAULT_SEED,
+                      help='plan: seed of the sample, passed as the heppy option seed')
+    parser.add_option('-w', '--workdir', default='shards',
+                      help='plan: directory of the shard outputs')
+    parser.add_option('-j', '--jobs', type='int', default=multiprocessing.cpu_count(),
+                      help='plan: number of parallel local jobs')
+    parser.add_option('--emit', default=None,
+                      help='plan: write the job descriptions to this JSON file '
+                      'instead of running the shards')
+    parser.add_option('-o', '--option', dest='options', action='append', default=[],
+                      help='heppy option name=value, e.g. sequence=parametric. '
+                      'plan: passed to the shards')
+    parser.add_option('--output', default=None,
+                      help='merge: output directory')
+    opts, args = parser.parse_args()
+    if not args or args[0] not in ('plan', 'run', 'merge'):
+        parser.error('please give the command, plan, run or merge')
+    command, args = args[0], args[1:]
+    if command == 'run':
+        if len(args) != 2 or opts.nevents is None:
+            parser.error('run: please give the config, the output directory and -N')
+        options = dict(option.split('=', 1) for option in opts.options)
+        run_shard(args[0], args[1], opts.first, opts.nevents, options)
+    elif command == 'merge':
+        if len(args) != 1 or not opts.output:
+            parser.error('merge: please give the work directory and --output')
+        merged, skipped = merge(args[0], opts.output)
+        for relative in merged:
+            print('merged', relative)
+        for relative in skipped:
+            print('NOT merged, hadd not found:', relative)
+    else:
+        if len(args) != 1 or opts.nevents is None:
+            parser.error('plan: please give the config and -N')
+        options = _options(opts.detector, opts.files, opts.seed)
+        options.update(option.split('=', 1) for option in opts.options)
+        rate = opts.rate
+        if rate is None:
+            prepare(opts.workdir, [], options)
+            rate = measure_rate(args[0], opts.workdir, opts.pilot, options)
+            print('measured throughput: {:.1f} events/s'.format(rate))
+        ranges = shards(opts.nevents, rate, opts.duration)
+        prepare(opts.workdir, ranges, options)
+        print('{} shards of about {} events'.format(len(ranges), ranges[0][1]))
+        if opts.emit:
+            with open(opts.emit, 'w') as out:
+                json.dump(jobs(args[0], opts.workdir, ranges, options), out,
+                          indent=2, sort_keys=True)
+        else:
+            run_local(args[0], opts.workdir, ranges, options, opts.jobs)
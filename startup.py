@@ -0,0 +1,134 @@
+'''Startup time of the papas configurations.
+
+Each measurement imports the configuration in a fresh python interpreter,
+as a batch job does. For example, to compare the lazy display analyzers
+with an eager import of PapasDisplay::
+
+    python startup.py -n 10 -e heppy.analyzers.PapasDisplay \\
+        heppy.papas.detectors.FCCHiggsDetectors.config.cfg_CMS
+
+With --budget, the total import cost of the configuration is taken from
+python -X importtime (python >= 3.7), and the script fails if it exceeds
+the budget::
+
+    python startup.py -b 0.5 heppy.papas.detectors.FCCHiggsDetectors.config.cfg_CMS
+'''
+
+from __future__ import print_function
+
+import subprocess
+import sys
+import timeit
+
+_SNIPPET = '''
+import timeit
+start = timeit.default_timer()
+{imports}
+print(timeit.default_timer() - start)
+'''
+
+
+def import_time(modules):
+    '''Returns the time in seconds taken to import modules
+    in a fresh interpreter.'''
+    imports = '\n'.join('import ' + module for module in modules)
+    output = subprocess.check_output(
+        [sys.executable, '-c', _SNIPPET.format(imports=imports)]
+    )
+    return float(output.decode().split()[-1])
+
+
+def _importtime(code):
+    '''Returns the list of (cumulative time in s, module, top level) of
+    the imports of python -X importtime -c code.'''
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    _, err = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError('cannot run {}:\n{}'.format(code, err.decode()))
+    imports = []
+    for line in err.decode().splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # header line
+            continue
+        # top level imports are not indented
+        imports.append((cumulative * 1e-6, fields[2].strip(),
+                        not fields[2].startswith('  ')))
+    return imports
+
+
+def importtime(module):
+    '''Returns the import cost of module in seconds as measured by
+    python -X importtime, and the list of (cumulative time, module)
+    for the modules it imports, sorted by decreasing time.
+
+    The modules imported by the bare interpreter at startup (site,
+    encodings...) are measured in a separate run, and not counted.'''
+    baseline = set(name for cumulative, name, top in _importtime('pass'))
+    total = 0.
+    imported = []
+    for cumulative, name, top in _importtime('import ' + module):
+        if name in baseline:
+            continue
+        imported.append((cumulative, name))
+        if top:
+            total += cumulative
+    imported.sort(reverse=True)
+    return total, imported
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    return (values[(n - 1) // 2] + values[n // 2]) / 2.
+
+
+def benchmark(config, eager=None, ntries=5):
+    '''Returns the median import time of the config module, and of the
+    config module together with the eager modules if any.'''
+    lazy = median([import_time([config]) for i in range(ntries)])
+    if not eager:
+        return lazy, None
+    full = median([import_time(eager + [config]) for i in range(ntries)])
+    return lazy, full
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options] <config module>')
+    parser.add_option('-n', '--ntries', type='int', default=5,
+                      help='number of measurements')
+    parser.add_option('-e', '--eager', action='append', default=[],
+                      help='module to import in addition, to measure '
+                      'the cost of an eager import. can be repeated.')
+    parser.add_option('-b', '--budget', type='float', default=None,
+                      help='maximum import cost in seconds, '
+                      'measured with python -X importtime')
+    parser.add_option('-t', '--top', type='int', default=10,
+                      help='number of most expensive imports to print '
+                      'with --budget')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('please provide a config module')
+    if options.budget is not None:
+        total, imported = importtime(args[0])
+        for cumulative, name in imported[:options.top]:
+            print('{:8.3f} s  {}'.format(cumulative, name))
+        print('{}: {:.3f} s, budget {:.3f} s'.format(args[0], total,
+                                                   options.budget))
+        if total > options.budget:
+            print('import time budget exceeded')
+            sys.exit(1)
+        sys.exit(0)
+    lazy, full = benchmark(args[0], options.eager, options.ntries)
+    print('{}: {:.3f} s'.format(args[0], lazy))
+    if full is not None:
+        print('with {}: {:.3f} s'.format(', '.join(options.eager), full))
+        print('saving per job: {:.3f} s'.format(full - lazy))
@@ -0,0 +1,95 @@
+import pytest
+
+acceptance = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.acceptance')
+
+from heppy.papas.detectors.FCCHiggsDetectors.probes import ProbeTrack
+
+
+class Obj(object):
+
+    def __init__(self, weight=None):
+        if weight is not None:
+            self.acceptance_weight = weight
+
+
+class Cfg(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+@pytest.fixture
+def weight_mode():
+    acceptance.set_mode('weight')
+    yield
+    acceptance.set_mode('random')
+
+
+def test_set_mode():
+    with pytest.raises(ValueError):
+        acceptance.set_mode('weights')
+    assert acceptance.mode == 'random'
+
+
+def test_accept_random():
+    assert not acceptance.accept(Obj(), 0.)
+    assert acceptance.accept(Obj(), 1.)
+    obj = Obj()
+    acceptance.accept(obj, 0.5)
+    assert not hasattr(obj, 'acceptance_weight')
+
+
+def test_accept_weight(weight_mode):
+    obj = Obj()
+    assert acceptance.accept(obj, 0.3)
+    assert acceptance.weight(obj) == 0.3
+    lost = Obj()
+    assert not acceptance.accept(lost, 0.)
+    assert acceptance.weight(lost) == 1.
+
+
+def test_tracker_acceptance_weight(weight_mode):
+    CMS = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.CMS')
+    tracker = CMS.CMS().elements['tracker']
+    track = ProbeTrack(10., 2., 0.)
+    assert tracker.acceptance(track)
+    assert acceptance.weight(track) == tracker.efficiency(track)
+
+
+def test_event_weight():
+    seen = [Obj(0.9), Obj(0.5), Obj()]
+    lost = [Obj(0.2), Obj()]
+    assert acceptance.event_weight([]) == 1.
+    assert acceptance.event_weight(seen) == pytest.approx(0.45)
+    # objects without weight are always seen, and never lost
+    assert acceptance.event_weight(seen, lost) == 0.
+    assert acceptance.event_weight(seen, lost[:1]) == pytest.approx(0.45 * 0.8)
+
+
+def test_event_weight_sums_to_one():
+    # the weights of all the combinations of seen and lost objects
+    objects = [Obj(0.9), Obj(0.5), Obj(0.3)]
+    total = 0.
+    for mask in range(2 ** len(objects)):
+        seen = [obj for i, obj in enumerate(objects) if mask & (1 << i)]
+        lost = [obj for i, obj in enumerate(objects) if not mask & (1 << i)]
+        total += acceptance.event_weight(seen, lost)
+    assert total == pytest.approx(1.)
+
+
+def test_reweight():
+    assert acceptance.reweight(Obj(0.5), 0.4) == pytest.approx(0.8)
+    assert acceptance.reweight(Obj(), 0.4) == pytest.approx(0.4)
+
+
+def test_acceptance_weight_analyzer(tmpdir):
+    module = pytest.importorskip(
+        'heppy.papas.detectors.FCCHiggsDetectors.analyzers.AcceptanceWeight')
+    papasevent = Cfg(get_collection=lambda name: dict(a=Obj(0.5), b=Obj(0.8)))
+    event = Cfg(papasevent=papasevent, leptons=[Obj(0.9)], vetoed=dict(c=Obj(0.1)))
+    cfg_ana = Cfg(name='acceptance_weight', papas_collections=['ts'],
+                  input_objects=['leptons'], lost_objects=['vetoed'],
+                  output='weight')
+    analyzer = module.AcceptanceWeight(cfg_ana, None, str(tmpdir))
+    analyzer.process(event)
+    assert event.weight == pytest.approx(0.5 * 0.8 * 0.9 * 0.9)
@@ -0,0 +1,247 @@
+import itertools
+import random
+
+import pytest
+
+blocks = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.blocks')
+
+
+def _reference_blocks(ids, pairs):
+    '''Connected components by repeated merging of sets.'''
+    components = [set([uid]) for uid in ids]
+    for id1, id2 in pairs:
+        first = [c for c in components if id1 in c][0]
+        second = [c for c in components if id2 in c][0]
+        if first is not second:
+            components.remove(second)
+            first.update(second)
+    return sorted((sorted(c) for c in components), key=lambda block: block[0])
+
+
+def test_union_find():
+    uf = blocks.UnionFind(6)
+    assert len(set(uf.find(i) for i in range(6))) == 6
+    uf.union(0, 1)
+    uf.union(2, 3)
+    uf.union(1, 3)
+    assert uf.find(0) == uf.find(2) == uf.find(3)
+    assert uf.find(4) != uf.find(0)
+    assert uf.union(0, 2) == uf.find(3)
+    assert uf.size[uf.find(0)] == 4
+
+
+def test_connected_blocks_isolated():
+    assert blocks.connected_blocks([3, 1, 2], []) == [[1], [2], [3]]
+    assert blocks.connected_blocks([], []) == []
+
+
+def test_connected_blocks_chain():
+    ids = [10, 20, 30, 40, 50]
+    pairs = [(50, 40), (10, 30)]
+    assert blocks.connected_blocks(ids, pairs) == [[10, 30], [20], [40, 50]]
+
+
+def test_connected_blocks_random():
+    rng = random.Random(1)
+    for trial in range(20):
+        ids = rng.sample(range(1000), 40)
+        pairs = [pair for pair in itertools.combinations(ids, 2)
+                 if rng.random() < 0.03]
+        expected = _reference_blocks(ids, pairs)
+        assert blocks.connected_blocks(ids, pairs) == expected
+        # independent of the order of the ids and pairs
+        rng.shuffle(ids)
+        rng.shuffle(pairs)
+        pairs = [(id2, id1) for id1, id2 in pairs]
+        assert blocks.connected_blocks(ids, pairs) == expected
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'thread'])
+def test_process_blocks(mode):
+    tasks = [[1, 2], [3], [4, 5, 6]]
+    pool = blocks.make_pool(mode, 2)
+    try:
+        results = list(blocks.process_blocks(tasks, sum, mode, pool=pool, size=len))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    assert results == [3, 3, 15]
+
+
+class Node(object):
+    '''History node, as in papas: links are made in both directions.'''
+
+    def __init__(self, value):
+        self.value = value
+        self.children = []
+        self.parents = []
+
+    def get_value(self):
+        return self.value
+
+    def add_child(self, child):
+        self.children.append(child)
+        child.parents.append(self)
+
+
+def _links(history):
+    return sorted((uid, child.value) for uid in history
+                  for child in history[uid].children)
+
+
+def _reconstruct(history, block, elements):
+    '''Toy reconstruction: one particle per element, and one per block.'''
+    block_particle = Node(block + 100)
+    history[block + 100] = block_particle
+    history[block].add_child(block_particle)
+    for element in elements:
+        particle = Node(element + 1000)
+        history[element].add_child(particle)
+        history[element + 1000] = particle
+        block_particle.add_child(particle)
+
+
+def test_block_history():
+    blocks_of = {1: [10, 11], 2: [20]}
+
+    def event_history():
+        history = dict((uid, Node(uid)) for uid in [1, 2, 10, 11, 20])
+        for block, elements in blocks_of.items():
+            for element in elements:
+                history[element].add_child(history[block])
+        return history
+
+    sequential = event_history()
+    for block in sorted(blocks_of):
+        _reconstruct(sequential, block, blocks_of[block])
+    recorded = []
+    for block in sorted(blocks_of):
+        block_history = blocks.BlockHistory([block] + blocks_of[block])
+        _reconstruct(block_history, block, blocks_of[block])
+        recorded.append(block_history)
+    merged = event_history()
+    before = _links(merged)
+    for block_history in recorded:
+        blocks.merge_history(merged, block_history)
+    assert sorted(merged) == sorted(sequential)
+    assert _links(merged) == _links(sequential)
+    assert set(before) < set(_links(merged))
+
+
+def test_block_history_unknown():
+    block_history = blocks.BlockHistory([1])
+    assert 1 in block_history
+    assert 2 not in block_history
+    assert block_history.get(2) is None
+    with pytest.raises(KeyError):
+        block_history[2]
+    assert block_history[1] is block_history[1]
+
+
+def test_merge_history_store():
+    history_module = pytest.importorskip(
+        'heppy.papas.detectors.FCCHiggsDetectors.history')
+    store = history_module.HistoryStore('compact')
+    for uid in [1, 10]:
+        store[uid] = Node(uid)
+    store[10].add_child(store[1])
+    block_history = blocks.BlockHistory([1, 10])
+    _reconstruct(block_history, 1, [10])
+    blocks.merge_history(store, block_history)
+    assert sorted(store) == [1, 10, 101, 1010]
+    assert _links(store) == [(1, 101), (10, 1), (10, 1010), (101, 1010)]
+
+
+class Block(object):
+
+    def __init__(self, element_uids):
+        self.element_uids = element_uids
+
+
+class Particle(object):
+
+    def __init__(self, energy):
+        self.energy = energy
+
+    def e(self):
+        return self.energy
+
+
+class ToyReconstructor(object):
+    '''Reconstructor with the interface of the heppy PFReconstructor.'''
+
+    def __init__(self, detector, logger):
+        self.particles = dict()
+
+    def reconstruct(self, papasevent, blocksname):
+        for uid, block in sorted(papasevent.get_collection(blocksname).items()):
+            _reconstruct(papasevent.history, uid, block.element_uids)
+            for element in block.element_uids:
+                self.particles[element + 1000] = Particle(float(element))
+
+
+class PapasEvent(object):
+
+    def __init__(self, collections, history):
+        self.collections = collections
+        self.history = history
+
+    def get_collection(self, type_and_subtype):
+        return self.collections.get(type_and_subtype, dict())
+
+    def add_collection(self, collection):
+        self.collections.setdefault('pr', dict()).update(collection)
+
+
+class Cfg(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _event(blocks_of):
+    history = dict()
+    tracks = dict()
+    for block, elements in blocks_of.items():
+        history[block] = Node(block)
+        for element in elements:
+            tracks[element] = object()
+            history[element] = Node(element)
+            history[element].add_child(history[block])
+    blocks_collection = dict((block, Block(elements))
+                             for block, elements in blocks_of.items())
+    event = Cfg(iEv=0)
+    event.papasevent = PapasEvent(dict(ts=tracks, br=blocks_collection), history)
+    return event
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'thread', 'process'])
+def test_pf_reconstructor(tmpdir, monkeypatch, mode):
+    module = pytest.importorskip(
+        'heppy.papas.detectors.FCCHiggsDetectors.analyzers.PFReconstructor')
+    monkeypatch.setattr(module, 'BlockReconstructor', ToyReconstructor)
+    blocks_of = dict((block, list(range(block * 10, block * 10 + block)))
+                     for block in range(1, 8))
+    reference = _event(blocks_of)
+    for block in sorted(blocks_of):
+        _reconstruct(reference.papasevent.history, block, blocks_of[block])
+    cfg_ana = Cfg(name='pfreconstruct_' + mode, track_type_and_subtype='ts',
+                  ecal_type_and_subtype='em', hcal_type_and_subtype='hm',
+                  block_type_and_subtype='br', detector=None,
+                  output='rec_particles', block_mode=mode, nworkers=2)
+    analyzer = module.PFReconstructor(cfg_ana, None, str(tmpdir))
+    analyzer.beginLoop(None)
+    try:
+        event = _event(blocks_of)
+        analyzer.process(event)
+    finally:
+        analyzer.endLoop(None)
+    history = event.papasevent.history
+    assert sorted(history) == sorted(reference.papasevent.history)
+    assert _links(history) == _links(reference.papasevent.history)
+    energies = [ptc.e() for ptc in event.rec_particles]
+    assert energies == sorted(energies, reverse=True)
+    assert sorted(event.papasevent.get_collection('pr')) == \
+        sorted(element + 1000 for elements in blocks_of.values()
+               for element in elements)
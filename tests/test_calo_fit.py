@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+calo_fit = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.calo_fit')
+
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Welford
+
+ENERGIES = np.logspace(0, np.log10(200.), 30)
+
+
+def _resolution(energies, pars):
+    a, b, c = pars
+    return np.sqrt(a**2 / energies + b**2 / energies**2 + c**2)
+
+
+def test_fit_resolution():
+    pars = np.array([[0.05, 0.2, 0.007], [1.1, 0., 0.09]])
+    energies = np.tile(ENERGIES, (2, 1))
+    sigmas = np.array([_resolution(ENERGIES, par) for par in pars])
+    weights = np.ones_like(energies)
+    # points with a weight of 0 are ignored
+    sigmas[:, 0] = 10.
+    weights[:, 0] = 0.
+    np.testing.assert_allclose(calo_fit.fit_resolution(energies, sigmas, weights),
+                               pars, atol=1e-5)
+
+
+def test_fermi_dirac():
+    pars = np.array([[1., 5., 2.]])
+    assert calo_fit.fermi_dirac(np.array([[5.]]), pars)[0, 0] == pytest.approx(0.5)
+    # no overflow far from the threshold
+    assert np.isfinite(calo_fit.fermi_dirac(np.array([[1e5, -1e5]]), pars)).all()
+
+
+def test_jacobian():
+    energies = np.tile(ENERGIES, (2, 1))
+    pars = np.array([[1.0007, -9.05, -2.49], [0.9, 2., -3.]])
+    jac = calo_fit._jacobian(energies, pars)
+    for i in range(3):
+        step = np.zeros_like(pars)
+        step[:, i] = 1e-6
+        numerical = (calo_fit.fermi_dirac(energies, pars + step) -
+                     calo_fit.fermi_dirac(energies, pars - step)) / 2e-6
+        np.testing.assert_allclose(jac[..., i], numerical, rtol=1e-4, atol=1e-8)
+
+
+def test_fit_response():
+    pars = np.array([[1.0007, -9.05, -2.49], [0.9, 2., -3.]])
+    energies = np.tile(ENERGIES, (2, 1))
+    responses = calo_fit.fermi_dirac(energies, pars)
+    start = [[1., 0., -1.], [1., 0., -1.]]
+    fitted = calo_fit.fit_response(energies, responses, np.ones_like(energies),
+                                   start, niter=200)
+    np.testing.assert_allclose(calo_fit.fermi_dirac(energies, fitted), responses,
+                               atol=1e-4)
+
+
+SOURCE = '''class ECAL(DetectorElement):
+
+    def __init__(self):
+        self.eres = {'barrel':[0.1, 0.2, 0.3], 'endcap':[0.4, 0.5, 0.6]}
+        self.eresp = {'barrel':[1., 2., 3.], 'endcap':[4., 5., 6.]}
+
+class HCAL(DetectorElement):
+
+    def __init__(self):
+        self.eres = [1.1, 0., 0.09]
+        self.eresp = None
+'''
+
+
+def test_update_card(tmpdir):
+    path = tmpdir.join('detector.py')
+    path.write(SOURCE)
+    eres = dict(barrel=[1., 2., 3.], endcap=[4., 5., 6.])
+    eresp = dict(barrel=[0.9, 1., -2.], endcap=[0.8, 2., -3.])
+    calo_fit.update_card(str(path), 'hcal', eres, eresp)
+    source = path.read()
+    # the list of parameters is replaced by the barrel parameters
+    assert "self.eres = [1, 2, 3]" in source
+    assert "self.eresp = {'barrel':[0.9, 1, -2], 'endcap':[0.8, 2, -3]}" in source
+    # the ECAL is untouched
+    assert source.split('class HCAL')[0] == SOURCE.split('class HCAL')[0]
+    calo_fit.update_card(str(path), 'ecal', eres)
+    assert "self.eres = {'barrel':[1, 2, 3], 'endcap':[4, 5, 6]}" in path.read()
+    assert "self.eresp = {'barrel':[1., 2., 3.]" in path.read()
+
+
+def _save_response(directory, pars, resp_pars, seed):
+    '''Saves the reco / gen energy ratios of a job, with the resolution
+    pars and the response resp_pars in both regions.'''
+    rng = np.random.RandomState(seed)
+    edges = np.logspace(0, np.log10(200.), 21)
+    energies = np.sqrt(edges[1:] * edges[:-1])
+    acc = Welford((len(energies), 2))
+    nper = 2000
+    ibin = np.repeat(np.arange(len(energies)), nper)
+    response = calo_fit.fermi_dirac(energies[np.newaxis, :],
+                                    np.array([resp_pars]))[0]
+    ratios = rng.normal(response[ibin],
+                        response[ibin] * _resolution(energies, pars)[ibin])
+    for region in range(2):
+        acc.fill(ratios, (ibin, np.full(len(ibin), region)))
+    np.savez(str(directory.join(calo_fit.RESPONSE_FILE)), energy_edges=edges,
+             **acc.arrays())
+    return acc
+
+
+def test_collect(tmpdir):
+    assert calo_fit.collect(str(tmpdir)) == (None, None)
+    first = _save_response(tmpdir.mkdir('job_0'), [0.05, 0.2, 0.01], [1., -9., -2.5], 1)
+    second = _save_response(tmpdir.mkdir('job_1'), [0.05, 0.2, 0.01], [1., -9., -2.5], 2)
+    edges, acc = calo_fit.collect(str(tmpdir))
+    assert len(edges) == 21
+    np.testing.assert_array_equal(acc.n, first.n + second.n)
+    np.testing.assert_allclose(acc.mean, first.merge(second).mean)
+
+
+def test_fit_all(tmpdir):
+    pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.CMS')
+    pars, resp_pars = [0.05, 0.2, 0.01], [1., -9., -2.5]
+    _save_response(tmpdir, pars, resp_pars, 1)
+    results = calo_fit.fit_all([('CMS', 'ecal', str(tmpdir))])
+    eres, eresp = results[('CMS', 'ecal')]
+    assert sorted(eres) == calo_fit.REGIONS
+    energies = np.logspace(0.2, 2.2, 10)
+    for region in calo_fit.REGIONS:
+        np.testing.assert_allclose(_resolution(energies, eres[region]),
+                                   _resolution(energies, pars), rtol=0.05)
+        np.testing.assert_allclose(
+            calo_fit.fermi_dirac(energies[np.newaxis, :], np.array([eresp[region]])),
+            calo_fit.fermi_dirac(energies[np.newaxis, :], np.array([resp_pars])),
+            atol=0.01)
+    # too few entries
+    assert calo_fit.fit_all([('CMS', 'ecal', str(tmpdir))], min_entries=10 ** 6) == {}
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+CMS = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.CMS')
+
+from heppy.papas.detectors.FCCHiggsDetectors import calorimeter
+
+NCLUSTERS = 20000
+
+
+def _ks_statistic(first, second):
+    '''Two-sample Kolmogorov-Smirnov statistic.'''
+    first, second = np.sort(first), np.sort(second)
+    values = np.concatenate([first, second])
+    cdf1 = np.searchsorted(first, values, side='right') / float(len(first))
+    cdf2 = np.searchsorted(second, values, side='right') / float(len(second))
+    return np.abs(cdf1 - cdf2).max()
+
+
+def _scalar_smear(calo, energy, eta, rng):
+    '''Smearing of a single cluster, as in the papas simulation.'''
+    return energy * rng.normal(calo.energy_response(energy, eta),
+                               calo.energy_resolution(energy, eta))
+
+
+@pytest.mark.parametrize('calo', [CMS.ECAL(), CMS.HCAL()], ids=['ecal', 'hcal'])
+@pytest.mark.parametrize('energy', [2., 10., 50., 200.])
+@pytest.mark.parametrize('eta', [0., 1.4, 2., -2.8])
+def test_smear_batch_vs_scalar(calo, energy, eta):
+    energies = np.full(NCLUSTERS, energy)
+    etas = np.full(NCLUSTERS, eta)
+    smeared, resolutions = calo.smear(energies, etas, np.random.RandomState(1))
+    np.testing.assert_allclose(resolutions, calo.energy_resolution(energy, eta))
+    rng = np.random.RandomState(2)
+    scalar = np.array([_scalar_smear(calo, energy, eta, rng)
+                       for i in range(NCLUSTERS)])
+    # critical value of the KS test at the 0.1% level
+    assert _ks_statistic(smeared, scalar) < 1.95 * np.sqrt(2. / NCLUSTERS)
+    mean = energy * calo.energy_response(energy, eta)
+    std = energy * calo.energy_resolution(energy, eta)
+    assert abs(smeared.mean() - mean) < 5 * std / np.sqrt(NCLUSTERS)
+    assert abs(smeared.std() / std - 1.) < 0.05
+
+
+@pytest.mark.parametrize('calo', [CMS.ECAL(), CMS.HCAL()], ids=['ecal', 'hcal'])
+def test_smear_regions(calo):
+    '''Each cluster is smeared with the parameters of its region.'''
+    rng = np.random.RandomState(3)
+    energies = rng.uniform(1., 100., 1000)
+    etas = rng.uniform(-3.5, 3.5, 1000)
+    smeared, resolutions = calo.smear(energies, etas, rng)
+    assert smeared.shape == energies.shape
+    expected = [calo.energy_resolution(energy, eta)
+                for energy, eta in zip(energies, etas)]
+    np.testing.assert_allclose(resolutions, expected, rtol=1e-12)
+
+
+def test_smear_response():
+    energies = np.array([1., 10., 100.])
+    pars = [1.0, -9., -2.5]
+    smeared, resolutions = calorimeter.smear(energies, [0., 0., 0.], pars,
+                                             np.random.RandomState(4))
+    np.testing.assert_allclose(smeared, energies * calorimeter.response(energies, pars))
+    smeared, resolutions = calorimeter.smear(energies, [0., 0., 0.], None,
+                                             np.random.RandomState(4))
+    np.testing.assert_array_equal(smeared, energies)
+
+
+def test_region_parameters():
+    pars = {'barrel': [1., 2., 3.], 'endcap': [4., 5., 6.]}
+    np.testing.assert_array_equal(
+        calorimeter.region_parameters(pars, np.array([False, True])),
+        [[1., 2., 3.], [4., 5., 6.]])
@@ -0,0 +1,87 @@
+import filecmp
+import os
+
+import numpy as np
+import pytest
+
+columnar = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.columnar')
+
+CHUNK_SIZE = 7
+COUNTS = {'ptcs.pt': 'ptcs.n', 'ptcs.pdgid': 'ptcs.n'}
+DTYPES = {'event.index': np.int64, 'ptcs.n': np.int64,
+          'ptcs.pt': np.float64, 'ptcs.pdgid': np.int64}
+
+
+def _event(index):
+    rng = np.random.RandomState(index)
+    # some events without particles
+    n = rng.randint(0, 5) * (index % 4 != 1)
+    return {'event.index': index, 'ptcs.n': n,
+            'ptcs.pt': rng.exponential(10., n),
+            'ptcs.pdgid': rng.choice([22, 211, -211, 130], n)}
+
+
+def _write(directory, first, nevents):
+    '''Writes the events as the ColumnarWriter analyzer.'''
+    output = columnar.ColumnarFile(directory, 'fingerprint', COUNTS, CHUNK_SIZE)
+    buf = columnar.ColumnBuffer(DTYPES)
+    for index in range(first, first + nevents):
+        buf.add_event(_event(index))
+        if buf.nevents >= CHUNK_SIZE:
+            output.append(buf.arrays(), buf.nevents)
+            buf.clear()
+    if buf.nevents:
+        output.append(buf.arrays(), buf.nevents)
+    return directory
+
+
+def _identical(first, second):
+    names = sorted(os.listdir(first))
+    assert names == sorted(os.listdir(second))
+    return all(filecmp.cmp(os.path.join(first, name), os.path.join(second, name),
+                           shallow=False) for name in names)
+
+
+@pytest.mark.parametrize('ranges', [
+    [(0, 50)],
+    [(0, 17), (17, 17), (34, 16)],
+    [(0, 7), (7, 7), (14, 36)],
+    [(0, 1), (1, 3), (4, 0), (4, 46)],
+])
+def test_merge_identical(tmpdir, ranges):
+    single = _write(str(tmpdir.join('single')), 0, 50)
+    shards = [_write(str(tmpdir.join('shard_{}'.format(i))), first, nevents)
+              for i, (first, nevents) in enumerate(ranges)]
+    merged = str(tmpdir.join('merged'))
+    columnar.merge(shards, merged)
+    assert _identical(single, merged)
+    arrays = columnar.read(merged)
+    assert arrays['event.index'].tolist() == list(range(50))
+    assert arrays['ptcs.n'].sum() == len(arrays['ptcs.pt'])
+    assert arrays['ptcs.pdgid'].dtype == np.int64
+
+
+def test_deterministic(tmpdir):
+    first = _write(str(tmpdir.join('first')), 0, 20)
+    second = _write(str(tmpdir.join('second')), 0, 20)
+    assert _identical(first, second)
+
+
+def test_empty_columns_dtype():
+    buf = columnar.ColumnBuffer(DTYPES)
+    buf.add_event({'ptcs.n': 0, 'ptcs.pdgid': [], 'ptcs.pt': []})
+    arrays = buf.arrays()
+    assert arrays['ptcs.pdgid'].dtype == np.int64
+    assert arrays['ptcs.pt'].dtype == np.float64
+    assert len(arrays['ptcs.pdgid']) == 0
+
+
+def test_merge_different_detectors(tmpdir):
+    first = _write(str(tmpdir.join('first')), 0, 10)
+    other = columnar.ColumnarFile(str(tmpdir.join('other')), 'other', COUNTS,
+                                  CHUNK_SIZE)
+    other.append(dict((name, np.asarray([value]))
+                      for name, value in _event(10).items()
+                      if name not in COUNTS), 1)
+    with pytest.raises(ValueError):
+        columnar.merge([first, other.directory], str(tmpdir.join('merged')))
@@ -0,0 +1,106 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+delphes = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.delphes')
+
+from heppy.papas.detectors.FCCHiggsDetectors.delphes import Formula, FormulaError
+
+MUON_RESOLUTION = '''
+    (abs(eta) <= 0.5) * (pt > 0.1) * sqrt(0.01^2 + pt^2*1.0e-4^2) +
+    (abs(eta) > 0.5 && abs(eta) <= 1.5) * (pt > 0.1) * sqrt(0.015^2 + pt^2*1.5e-4^2) +
+    (abs(eta) > 1.5 && abs(eta) <= 2.5) * (pt > 0.1) * sqrt(0.025^2 + pt^2*3.5e-4^2)'''
+
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1 + 2 * 3', 7.),
+    ('2^3^2', 512.),
+    ('-2^2', -4.),
+    ('(1 < 2) + (2 <= 1) + !(1 == 2)', 2.),
+    ('1 && 0 || 1', 1.),
+    ('TMath::Sqrt(16)', 4.),
+    ('1 / 2', 0.5),
+    ('1.5e1', 15.),
+])
+def test_constants(text, expected):
+    formula = Formula(text)
+    assert formula.scalar() == expected
+    assert float(formula()) == expected
+
+
+def test_numpy_scalar_parity():
+    formula = Formula(MUON_RESOLUTION)
+    rng = np.random.RandomState(1)
+    pts = rng.uniform(0., 200., 1000)
+    etas = rng.uniform(-3., 3., 1000)
+    values = formula(pt=pts, eta=etas)
+    assert values.shape == pts.shape
+    scalars = [formula.scalar(pt=pt, eta=eta) for pt, eta in zip(pts, etas)]
+    np.testing.assert_allclose(values, scalars, rtol=1e-12)
+    expected = np.where(np.abs(etas) <= 0.5, 1., 0.) * (pts > 0.1) * \
+        np.sqrt(0.01**2 + pts**2 * 1e-8)
+    central = np.abs(etas) <= 0.5
+    np.testing.assert_allclose(values[central], expected[central])
+    assert np.all(values[np.abs(etas) > 2.5] == 0.)
+
+
+def test_broadcast():
+    formula = Formula('pt * 0 + 1')
+    assert formula(pt=np.ones(3), eta=np.zeros((2, 1))).shape == (2, 3)
+
+
+def test_scalar_out_of_domain():
+    formula = Formula('sqrt(pt)')
+    assert math.isnan(formula.scalar(pt=-1.))
+
+
+@pytest.mark.parametrize('text', [
+    "__import__('os').system('ls')",
+    '__import__(os)',
+    'pt.real',
+    'pt.__class__',
+    'open(pt)',
+    'eval(pt)',
+    'np.sqrt(pt)',
+    'os',
+    'lambda: 1',
+    'pt; 1',
+    '[pt]',
+    'pt,',
+    'pt ** 2',
+    '(pt',
+    'pt)',
+    '',
+    'pt +',
+])
+def test_rejected(text):
+    with pytest.raises(FormulaError):
+        Formula(text)
+
+
+@pytest.mark.parametrize('tree', [
+    ['variable', 'os'],
+    ['variable', '__import__("os")'],
+    ['function', '__import__', ['number', 1.]],
+    ['number', '1); import os; ('],
+    ['number', True],
+    ['arithmetic', '.__class__', ['number', 1.], ['number', 2.]],
+    ['compare', ' or ', ['number', 1.], ['number', 2.]],
+    ['sign', 'not ', ['number', 1.]],
+    ['call', 'pt'],
+    ['number'],
+    [],
+    'pt',
+])
+def test_rejected_trees(tree):
+    with pytest.raises(FormulaError):
+        Formula('1', tree)
+
+
+def test_tree_round_trip():
+    formula = Formula(MUON_RESOLUTION)
+    tree = json.loads(json.dumps(formula.tree))
+    assert Formula(formula.text, tree).source == formula.source
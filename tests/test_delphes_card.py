@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+delphes_card = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.delphes_card')
+
+from heppy.papas.detectors.FCCHiggsDetectors.delphes import Formula
+
+CARD = r'''
+#######################################
+# Order of execution of various modules
+#######################################
+
+set ExecutionPath {
+  ParticlePropagator
+  ChargedHadronTrackingEfficiency
+  ECal
+}
+
+module ParticlePropagator ParticlePropagator {
+  set InputArray Delphes/stableParticles
+  # radius of the magnetic field coverage, in m
+  set Radius 1.29
+  set Bz 3.8
+}
+
+module Efficiency ChargedHadronTrackingEfficiency {
+  set InputArray ParticlePropagator/chargedHadrons
+  set OutputArray chargedHadrons
+
+  # {nested {braces}} in a comment
+  set EfficiencyFormula {                                                    \
+    (pt <= 0.1)   * (0.00) +
+    (abs(eta) <= 1.5) * (pt > 0.1   && pt <= 1.0)   * (0.70) +
+    (abs(eta) <= 1.5) * (pt > 1.0)                  * (0.95) +
+    (abs(eta) > 2.5)                                * (0.00)}
+}
+
+module SimpleCalorimeter ECal {
+  add EnergyFraction {0} {0.0}
+  set ResolutionFormula {(abs(eta) <= 3.0) * sqrt(energy^2*0.007^2 + energy*0.07^2 + 0.35^2)}
+}
+'''
+
+
+def test_parse_card():
+    modules = delphes_card.parse_card(CARD)
+    assert sorted(modules) == ['ChargedHadronTrackingEfficiency', 'ECal',
+                               'ParticlePropagator']
+    mtype, parameters = modules['ParticlePropagator']
+    assert mtype == 'ParticlePropagator'
+    assert parameters == dict(InputArray='Delphes/stableParticles',
+                              Radius='1.29', Bz='3.8')
+    mtype, parameters = modules['ChargedHadronTrackingEfficiency']
+    assert mtype == 'Efficiency'
+    assert parameters['EfficiencyFormula'] == (
+        '(pt <= 0.1) * (0.00) + '
+        '(abs(eta) <= 1.5) * (pt > 0.1 && pt <= 1.0) * (0.70) + '
+        '(abs(eta) <= 1.5) * (pt > 1.0) * (0.95) + '
+        '(abs(eta) > 2.5) * (0.00)')
+    assert modules['ECal'][1]['ResolutionFormula'].startswith('(abs(eta) <= 3.0)')
+
+
+def test_parse_card_unbalanced():
+    with pytest.raises(ValueError):
+        delphes_card.parse_card('module Efficiency Eff {\n set A {1\n}\n')
+
+
+def test_card_formulas():
+    formulas = delphes_card.card_formulas(delphes_card.parse_card(CARD))
+    assert sorted(formulas) == ['ecal_resolution', 'tracker_efficiency']
+    efficiency = Formula(formulas['tracker_efficiency'])
+    assert efficiency.scalar(pt=0.5, eta=1.) == 0.70
+    assert efficiency.scalar(pt=10., eta=-1.) == 0.95
+    assert efficiency.scalar(pt=10., eta=3.) == 0.
+
+
+def test_compiled_card(tmpdir):
+    path = str(tmpdir.join('card.tcl'))
+    with open(path, 'w') as out:
+        out.write(CARD)
+    formulas = delphes_card.compile_card(path)
+    cache = path + '.compiled.json'
+    cached = delphes_card.card_formulas_cached(path)
+    assert sorted(cached) == sorted(formulas)
+    for role in formulas:
+        assert cached[role].source == formulas[role].source
+    # a tampered tree is rejected, and the cache rebuilt
+    with open(cache) as infile:
+        compiled = json.load(infile)
+    compiled['formulas']['ecal_resolution']['tree'] = \
+        ['function', '__import__', ['number', 1.]]
+    with open(cache, 'w') as out:
+        json.dump(compiled, out)
+    cached = delphes_card.card_formulas_cached(path)
+    assert cached['ecal_resolution'].source == formulas['ecal_resolution'].source
+    with open(cache) as infile:
+        assert json.load(infile)['formulas']['ecal_resolution']['tree'] == \
+            formulas['ecal_resolution'].tree
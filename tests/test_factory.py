@@ -0,0 +1,166 @@
+import math
+
+import numpy as np
+import pytest
+
+factory = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.factory')
+
+from heppy.papas.detectors.FCCHiggsDetectors import scan
+from heppy.papas.detectors.FCCHiggsDetectors.factory import make_detector
+
+
+def _ecal(detector):
+    return detector.elements['ecal']
+
+
+def test_base_detector():
+    detector = make_detector(dict())
+    base = make_detector(dict(base='CMS'))
+    assert _ecal(detector).volume.outer.rad == _ecal(base).volume.outer.rad
+    assert detector.elements['field'].magnitude == base.elements['field'].magnitude
+
+
+def test_unknown_parameter():
+    with pytest.raises(ValueError):
+        make_detector(dict(ecal_thickness=0.3))
+
+
+def test_field():
+    detector = make_detector(dict(field=2.))
+    assert detector.elements['field'].magnitude == 2.
+
+
+def test_ecal_nX0_keeps_geometry():
+    base = _ecal(make_detector(dict()))
+    ecal = _ecal(make_detector(dict(ecal_nX0=20.)))
+    for surface in ['inner', 'outer']:
+        assert getattr(ecal.volume, surface).rad == getattr(base.volume, surface).rad
+        assert getattr(ecal.volume, surface).z == getattr(base.volume, surface).z
+    depth = base.volume.outer.rad - base.volume.inner.rad
+    assert ecal.material.x0 == pytest.approx(depth / 20.)
+    assert ecal.material.lambdaI == pytest.approx(base.material.lambdaI)
+
+
+def test_ecal_nX0_keeps_base_endcap():
+    # the ECAL endcap of CMS_2T_ECAL starts at the HCAL endcap
+    ecal = _ecal(make_detector(dict(base='CMS_2T_ECAL', ecal_nX0=20.)))
+    base = _ecal(make_detector(dict(base='CMS_2T_ECAL')))
+    assert ecal.volume.outer.z == base.volume.outer.z
+
+
+def test_ecal_depth():
+    base = _ecal(make_detector(dict()))
+    base_depth = base.volume.outer.rad - base.volume.inner.rad
+    ecal = _ecal(make_detector(dict(ecal_depth=0.3)))
+    assert ecal.volume.inner.rad == base.volume.inner.rad
+    assert ecal.volume.inner.z == base.volume.inner.z
+    assert ecal.volume.outer.rad == pytest.approx(base.volume.inner.rad + 0.3)
+    # the endcap thickness is scaled as the barrel thickness
+    assert ecal.volume.outer.z - ecal.volume.inner.z == pytest.approx(
+        (base.volume.outer.z - base.volume.inner.z) * 0.3 / base_depth)
+    # same number of radiation and interaction lengths
+    assert 0.3 / ecal.material.x0 == pytest.approx(base_depth / base.material.x0)
+    assert 0.3 / ecal.material.lambdaI == pytest.approx(
+        base_depth / base.material.lambdaI)
+
+
+def test_ecal_barrel_overlap():
+    with pytest.raises(ValueError) as error:
+        make_detector(dict(ecal_depth=1.))
+    assert 'barrel' in str(error.value)
+
+
+def test_ecal_endcap_overlap():
+    # the barrel fits in front of the HCAL moved outwards, the endcap does not
+    with pytest.raises(ValueError) as error:
+        make_detector(dict(ecal_depth=1.5, hcal_inner_radius=3.))
+    assert 'endcap' in str(error.value)
+
+
+def test_hcal_inner_radius():
+    base = make_detector(dict()).elements['hcal']
+    hcal = make_detector(dict(hcal_inner_radius=2.)).elements['hcal']
+    assert hcal.volume.inner.rad == 2.
+    assert hcal.volume.outer.rad - hcal.volume.inner.rad == pytest.approx(
+        base.volume.outer.rad - base.volume.inner.rad)
+    assert hcal.volume.outer.z == base.volume.outer.z
+
+
+def test_tracker_theta_max():
+    detector = make_detector(dict(base='CMS_2T_Tracker', tracker_theta_max=60.))
+    assert detector.elements['tracker'].theta_max == pytest.approx(math.pi / 3.)
+    with pytest.raises(ValueError):
+        make_detector(dict(base='CMS', tracker_theta_max=60.))
+
+
+def test_grid():
+    points = scan.grid(dict(field=[2., 3.8], ecal_depth=[0.2, 0.25, 0.3]))
+    assert len(points) == 6
+    assert dict(field=3.8, ecal_depth=0.25) in points
+    assert scan.grid(dict()) == [dict()]
+
+
+def test_path_length():
+    volume = _ecal(make_detector(dict())).volume
+    assert scan.path_length(volume, 0.) == pytest.approx(
+        volume.outer.rad - volume.inner.rad)
+    assert scan.path_length(volume, 0.5) > scan.path_length(volume, 0.)
+
+
+def test_impact_eta():
+    surface = make_detector(dict()).elements['hcal'].volume.inner
+    # neutral particles go straight
+    assert scan.impact_eta(surface, 10., 1., 0.) == 1.
+    # low pt particles loop in the transverse plane
+    assert scan.impact_eta(surface, 0.1, 0., 3.8) is None
+    # high pt particles hardly bend
+    assert scan.impact_eta(surface, 1000., 0.5, 3.8) == pytest.approx(0.5, abs=1e-3)
+    # the curvature moves the impact point forward
+    assert scan.impact_eta(surface, 5., 0.5, 3.8) > 0.5
+    assert scan.impact_eta(surface, 5., -0.5, 3.8) < -0.5
+
+
+def test_containment():
+    fractions = [scan.containment(10., depth) for depth in [5., 10., 25., 50.]]
+    assert fractions == sorted(fractions)
+    assert fractions[-1] == pytest.approx(1., abs=1e-3)
+    # higher energy showers are longer
+    assert scan.containment(100., 10.) < scan.containment(1., 10.)
+
+
+def _sample(path, n=200):
+    rng = np.random.RandomState(1)
+    pdgid = rng.choice([211, -211, 22, 130], n)
+    pt = rng.uniform(1., 50., n)
+    eta = rng.uniform(-2.5, 2.5, n)
+    phi = rng.uniform(-math.pi, math.pi, n)
+    scan.save_sample(path, pdgid, pt, eta, phi, pt * np.cosh(eta))
+    return path
+
+
+def test_metrics(tmpdir):
+    sample = np.load(_sample(str(tmpdir.join('sample.npy'))))
+    result = scan.metrics(make_detector(dict()), sample)
+    assert sorted(result) == sorted(scan.METRICS)
+    for name in scan.METRICS:
+        if name.endswith('efficiency') or name == 'ecal_containment':
+            assert 0. <= result[name] <= 1.
+    # more radiation lengths in the same volume
+    deep = scan.metrics(make_detector(dict(ecal_nX0=40.)), sample)
+    assert deep['ecal_containment'] > result['ecal_containment']
+
+
+def test_scan(tmpdir):
+    path = _sample(str(tmpdir.join('sample.npy')))
+    points = scan.grid(dict(field=[2., 3.8]))
+    results = scan.scan(points, path, nprocs=2)
+    sample = np.load(path)
+    for params, result in zip(points, results):
+        expected = scan.metrics(make_detector(params), sample)
+        for name in scan.METRICS:
+            assert result[name] == pytest.approx(expected[name], nan_ok=True)
+    table = str(tmpdir.join('scan.txt'))
+    scan.write_table(table, points, results)
+    lines = open(table).read().splitlines()
+    assert lines[0].split('\t') == ['field'] + scan.METRICS
+    assert len(lines) == 3
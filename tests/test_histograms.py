@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+histograms = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.histograms')
+
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Efficiency, Welford
+
+
+def test_welford_fill():
+    rng = np.random.RandomState(1)
+    values = rng.normal(1e6, 2., 10000)
+    acc = Welford()
+    for piece in np.array_split(values, 13):
+        acc.fill(piece)
+    acc.fill([])
+    assert acc.n == len(values)
+    np.testing.assert_allclose(acc.mean, values.mean(), rtol=1e-12)
+    np.testing.assert_allclose(acc.variance(), values.var(ddof=1), rtol=1e-9)
+
+
+def test_welford_merge():
+    rng = np.random.RandomState(2)
+    values = rng.exponential(3., 5000)
+    accs = []
+    for piece in np.array_split(values, 7):
+        acc = Welford()
+        acc.fill(piece)
+        accs.append(acc)
+    merged = Welford()
+    for acc in accs:
+        merged.merge(acc)
+    np.testing.assert_allclose(merged.mean, values.mean(), rtol=1e-12)
+    np.testing.assert_allclose(merged.std(), values.std(ddof=1), rtol=1e-10)
+    # merging an empty accumulator changes nothing
+    mean, m2 = merged.mean, merged.m2
+    merged.merge(Welford())
+    assert merged.mean == mean and merged.m2 == m2
+
+
+def test_welford_indexed():
+    rng = np.random.RandomState(3)
+    values = rng.normal(0., 1., 3000)
+    bins = rng.randint(0, 5, 3000)
+    bins[bins == 3] = 2
+    first, second = Welford(5), Welford(5)
+    first.fill(values[:1000], bins[:1000])
+    second.fill(values[1000:], bins[1000:])
+    first.merge(second)
+    for i in range(5):
+        selected = values[bins == i]
+        assert first.n[i] == len(selected)
+        if len(selected):
+            np.testing.assert_allclose(first.mean[i], selected.mean(), atol=1e-12)
+            np.testing.assert_allclose(first.variance()[i], selected.var(ddof=1))
+    assert np.isnan(first.variance()[3])
+
+
+def test_welford_arrays():
+    acc = Welford((2, 3))
+    rng = np.random.RandomState(4)
+    acc.fill(rng.normal(size=100), (rng.randint(0, 2, 100), rng.randint(0, 3, 100)))
+    copy = Welford.from_arrays(**acc.arrays())
+    np.testing.assert_array_equal(copy.mean, acc.mean)
+    np.testing.assert_array_equal(copy.variance(), acc.variance())
+
+
+def test_efficiency():
+    eff = Efficiency(4, 0., 4.)
+    eff.fill([-1., 0.5, 0.7, 1.5, 3.9, 4., 10.], [True, True, False, True, False, True, True])
+    np.testing.assert_array_equal(eff.total, [1, 2, 1, 0, 1, 2])
+    np.testing.assert_array_equal(eff.passed, [1, 1, 1, 0, 0, 2])
+    efficiencies = eff.efficiencies()
+    np.testing.assert_array_equal(efficiencies[[0, 1, 2, 4, 5]], [1., 0.5, 1., 0., 1.])
+    assert np.isnan(efficiencies[3])
+    assert eff.errors()[1] == np.sqrt(0.5 * 0.5 / 2)
+
+
+def test_efficiency_merge():
+    rng = np.random.RandomState(5)
+    values = rng.uniform(-1., 11., 2000)
+    passed = rng.uniform(size=2000) < values / 10.
+    whole = Efficiency(10, 0., 10.)
+    whole.fill(values, passed)
+    first, second = Efficiency(10, 0., 10.), Efficiency(10, 0., 10.)
+    first.fill(values[:700], passed[:700])
+    second.fill(values[700:], passed[700:])
+    first.merge(second)
+    np.testing.assert_array_equal(first.passed, whole.passed)
+    np.testing.assert_array_equal(first.total, whole.total)
+    copy = Efficiency.from_arrays(**first.arrays())
+    np.testing.assert_array_equal(copy.efficiencies(), whole.efficiencies())
+    with pytest.raises(ValueError):
+        first.merge(Efficiency(5, 0., 10.))
@@ -0,0 +1,115 @@
+import pytest
+
+history = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.history')
+
+from heppy.papas.detectors.FCCHiggsDetectors.history import \
+    CompactHistory, HistoryStore, apply_mode
+
+
+class Node(object):
+    '''History node, as in papas: links are made in both directions.'''
+
+    def __init__(self, value):
+        self.value = value
+        self.children = []
+        self.parents = []
+
+    def get_value(self):
+        return self.value
+
+    def add_child(self, child):
+        self.children.append(child)
+        child.parents.append(self)
+
+
+class PapasEvent(object):
+
+    def __init__(self, history):
+        self.history = history
+
+
+def _graph():
+    '''particle 1 -> tracks 10, 11, particle 2 -> cluster 20,
+    track 11 and cluster 20 -> block 30.'''
+    nodes = dict((uid, Node(uid)) for uid in [1, 2, 10, 11, 20, 30])
+    for parent, child in [(1, 10), (1, 11), (2, 20), (11, 30), (20, 30)]:
+        nodes[parent].add_child(nodes[child])
+    return nodes
+
+
+def _edges(nodes):
+    return sorted((uid, child.value) for uid, node in nodes.items()
+                  for child in node.children)
+
+
+def test_compact_history():
+    compact = CompactHistory.from_nodes(_graph())
+    assert len(compact) == 6
+    assert compact.children_of(1) == [10, 11]
+    assert compact.parents_of(30) == [11, 20]
+    assert compact.children_of(30) == []
+    assert 40 not in compact
+    with pytest.raises(KeyError):
+        compact.children_of(40)
+
+
+def test_store_folds_nodes():
+    nodes = _graph()
+    store = HistoryStore('compact')
+    for uid, node in nodes.items():
+        store[uid] = node
+    assert sorted(store) == sorted(nodes)
+    for uid, node in nodes.items():
+        assert sorted(child.value for child in store[uid].children) == \
+            sorted(child.value for child in node.children)
+        assert sorted(parent.value for parent in store[uid].parents) == \
+            sorted(parent.value for parent in node.parents)
+
+
+def test_store_deduplicates_edges():
+    nodes = _graph()
+    store = HistoryStore('compact')
+    for uid, node in nodes.items():
+        store[uid] = node
+    # each edge is folded from both of its nodes
+    nedges = len(_edges(nodes))
+    compact = store.compact()
+    assert len(compact.parents) == nedges
+    reference = HistoryStore('compact')
+    for parent, child in _edges(nodes):
+        reference.add_edge(parent, child)
+    assert store.nbytes() == reference.nbytes()
+
+
+def test_store_links_after_add():
+    '''Links made on the last node object after adding it are kept.'''
+    store = HistoryStore('compact')
+    particle, track = Node(1), Node(10)
+    store[1] = particle
+    particle.add_child(track)
+    store[10] = track
+    cluster = Node(20)
+    store[20] = cluster
+    # folded from the parents of the cluster, the last node added
+    particle.add_child(cluster)
+    assert [node.value for node in store[1].children] == [10, 20]
+    store[10].add_child(store[20])
+    assert [node.value for node in store[20].parents] == [1, 10]
+    assert len(store) == 3
+
+
+def test_apply_mode():
+    event = PapasEvent(_graph())
+    apply_mode(event, 'full')
+    assert isinstance(event.history, dict)
+    apply_mode(event, 'compact')
+    assert isinstance(event.history, HistoryStore)
+    assert len(event.history) == 6
+    event = PapasEvent(_graph())
+    apply_mode(event, 'off')
+    assert len(event.history) == 0
+    assert event.history[1].children == ()
+    event.history[3] = Node(3)
+    assert 3 not in event.history
+    with pytest.raises(ValueError):
+        apply_mode(PapasEvent(dict()), 'partial')
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+
+jec = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.jec')
+
+from heppy.papas.detectors.FCCHiggsDetectors.jec import JetEnergyCorrection
+
+PT_EDGES = [10., 20., 50., 100.]
+ETA_EDGES = [0., 1.3, 2.5]
+FACTORS = [[1.2, 1.3], [1.1, 1.2], [1.05, 1.1]]
+
+
+class Jet(object):
+
+    def __init__(self, pt, eta):
+        self._pt, self._eta = pt, eta
+
+    def pt(self):
+        return self._pt
+
+    def eta(self):
+        return self._eta
+
+
+@pytest.fixture
+def table():
+    return JetEnergyCorrection(PT_EDGES, ETA_EDGES, FACTORS, 'CMS')
+
+
+def test_shape():
+    with pytest.raises(ValueError):
+        JetEnergyCorrection(PT_EDGES, ETA_EDGES, [[1.]])
+
+
+def test_bin_centres(table):
+    pts = [15., 35., 75.]
+    for ieta, eta in enumerate([0.65, 1.9]):
+        np.testing.assert_allclose(table.correction(pts, [eta] * 3),
+                                   [row[ieta] for row in FACTORS])
+
+
+def test_interpolation(table):
+    # halfway between the first two pt bin centres, and symmetric in eta
+    assert table.correction([25.], [-0.65])[0] == pytest.approx(1.15)
+    assert table.correction([25.], [1.275])[0] == pytest.approx(1.2)
+
+
+def test_clamping(table):
+    assert table.correction([1.], [0.])[0] == pytest.approx(1.2)
+    assert table.correction([1000.], [5.])[0] == pytest.approx(1.1)
+
+
+def test_single_bin():
+    table = JetEnergyCorrection([10., 100.], [0., 5.], [[1.1]])
+    np.testing.assert_allclose(table.correction([5., 50., 500.], [0., 1., 4.]), 1.1)
+
+
+def test_jets(table):
+    jets = [Jet(15., 0.65), Jet(75., 1.9)]
+    np.testing.assert_allclose(table.corrections(jets), [1.2, 1.1])
+    assert table(jets[0]) == pytest.approx(1.2)
+    assert len(table.corrections([])) == 0
+
+
+def test_save_load(tmpdir, table):
+    path = str(tmpdir.join('CMS.json'))
+    jec.save(path, table)
+    loaded = jec.load(path)
+    assert loaded.detector == 'CMS'
+    np.testing.assert_array_equal(loaded.factors, table.factors)
+    assert jec.load(path) is loaded
+    # the table is read again if the file changed
+    jec.save(path, JetEnergyCorrection(PT_EDGES, ETA_EDGES,
+                                       np.ones((3, 2)), 'CMS'))
+    os.utime(path, (0, os.path.getmtime(path) + 10))
+    np.testing.assert_array_equal(jec.load(path).factors, np.ones((3, 2)))
+
+
+def test_for_detector(tmpdir, table):
+    directory = str(tmpdir)
+    assert jec.for_detector('CMS', directory) is None
+    jec.save(os.path.join(directory, 'CMS.json'), table)
+    np.testing.assert_array_equal(jec.for_detector('CMS', directory).factors,
+                                  table.factors)
+
+
+def test_detector_correction(monkeypatch, table):
+    CMS = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.CMS')
+    monkeypatch.setattr(jec, 'for_detector', lambda name: None)
+    assert CMS.CMS().jet_energy_correction(Jet(15., 0.65)) == 1.1
+    monkeypatch.setattr(jec, 'for_detector', lambda name: table)
+    assert CMS.CMS().jet_energy_correction(Jet(75., 1.9)) == pytest.approx(1.1)
+    assert CMS.CMS().jet_energy_correction(Jet(15., 0.65)) == pytest.approx(1.2)
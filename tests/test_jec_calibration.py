@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+jec_calibration = pytest.importorskip(
+    'heppy.papas.detectors.FCCHiggsDetectors.jec_calibration')
+
+from heppy.papas.detectors.FCCHiggsDetectors.jec_calibration import \
+    ResponseAccumulator, collect, fit, invert
+
+PT_EDGES = [10., 20., 50., 100.]
+ETA_EDGES = [0., 1.3, 2.5]
+
+
+def _response(gen_pts):
+    '''Response rising with the gen jet pt.'''
+    return 0.8 + 0.1 * np.log10(gen_pts / 10.)
+
+
+def _accumulator(n=100000, seed=1):
+    rng = np.random.RandomState(seed)
+    gen_pts = rng.uniform(10., 100., n)
+    gen_etas = rng.uniform(-2.5, 2.5, n)
+    responses = rng.normal(_response(gen_pts), 0.05)
+    acc = ResponseAccumulator(PT_EDGES, ETA_EDGES, (400, 0., 2.))
+    acc.fill(gen_pts, gen_etas, responses)
+    return acc
+
+
+def test_fill():
+    acc = ResponseAccumulator(PT_EDGES, ETA_EDGES, (20, 0., 2.))
+    acc.fill(np.array([15., 15., 5., 60., 60.]),
+             np.array([0.5, -2., 0.5, 3., 1.]),
+             np.array([1.05, 0.95, 1., 1., 2.5]))
+    assert acc.counts.sum() == 3
+    assert acc.counts[0, 0, 11] == 1
+    assert acc.counts[0, 1, 10] == 1
+    # response overflow
+    assert acc.counts[2, 0, -1] == 1
+
+
+def test_merge_save_load(tmpdir):
+    first, second = _accumulator(1000, 1), _accumulator(1000, 2)
+    expected = first.counts + second.counts
+    path = str(tmpdir.join('jet_response.npz'))
+    first.merge(second).save(path)
+    loaded = ResponseAccumulator.load(path)
+    np.testing.assert_array_equal(loaded.counts, expected)
+    np.testing.assert_array_equal(loaded.response_edges, first.response_edges)
+
+
+def test_medians():
+    acc = _accumulator()
+    medians = acc.medians()
+    # the mean response of the bins, within the width of the response bins
+    for ipt, (low, high) in enumerate(zip(acc.pt_edges[:-1], acc.pt_edges[1:])):
+        pts = np.linspace(low, high, 1001)
+        np.testing.assert_allclose(medians[ipt], _response(pts).mean(), atol=0.01)
+    assert np.isnan(acc.medians(min_entries=10 ** 6)).all()
+
+
+def test_invert_constant():
+    centres = np.array([15., 35., 75.])
+    responses = np.full((3, 2), 0.8)
+    np.testing.assert_allclose(invert(centres, responses), 1.25)
+
+
+def test_invert():
+    centres = np.array([15., 35., 75.])
+    responses = np.array([[0.8], [0.9], [1.]])
+    corrections = invert(centres, responses)
+    # the rec jet pts are 12, 31.5 and 75
+    assert corrections[0, 0] == pytest.approx(
+        1.25 + (15. - 12.) / (31.5 - 12.) * (1. / 0.9 - 1.25))
+    assert corrections[1, 0] == pytest.approx(
+        1. / 0.9 + (35. - 31.5) / (75. - 31.5) * (1. - 1. / 0.9))
+    assert corrections[2, 0] == pytest.approx(1.)
+    # clamped outside the rec jet pts
+    responses = np.array([[1.2], [1.2], [1.2]])
+    np.testing.assert_allclose(invert(centres, responses)[:, 0], 1. / 1.2)
+
+
+def test_fit():
+    acc = _accumulator()
+    table = fit(acc, 'CMS')
+    assert table.detector == 'CMS'
+    assert table.factors.shape == (3, 2)
+    gen_pts = np.array([30., 60., 90.])
+    rec_pts = gen_pts * _response(gen_pts)
+    np.testing.assert_allclose(table.correction(rec_pts, [0.5] * 3) * rec_pts,
+                               gen_pts, rtol=0.03)
+
+
+def test_fit_empty_bins():
+    acc = ResponseAccumulator(PT_EDGES, ETA_EDGES, (200, 0., 2.))
+    acc.fill(np.full(100, 15.), np.full(100, 0.5), np.full(100, 0.8))
+    table = fit(acc)
+    # the empty pt bins take the response of the closest filled bin,
+    # the empty eta bin a response of 1
+    np.testing.assert_allclose(table.factors[:, 0], 1. / 0.805, rtol=0.01)
+    np.testing.assert_allclose(table.factors[:, 1], 1.)
+
+
+def test_collect(tmpdir):
+    assert collect(str(tmpdir)) is None
+    first, second = _accumulator(1000, 1), _accumulator(1000, 2)
+    expected = first.counts + second.counts
+    for index, acc in enumerate([first, second]):
+        directory = tmpdir.mkdir('job_{}'.format(index)).mkdir('jetresponse')
+        acc.save(str(directory.join(jec_calibration.RESPONSE_FILE)))
+    np.testing.assert_array_equal(collect(str(tmpdir)).counts, expected)
@@ -0,0 +1,82 @@
+import itertools
+import math
+import random
+
+import pytest
+
+linking = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.linking')
+
+
+def _direction(eta, phi):
+    theta = 2. * math.atan(math.exp(-eta))
+    return (math.sin(theta) * math.cos(phi), math.sin(theta) * math.sin(phi),
+            math.cos(theta))
+
+
+def _angle(first, second):
+    dot = sum(a * b for a, b in zip(_direction(*first), _direction(*second)))
+    return math.acos(max(-1., min(1., dot)))
+
+
+def _elements(rng, nelements, eta_max):
+    '''Returns the list of (uid, eta, phi), some elements at two positions,
+    and the dictionary uid -> positions.'''
+    elements = []
+    positions = dict()
+    for uid in range(nelements):
+        npositions = 2 if rng.random() < 0.3 else 1
+        for i in range(npositions):
+            eta = rng.uniform(-eta_max, eta_max)
+            phi = rng.uniform(-math.pi, math.pi)
+            elements.append((uid, eta, phi))
+            positions.setdefault(uid, []).append((eta, phi))
+    return elements, positions
+
+
+def _brute_force(positions, angle):
+    return [(id1, id2) for id1, id2 in itertools.combinations(sorted(positions), 2)
+            if any(_angle(first, second) < angle
+                   for first in positions[id1] for second in positions[id2])]
+
+
+@pytest.mark.parametrize('size, angle, eta_max', [
+    (0.1, 0.1, 2.5),
+    (0.05, 0.2, 2.5),
+    (0.3, 0.05, 2.5),
+    (0.1, 0.1, 6.),
+    (0.2, 0.5, 8.),
+])
+def test_find_links_brute_force(size, angle, eta_max):
+    rng = random.Random(7)
+    for trial in range(5):
+        elements, positions = _elements(rng, 150, eta_max)
+
+        def is_linked(id1, id2):
+            return any(_angle(first, second) < angle
+                       for first in positions[id1] for second in positions[id2])
+
+        assert linking.find_links(elements, is_linked, size, angle) == \
+            _brute_force(positions, angle)
+
+
+def test_find_links_phi_wrap():
+    elements = [(1, 0.5, math.pi - 0.01), (2, 0.5, -math.pi + 0.01), (3, 0.5, 0.)]
+    assert linking.find_links(elements, lambda id1, id2: True, 0.1, 0.05) == [(1, 2)]
+
+
+def test_find_links_beam_axis():
+    # ROOT gives eta = +- 1e10 along the beam axis
+    elements = [(1, 1e10, 0.), (2, 8., 2.), (3, -8., 0.)]
+    assert linking.find_links(elements, lambda id1, id2: True, 0.1, 0.01) == [(1, 2)]
+
+
+def test_grid_neighbours():
+    grid = linking.EtaPhiGrid(0.1)
+    assert grid.neighbours(0., 0.) == []
+    grid.add(1, 0.01, 0.01)
+    grid.add(2, 1., 0.01)
+    assert grid.cell(0.01, 0.01) == grid.cell(0.02, 0.02)
+    assert 1 in grid.neighbours(0., 0.)
+    assert 2 not in grid.neighbours(0., 0.)
+    assert grid.candidate_pairs(0.1) == []
+    assert grid.candidate_pairs(1.) == [(1, 2)]
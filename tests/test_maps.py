@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+maps_module = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.maps')
+
+from heppy.papas.detectors.FCCHiggsDetectors import CMS, CMS_2T
+from heppy.papas.detectors.FCCHiggsDetectors.maps import DetectorMaps
+from heppy.papas.detectors.FCCHiggsDetectors.probes import ProbeCluster, ProbeTrack
+
+PTS = np.logspace(-1, 2, 12)
+ENERGIES = np.logspace(-1, 2, 10)
+ETAS = np.linspace(0., 3., 13)
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return CMS.CMS()
+
+
+@pytest.fixture
+def maps(tmpdir, detector):
+    path = str(tmpdir.join('CMS.npz'))
+    computed = maps_module.compute_maps(detector, PTS, ENERGIES, ETAS)
+    maps_module.save_maps(path, detector, computed, PTS, ENERGIES, ETAS)
+    return DetectorMaps(path)
+
+
+def test_names(maps):
+    names = ['tracker_efficiency', 'tracker_resolution']
+    for calo in ['ecal', 'hcal']:
+        names += [calo + '_' + quantity
+                  for quantity in ['efficiency', 'resolution', 'response']]
+    names += ['electron_efficiency', 'electron_resolution',
+              'muon_efficiency', 'muon_resolution']
+    assert sorted(maps.maps) == sorted(names)
+    assert maps.maps['tracker_efficiency'].shape == (len(PTS), len(ETAS))
+    assert maps.maps['ecal_resolution'].shape == (len(ENERGIES), len(ETAS))
+
+
+def test_grid_values(maps, detector):
+    tracker = detector.elements['tracker']
+    ecal = detector.elements['ecal']
+    pts, etas = np.meshgrid(PTS, ETAS, indexing='ij')
+    np.testing.assert_allclose(
+        maps('tracker_resolution', pts.ravel(), etas.ravel()),
+        [tracker.resolution(ProbeTrack(pt, eta))
+         for pt, eta in zip(pts.ravel(), etas.ravel())])
+    energies, etas = np.meshgrid(ENERGIES, ETAS, indexing='ij')
+    np.testing.assert_allclose(
+        maps('ecal_efficiency', energies.ravel(), etas.ravel()),
+        [ecal.efficiency(ProbeCluster(energy, eta))
+         for energy, eta in zip(energies.ravel(), etas.ravel())])
+
+
+def test_interpolation(maps):
+    values = maps.maps['hcal_resolution']
+    energy = 0.5 * (ENERGIES[3] + ENERGIES[4])
+    eta = 0.5 * (ETAS[5] + ETAS[6])
+    expected = values[3:5, 5:7].mean()
+    assert maps('hcal_resolution', [energy], [eta])[0] == pytest.approx(expected)
+    # symmetric in eta
+    assert maps('hcal_resolution', [energy], [-eta])[0] == pytest.approx(expected)
+
+
+def test_clamping(maps):
+    values = maps.maps['tracker_resolution']
+    assert maps('tracker_resolution', [1e4], [10.])[0] == pytest.approx(values[-1, -1])
+    assert maps('tracker_resolution', [1e-3], [0.])[0] == pytest.approx(values[0, 0])
+
+
+def test_check(maps, detector):
+    maps.check(detector)
+    maps.check(CMS.CMS())
+    with pytest.raises(ValueError):
+        maps.check(CMS_2T.CMS())
+
+
+def test_save_load(tmpdir, detector):
+    path = str(tmpdir.join('zero.npz'))
+    maps_module.save_maps(path, detector, dict(zero=np.zeros((len(PTS), len(ETAS)))),
+                          PTS, ENERGIES, ETAS)
+    loaded = DetectorMaps(path)
+    assert list(loaded.maps) == ['zero']
+    np.testing.assert_array_equal(loaded.axes['pt'], PTS)
+    np.testing.assert_array_equal(loaded.etas, ETAS)
@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+shard = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.shard')
+
+from heppy.papas.detectors.FCCHiggsDetectors import columnar, veto
+from heppy.papas.detectors.FCCHiggsDetectors.histograms import Welford
+from heppy.papas.detectors.FCCHiggsDetectors.jec_calibration import ResponseAccumulator
+
+
+@pytest.mark.parametrize('nevents, rate, duration', [
+    (1000, 10., 30.), (1000, 10., 1000.), (7, 0.1, 1.), (1001, 1., 100.)])
+def test_shards(nevents, rate, duration):
+    ranges = shard.shards(nevents, rate, duration)
+    assert sum(n for first, n in ranges) == nevents
+    assert ranges[0][0] == 0
+    for (first, n), (next_first, next_n) in zip(ranges, ranges[1:]):
+        assert next_first == first + n
+        assert n - next_n in (0, 1)
+    assert max(n for first, n in ranges) <= max(int(rate * duration), 1)
+
+
+def test_shards_sizes():
+    assert shard.shards(10, 1., 4.) == [(0, 4), (4, 3), (7, 3)]
+    assert shard.shards(10, 100., 4.) == [(0, 10)]
+
+
+def test_prepare(tmpdir):
+    workdir = tmpdir.mkdir('work')
+    for name in ['pilot', 'shard_00000', 'shard_00012', 'merged', 'shard_1']:
+        workdir.mkdir(name)
+    options = dict(seed='1', detector='CMS')
+    shard.prepare(str(workdir), [(0, 5), (5, 5)], options)
+    assert sorted(os.listdir(str(workdir))) == sorted(
+        ['merged', 'shard_1', shard.SHARDS_FILE])
+    with open(str(workdir.join(shard.SHARDS_FILE))) as infile:
+        plan = json.load(infile)
+    assert plan == dict(ranges=[[0, 5], [5, 5]], options=options)
+    shard.prepare(str(tmpdir.join('new')), [], options)
+    assert os.listdir(str(tmpdir.join('new'))) == [shard.SHARDS_FILE]
+
+
+def test_jobs(tmpdir):
+    options = dict(seed='1', detector='CMS')
+    jobs = shard.jobs('cfg.py', str(tmpdir), [(0, 5), (5, 4)], options)
+    assert [(job['shard'], job['first'], job['nevents']) for job in jobs] == \
+        [(0, 0, 5), (1, 5, 4)]
+    command = jobs[1]['command']
+    assert command[command.index('--first') + 1] == '5'
+    assert command[command.index('-N') + 1] == '4'
+    assert command[-4:] == ['-o', 'detector=CMS', '-o', 'seed=1']
+    assert jobs[1]['outdir'] == os.path.abspath(shard.shard_dir(str(tmpdir), 1))
+
+
+def _shard_outputs(directory, index, first, nevents):
+    '''Writes the outputs of a shard, as the analyzers of a job.'''
+    rng = np.random.RandomState(index)
+    calo = directory.mkdir('calo')
+    acc = Welford((3, 2))
+    acc.fill(rng.normal(1., 0.1, 100), (rng.randint(0, 3, 100), rng.randint(0, 2, 100)))
+    np.savez(str(calo.join(shard.CALO_RESPONSE_FILE)), energy_edges=[1., 2., 3., 4.],
+             **acc.arrays())
+    jets = directory.mkdir('jets')
+    response = ResponseAccumulator([10., 50., 100.], [0., 2.5], (10, 0., 2.))
+    response.fill(rng.uniform(10., 100., 50), rng.uniform(-2.5, 2.5, 50),
+                  rng.normal(1., 0.1, 50))
+    response.save(str(jets.join(shard.JET_RESPONSE_FILE)))
+    gen = directory.mkdir('genveto')
+    np.savez(str(gen.join(veto.VETO_FILE)), names=['all', 'leptons'],
+             counts=np.array([nevents, nevents // 2]))
+    directory.join('log.txt').write('shard {}'.format(index))
+    directory.join('tree.root').write('')
+    output = columnar.ColumnarFile(str(directory.join('columns')), 'fingerprint',
+                                   dict(), 4)
+    if nevents:
+        output.append({'event.index': np.arange(first, first + nevents)}, nevents)
+    return acc, response
+
+
+def _no_hadd(paths, output):
+    raise OSError('hadd not found')
+
+
+def test_merge(tmpdir, monkeypatch):
+    monkeypatch.setattr(shard, '_merge_root', _no_hadd)
+    workdir = tmpdir.mkdir('work')
+    ranges = [(0, 6), (6, 0), (6, 5)]
+    shard.prepare(str(workdir), ranges, dict())
+    accs, responses = [], []
+    for index, (first, nevents) in enumerate(ranges):
+        directory = workdir.mkdir(os.path.basename(shard.shard_dir(str(workdir), index)))
+        acc, response = _shard_outputs(directory, index, first, nevents)
+        accs.append(acc)
+        responses.append(response)
+    output = str(tmpdir.join('merged'))
+    merged, skipped = shard.merge(str(workdir), output)
+    assert sorted(merged) == sorted([
+        os.path.join('calo', shard.CALO_RESPONSE_FILE),
+        os.path.join('columns'),
+        os.path.join('genveto', veto.VETO_FILE),
+        os.path.join('jets', shard.JET_RESPONSE_FILE)])
+    assert skipped == ['tree.root']
+    assert not os.path.exists(os.path.join(output, 'log.txt'))
+    with np.load(os.path.join(output, 'calo', shard.CALO_RESPONSE_FILE)) as data:
+        expected = accs[0].merge(accs[1]).merge(accs[2])
+        np.testing.assert_array_equal(data['n'], expected.n)
+        np.testing.assert_allclose(data['mean'], expected.mean)
+        np.testing.assert_array_equal(data['energy_edges'], [1., 2., 3., 4.])
+    jets = ResponseAccumulator.load(os.path.join(output, 'jets', shard.JET_RESPONSE_FILE))
+    np.testing.assert_array_equal(jets.counts, sum(r.counts for r in responses))
+    assert veto.load(os.path.join(output, 'genveto')) == [('all', 11), ('leptons', 5)]
+    assert columnar.read(os.path.join(output, 'columns'))['event.index'].tolist() == \
+        list(range(11))
+
+
+def test_merge_missing_shard(tmpdir):
+    workdir = tmpdir.mkdir('work')
+    shard.prepare(str(workdir), [(0, 5), (5, 5)], dict())
+    workdir.mkdir('shard_00000')
+    with pytest.raises(ValueError):
+        shard.merge(str(workdir), str(tmpdir.join('merged')))
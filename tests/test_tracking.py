@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+tracking = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.tracking')
+
+from heppy.papas.detectors.geometry import VolumeCylinder
+from heppy.papas.detectors.FCCHiggsDetectors.tracking import GlucksternResolution
+
+
+@pytest.fixture(scope='module')
+def model():
+    return GlucksternResolution(3.8, VolumeCylinder('tracker', 1.29, 1.99))
+
+
+def _gluckstern(pt, eta, field=3.8, rad=1.29, z=1.99, sigma_x=20e-6,
+                nhits=13, x_x0=0.4):
+    '''Resolution of a single track, directly from the formula.'''
+    lever_arm = rad if not eta else min(rad, z / abs(math.sinh(eta)))
+    a = sigma_x / (0.3 * field * lever_arm**2) * math.sqrt(720. / (nhits + 4))
+    b = 0.0136 * math.sqrt(1.43) / (0.3 * field * lever_arm) * \
+        math.sqrt(x_x0 * math.cosh(eta))
+    return math.sqrt((a * pt)**2 + b**2)
+
+
+def test_lever_arm(model):
+    np.testing.assert_allclose(model.lever_arm(np.array([0., 0.5, 3.])),
+                               [1.29, 1.29, 1.99 / math.sinh(3.)])
+
+
+@pytest.mark.parametrize('pt', [0.5, 10., 100.])
+@pytest.mark.parametrize('eta', [0., 0.5, -1.2, 2.4])
+def test_formula(model, pt, eta):
+    # at the eta grid points, the interpolation is exact
+    expected = _gluckstern(pt, eta)
+    assert model.resolution(pt, eta) == pytest.approx(expected)
+    assert float(model(pt, eta)) == pytest.approx(expected)
+
+
+def test_batch_vs_scalar(model):
+    rng = np.random.RandomState(1)
+    pts = rng.uniform(0.5, 200., 1000)
+    etas = rng.uniform(-6., 6., 1000)
+    np.testing.assert_allclose(model(pts, etas),
+                               [model.resolution(pt, eta)
+                                for pt, eta in zip(pts, etas)], rtol=1e-12)
+
+
+def test_interpolation(model):
+    # between grid points, close to the formula
+    for eta in [0.123, 1.337, 2.011]:
+        assert model.resolution(20., eta) == pytest.approx(
+            _gluckstern(20., eta), rel=1e-3)
+
+
+def test_pt_dependence(model):
+    resolutions = [model.resolution(pt, 0.) for pt in [1., 10., 100., 1000.]]
+    assert resolutions == sorted(resolutions)
+    # multiple scattering dominates at low pt
+    assert model.resolution(0.1, 0.) == pytest.approx(model.b[0], rel=1e-3)
+
+
+def test_for_field(model):
+    other = model.for_field(2.)
+    assert other.field == 2.
+    assert other.volume is model.volume
+    # the resolution scales as 1 / B
+    for pt, eta in [(1., 0.), (50., 1.5)]:
+        assert other.resolution(pt, eta) == pytest.approx(
+            model.resolution(pt, eta) * 3.8 / 2.)
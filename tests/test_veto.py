@@ -0,0 +1,135 @@
+import math
+
+import numpy as np
+import pytest
+
+veto = pytest.importorskip('heppy.papas.detectors.FCCHiggsDetectors.veto')
+
+from heppy.papas.detectors.FCCHiggsDetectors.veto import \
+    GenArrays, dilepton_mass, leptons, visible_mass
+
+
+class Particle(object):
+    '''Massless generated particle.'''
+
+    def __init__(self, pdgid, pt, eta, phi, charge=None):
+        self._pdgid, self._pt, self._eta, self._phi = pdgid, pt, eta, phi
+        if charge is None:
+            charge = -math.copysign(1, pdgid) if abs(pdgid) in (11, 13) else 0
+        self._charge = charge
+
+    def pdgid(self):
+        return self._pdgid
+
+    def q(self):
+        return self._charge
+
+    def pt(self):
+        return self._pt
+
+    def eta(self):
+        return self._eta
+
+    def phi(self):
+        return self._phi
+
+    def e(self):
+        return self._pt * math.cosh(self._eta)
+
+
+class Cfg(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _zmumu(pt=45.6, eta=0.):
+    # back to back muons, of mass 2 pt cosh(eta) at eta 0
+    return [Particle(13, pt, eta, 0.), Particle(-13, pt, -eta, math.pi)]
+
+
+def test_gen_arrays():
+    gen = GenArrays(_zmumu() + [Particle(22, 5., 1., 0.5)])
+    assert len(gen) == 3
+    assert gen.pdgid.tolist() == [13, -13, 22]
+    assert gen.charge.tolist() == [-1., 1., 0.]
+    np.testing.assert_allclose(gen.px, [45.6, -45.6, 5. * math.cos(0.5)], atol=1e-12)
+    np.testing.assert_allclose(gen.pz[2], 5. * math.sinh(1.))
+    assert len(GenArrays([])) == 0
+
+
+def test_invariant_mass():
+    gen = GenArrays(_zmumu())
+    assert veto.invariant_mass(gen.e, gen.px, gen.py, gen.pz) == pytest.approx(91.2)
+    # along the last axis
+    e = np.array([[1., 1.], [2., 0.]])
+    px = np.array([[1., -1.], [0., 0.]])
+    zeros = np.zeros((2, 2))
+    np.testing.assert_allclose(veto.invariant_mass(e, px, zeros, zeros), [2., 2.])
+
+
+def test_leptons():
+    gen = GenArrays(_zmumu() + [Particle(11, 5., 3., 0.), Particle(211, 50., 0., 0.)])
+    assert leptons(3)(gen)
+    assert not leptons(4)(gen)
+    assert not leptons(3, pt_min=10.)(gen)
+    assert not leptons(3, eta_max=2.5)(gen)
+    assert leptons(1, flavours=[11])(gen)
+    assert not leptons(2, flavours=[11])(gen)
+
+
+def test_dilepton_mass():
+    assert dilepton_mass(80., 100.)(GenArrays(_zmumu()))
+    assert not dilepton_mass(80., 100.)(GenArrays(_zmumu(pt=30.)))
+    # same sign, different flavours
+    assert not dilepton_mass(80., 100.)(GenArrays(
+        [Particle(13, 45.6, 0., 0.), Particle(13, 45.6, 0., math.pi, charge=1)]))
+    assert not dilepton_mass(80., 100.)(GenArrays(
+        [Particle(13, 45.6, 0., 0.), Particle(-11, 45.6, 0., math.pi)]))
+    # a pair in the window among several leptons
+    ptcs = _zmumu() + [Particle(11, 20., 0., 1.), Particle(-11, 25., 1., 2.)]
+    assert dilepton_mass(80., 100.)(GenArrays(ptcs))
+    assert not dilepton_mass(80., 100., pt_min=50.)(GenArrays(ptcs))
+    assert not dilepton_mass(80., 100.)(GenArrays(_zmumu()[:1]))
+
+
+def test_visible_mass():
+    gen = GenArrays(_zmumu() + [Particle(22, 10., 0., 0.5 * math.pi),
+                                Particle(22, 10., 0., -0.5 * math.pi)])
+    assert visible_mass(100., 120.)(gen)
+    assert not visible_mass(80., 100.)(gen)
+
+
+def _save(directory, names, counts):
+    np.savez(str(directory.join(veto.VETO_FILE)), names=names, counts=np.array(counts))
+    return str(directory.join(veto.VETO_FILE))
+
+
+def test_load_merge(tmpdir):
+    paths = [_save(tmpdir.mkdir('job_0'), ['all', 'leptons', 'mll'], [10, 6, 4]),
+             _save(tmpdir.mkdir('job_1'), ['all', 'leptons', 'mll'], [5, 2, 1])]
+    assert veto.load(str(tmpdir.join('job_0'))) == [('all', 10), ('leptons', 6), ('mll', 4)]
+    merged = tmpdir.mkdir('merged')
+    veto.merge(paths, str(merged.join(veto.VETO_FILE)))
+    assert veto.load(str(merged)) == [('all', 15), ('leptons', 8), ('mll', 5)]
+    # the first file is not modified by the merge
+    assert veto.load(str(tmpdir.join('job_0')))[0] == ('all', 10)
+    other = _save(tmpdir.mkdir('job_2'), ['all', 'leptons'], [5, 2])
+    with pytest.raises(ValueError):
+        veto.merge(paths + [other], str(merged.join(veto.VETO_FILE)))
+
+
+def test_gen_veto(tmpdir):
+    module = pytest.importorskip(
+        'heppy.papas.detectors.FCCHiggsDetectors.analyzers.GenVeto')
+    cfg_ana = Cfg(name='gen_veto', gen_particles='gen_particles_stable',
+                  predicates=[('leptons', leptons(2)),
+                              ('mll', dilepton_mass(80., 100.))])
+    analyzer = module.GenVeto(cfg_ana, None, str(tmpdir))
+    analyzer.beginLoop(None)
+    events = [_zmumu(), _zmumu(pt=30.), _zmumu()[:1], _zmumu(eta=0.1)]
+    results = [analyzer.process(Cfg(iEv=index, gen_particles_stable=ptcs))
+               for index, ptcs in enumerate(events)]
+    analyzer.endLoop(None)
+    assert results == [True, False, False, True]
+    assert veto.load(analyzer.dirName) == [('all', 4), ('leptons', 3), ('mll', 2)]
@@ -0,0 +1,94 @@
+'''Analytic tracker momentum resolution.
+
+Gluckstern formula for N equidistant measurements of precision sigma_x
+over a lever arm L in a field B, plus multiple scattering in a material
+of thickness x/X0 (PDG, Passage of particles through matter)::
+
+    sigma(pt)/pt = sqrt( (a pt)^2 + b^2 )
+
+    a = sigma_x / (0.3 B L^2) * sqrt(720 / (N + 4))
+    b = 0.0136 sqrt(1.43) / (0.3 B L) * sqrt(x/X0 / sin(theta))
+
+with pt in GeV, B in T and L in m. The transverse lever arm of a track
+is limited by the tracker barrel radius R, or by the tracker endcap at
+half-length z for forward tracks: L = min(R, z / |sinh(eta)|).
+
+The coefficients a and b only depend on |eta| for a given detector. They
+are computed on an |eta| grid when the detector is built, and evaluated
+in batch by linear interpolation. Single tracks go through resolution,
+which interpolates the same tables in plain python, numpy being slow on
+scalars.
+'''
+
+import math
+
+import numpy as np
+
+ETA_MAX = 5.
+NETA = 501
+
+# multiple scattering factor of the Gluckstern formula, PDG eq. 34.58
+MS_FACTOR = math.sqrt(1.43)
+
+
+class GlucksternResolution(object):
+    '''Relative pt resolution of a tracker of given volume in a field
+    of given magnitude.
+
+    field: magnitude of the magnetic field in T
+    volume: VolumeCylinder of the tracker, the outer radius and
+      half-length of which give the lever arm.
+    sigma_x: single hit resolution in m
+    nhits: number of measurements
+    x_x0: material thickness at normal incidence, in radiation lengths
+    '''
+
+    def __init__(self, field, volume, sigma_x=20e-6, nhits=13, x_x0=0.4):
+        self.field = field
+        self.volume = volume
+        self.rad = volume.outer.rad
+        self.z = volume.outer.z
+        self.sigma_x = sigma_x
+        self.nhits = nhits
+        self.x_x0 = x_x0
+        self.etas = np.linspace(0., ETA_MAX, NETA)
+        lever_arm = self.lever_arm(self.etas)
+        sin_theta = 1. / np.cosh(self.etas)
+        self.a = sigma_x / (0.3 * field * lever_arm**2) * \
+            np.sqrt(720. / (nhits + 4))
+        self.b = 0.0136 * MS_FACTOR / (0.3 * field * lever_arm) * \
+            np.sqrt(x_x0 / sin_theta)
+        self.step = self.etas[1]
+        self._a = self.a.tolist()
+        self._b = self.b.tolist()
+
+    def lever_arm(self, etas):
+        '''Transverse lever arm in m.'''
+        with np.errstate(divide='ignore'):
+            endcap = self.z / np.abs(np.sinh(etas))
+        return np.minimum(self.rad, endcap)
+
+    def for_field(self, field):
+        '''Returns the model for the same tracker in another field.'''
+        return GlucksternResolution(field, self.volume, self.sigma_x,
+                                    self.nhits, self.x_x0)
+
+    def coefficients(self, etas):
+        '''Returns the arrays of a and b at the given etas.'''
+        etas = np.abs(etas)
+        return (np.interp(etas, self.etas, self.a),
+                np.interp(etas, self.etas, self.b))
+
+    def __call__(self, pts, etas):
+        '''Returns the relative pt resolutions, for arrays or scalars.'''
+        a, b = self.coefficients(etas)
+        return np.sqrt((a * pts)**2 + b**2)
+
+    def resolution(self, pt, eta):
+        '''Returns the relative pt resolution of a single track.'''
+        position = min(abs(eta), ETA_MAX) / self.step
+        index = min(int(position), NETA - 2)
+        fraction = position - index
+        a = self._a[index] + fraction * (self._a[index + 1] - self._a[index])
+        b = self._b[index] + fraction * (self._b[index + 1] - self._b[index])
+        return math.sqrt((a * pt)**2 + b**2)
@@ -0,0 +1,146 @@
+'''Gen-level event vetoes, applied before the simulation.
+
+The GenVeto analyzer, scheduled right after the selection of the stable
+generated particles, converts them to numpy arrays, see GenArrays, and
+applies a list of named predicates in order. An event failing one of
+them is vetoed: the analyzer returns False, and the simulation and
+reconstruction are skipped. The predicates are functions of a GenArrays
+returning a boolean, built for example by:
+
+- leptons: minimum number of electrons and muons, e.g. for ZH -> l l X
+- dilepton_mass: opposite-sign same-flavour lepton pair in a mass window
+- visible_mass: invariant mass of the visible particles in a window
+
+or written in the config::
+
+    predicates = [
+        ('leptons', leptons(2, pt_min=10.)),
+        ('mll', dilepton_mass(80., 100.)),
+        ('photons', lambda gen: (gen.pdgid == 22).sum() < 20),
+    ]
+
+The number of events passing each predicate is saved in the analyzer
+directory, and this tool prints the veto efficiencies of jobs::
+
+    python veto.py Job_CMS/*GenVeto*
+'''
+
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+VETO_FILE = 'gen_veto.npz'
+
+LEPTONS = [11, 13]
+
+
+class GenArrays(object):
+    '''Kinematics of the particles of an event, as numpy arrays.'''
+
+    def __init__(self, ptcs):
+        values = np.array([(ptc.pdgid(), ptc.q(), ptc.pt(), ptc.eta(), ptc.phi(),
+                            ptc.e()) for ptc in ptcs], dtype=float).reshape(-1, 6)
+        self.pdgid = values[:, 0].astype(int)
+        self.charge = values[:, 1]
+        self.pt, self.eta, self.phi, self.e = values[:, 2:].T
+        self.px = self.pt * np.cos(self.phi)
+        self.py = self.pt * np.sin(self.phi)
+        self.pz = self.pt * np.sinh(self.eta)
+
+    def __len__(self):
+        return len(self.pdgid)
+
+
+def invariant_mass(e, px, py, pz):
+    '''Returns the invariant mass of the sums of e, px, py and pz along
+    the last axis.'''
+    m2 = e.sum(-1)**2 - px.sum(-1)**2 - py.sum(-1)**2 - pz.sum(-1)**2
+    return np.sqrt(np.maximum(m2, 0.))
+
+
+def _leptons(gen, pt_min, eta_max, flavours):
+    flavour = (np.abs(gen.pdgid)[:, np.newaxis] == np.asarray(flavours)).any(axis=1)
+    return (flavour & (gen.pt > pt_min) &
+            (np.abs(gen.eta) < eta_max))
+
+
+def leptons(min_count, pt_min=0., eta_max=np.inf, flavours=LEPTONS):
+    '''Returns the predicate requiring at least min_count leptons of the
+    flavours (absolute pdg ids) with pt > pt_min and |eta| < eta_max.'''
+    def predicate(gen):
+        return _leptons(gen, pt_min, eta_max, flavours).sum() >= min_count
+    return predicate
+
+
+def dilepton_mass(low, high, pt_min=0., eta_max=np.inf, flavours=LEPTONS):
+    '''Returns the predicate requiring an opposite-sign same-flavour pair
+    of leptons, as in leptons, with an invariant mass in [low, high].'''
+    def predicate(gen):
+        selected = np.flatnonzero(_leptons(gen, pt_min, eta_max, flavours))
+        if len(selected) < 2:
+            return False
+        first, second = np.triu_indices(len(selected), 1)
+        first, second = selected[first], selected[second]
+        pairs = ((gen.pdgid[first] == -gen.pdgid[second]) &
+                 (gen.charge[first] != gen.charge[second]))
+        if not pairs.any():
+            return False
+        indices = np.stack([first[pairs], second[pairs]], axis=-1)
+        masses = invariant_mass(gen.e[indices], gen.px[indices],
+                                gen.py[indices], gen.pz[indices])
+        return bool(((masses >= low) & (masses <= high)).any())
+    return predicate
+
+
+def visible_mass(low, high):
+    '''Returns the predicate requiring the invariant mass of all the
+    particles to be in [low, high]. The neutrinos must be removed from
+    the particles, as in the selection of the stable particles.'''
+    def predicate(gen):
+        mass = invariant_mass(gen.e, gen.px, gen.py, gen.pz)
+        return low <= mass <= high
+    return predicate
+
+
+def load(directory):
+    '''Returns the list of (name, number of events) of the cut flow saved
+    in directory, the first name being "all".'''
+    with np.load(os.path.join(directory, VETO_FILE)) as data:
+        return list(zip([str(name) for name in data['names']],
+                        data['counts'].tolist()))
+
+
+def merge(paths, output):
+    '''Adds the cut flows at paths, see shard.MERGERS.'''
+    names, counts = None, None
+    for path in paths:
+        with np.load(path) as data:
+            if names is None:
+                names, counts = list(data['names']), data['counts'].copy()
+            elif list(data['names']) != names:
+                raise ValueError('{}: different predicates'.format(path))
+            else:
+                counts += data['counts']
+    np.savez(output, names=names, counts=counts)
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog <GenVeto analyzer directory> ...')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('please provide analyzer directories')
+    for directory in args:
+        print(directory)
+        flow = load(directory)
+        total = flow[0][1]
+        previous = total
+        print('  {:24} {:>10} {:>10} {:>10}'.format('predicate', 'events',
+                                                    'efficiency', 'total'))
+        for name, count in flow:
+            print('  {:24} {:10d} {:10.4f} {:10.4f}'.format(
+                name, int(count), count / float(previous) if previous else float('nan'),
+                count / float(total) if total else float('nan')))
+            previous = count